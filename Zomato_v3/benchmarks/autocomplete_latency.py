@@ -0,0 +1,154 @@
+"""Typeahead latency: the in-memory prefix index versus an ILIKE scan.
+
+    python benchmarks/autocomplete_latency.py [--restaurants 5000] [--items 50000]
+
+Builds utils.autocomplete from synthetic restaurants and menu items whose
+names are drawn from small word lists (so short prefixes match thousands of
+names), with random order counts. It then times ``suggest`` for every
+prefix of some typed queries, one keystroke at a time. The baseline is
+what a keystroke would cost without the index: an
+``ilike '%prefix%'`` query over restaurant names, cuisines and menu item
+names in SQLite, ranked in SQL.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.autocomplete import Autocomplete, Suggestion  # noqa: E402
+
+ADJECTIVES = ["Spicy", "Royal", "Golden", "Green", "Urban", "Little", "Grand", "Happy", "Red", "Coastal", "Tandoori", "Smoky"]
+NOUNS = ["Hub", "Palace", "Kitchen", "Point", "Bowl", "Garden", "Cafe", "House", "Grill", "Express", "Corner", "Table"]
+CUISINES = ["Indian", "Italian", "Chinese", "Thai", "Mexican", "Japanese", "Continental", "Mughlai", "South Indian", "Bakery"]
+DISH_WORDS = [
+    "Paneer", "Tikka", "Masala", "Butter", "Chicken", "Pizza", "Pasta", "Noodles", "Biryani", "Dal", "Palak",
+    "Pepperoni", "Margherita", "Momos", "Dosa", "Idli", "Kebab", "Curry", "Fried", "Rice", "Soup", "Salad",
+]
+QUERIES = ["paneer tikka", "pizza", "spicy hub", "biryani", "tandoori kitchen", "south", "momos", "chi"]
+
+
+def synthetic(restaurants: int, items: int, rng: random.Random):
+    catalog = [
+        SimpleNamespace(
+            id=i, name=f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}", cuisine_type=rng.choice(CUISINES),
+            rating=round(rng.uniform(2.5, 5.0), 1), is_active=True, deleted_at=None
+        )
+        for i in range(1, restaurants + 1)
+    ]
+    menu = [
+        SimpleNamespace(
+            id=i, name=" ".join(rng.sample(DISH_WORDS, rng.choice((1, 2, 2, 3)))),
+            restaurant_id=rng.randint(1, restaurants), is_available=True
+        )
+        for i in range(1, items + 1)
+    ]
+    return catalog, menu
+
+
+def build(catalog, menu, rng: random.Random) -> Autocomplete:
+    # The bulk load Autocomplete.rebuild does at startup, without the queries.
+    index = Autocomplete()
+    for restaurant in catalog:
+        index._restaurant_orders[restaurant.id] = rng.randint(0, 500)
+    for item in menu:
+        index._item_orders[item.id] = rng.randint(0, 200)
+    for restaurant in catalog:
+        index._add_restaurant(restaurant)
+    for item in menu:
+        index._add_menu_item(item)
+    entries = {("restaurant", restaurant.id): index._restaurant_suggestion(restaurant.id) for restaurant in catalog}
+    for key in index._members:
+        entries[key] = Suggestion(key[0], index._group_texts[key], orders=index._group_orders[key])
+    index._index.load(entries)
+    return index
+
+
+def time_updates(index: Autocomplete, catalog, menu, rng: random.Random, count: int) -> float:
+    # Writes as crud applies them: mostly orders, some menu edits.
+    start = time.perf_counter()
+    for _ in range(count):
+        restaurant = rng.choice(catalog)
+        index.record_order(restaurant.id, [(rng.choice(menu).id, rng.randint(1, 3))])
+        if rng.random() < 0.1:
+            index.upsert_menu_item(rng.choice(menu))
+    return (time.perf_counter() - start) / count
+
+
+def keystrokes():
+    return [query[:length] for query in QUERIES for length in range(1, len(query) + 1)]
+
+
+def time_calls(fn, prefixes, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        for prefix in prefixes:
+            start = time.perf_counter()
+            fn(prefix)
+            samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99)]
+
+
+def sqlite_baseline(catalog, menu):
+    con = sqlite3.connect(":memory:")
+    con.execute("create table restaurants (id integer primary key, name text, cuisine_type text, rating real)")
+    con.execute("create table menu_items (id integer primary key, name text)")
+    con.executemany("insert into restaurants values (?, ?, ?, ?)", [(r.id, r.name, r.cuisine_type, r.rating) for r in catalog])
+    con.executemany("insert into menu_items values (?, ?)", [(m.id, m.name) for m in menu])
+    query = """
+        select * from (
+            select 'restaurant', name, rating from restaurants where name like :pattern
+            union all select distinct 'cuisine', cuisine_type, 0 from restaurants where cuisine_type like :pattern
+            union all select 'dish', name, count(*) from menu_items where name like :pattern group by name
+        ) order by 3 desc limit 10
+    """
+    return lambda prefix: con.execute(query, {"pattern": f"%{prefix}%"}).fetchall()
+
+
+def main(restaurants: int, items: int, repeat: int) -> None:
+    rng = random.Random(7)
+    catalog, menu = synthetic(restaurants, items, rng)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = build(catalog, menu, rng)
+    build_seconds = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{restaurants} restaurants, {items} menu items: index built in {build_seconds:.2f} s, {memory / 2**20:.1f} MiB")
+
+    print(f"incremental update (order, 1 in 10 with a menu edit): {time_updates(index, catalog, menu, rng, 2000) * 1e6:.1f} us")
+
+    prefixes = keystrokes()
+    print(f"{len(prefixes)} keystrokes x {repeat}, top 10 suggestions")
+    for label, fn in (
+        ("index", lambda prefix: index.suggest(prefix)),
+        ("index, dishes only", lambda prefix: index.suggest(prefix, "dish")),
+        ("sqlite ilike scan", sqlite_baseline(catalog, menu)),
+    ):
+        median, p99 = time_calls(fn, prefixes, repeat if label.startswith("index") else 1)
+        print(f"  {label:>18}: median {median * 1e6:9.1f} us  p99 {p99 * 1e6:9.1f} us")
+
+    by_length = {}
+    for prefix in prefixes:
+        by_length.setdefault(min(len(prefix), 5), []).append(prefix)
+    print("index median by prefix length")
+    for length, group in sorted(by_length.items()):
+        median, _ = time_calls(lambda prefix: index.suggest(prefix), group, repeat)
+        print(f"  {length}{'+' if length == 5 else ' '} chars: {median * 1e6:7.1f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--restaurants", type=int, default=5000)
+    parser.add_argument("--items", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    main(args.restaurants, args.items, args.repeat)
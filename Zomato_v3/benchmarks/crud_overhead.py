@@ -0,0 +1,149 @@
+"""Per-call overhead of the hot crud lookups: fresh select() versus prebuilt statements.
+
+    python benchmarks/crud_overhead.py [--calls 2000]
+
+"before" builds the statement on every call, as crud did before; "after"
+calls the crud function, which executes a module-level statement with bound
+parameters. Both run through an AsyncSession on aiosqlite against the same
+SQLite file, with the soft-delete criteria of models.py applied.
+
+"statement" isolates the Python side of one lookup: building the select,
+adding the soft-delete loader criteria and computing the cache key SQLAlchemy
+needs before it can reuse a compiled statement. Before, the criteria were
+also rebuilt on every execution.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import timeit
+from datetime import time as clock
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker, with_loader_criteria
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crud  # noqa: E402
+import models  # noqa: E402
+from utils.instrumentation import query_cache_stats  # noqa: E402
+
+
+async def fresh_get_restaurant(db, restaurant_id):
+    result = await db.execute(select(models.Restaurant).where(models.Restaurant.id == restaurant_id))
+    return result.scalar_one_or_none()
+
+
+async def fresh_get_customer(db, customer_id):
+    result = await db.execute(select(models.Customer).where(models.Customer.id == customer_id))
+    return result.scalar_one_or_none()
+
+
+async def fresh_get_menu_item(db, menu_item_id):
+    result = await db.execute(select(models.MenuItems).where(models.MenuItems.id == menu_item_id))
+    return result.scalar_one_or_none()
+
+
+async def fresh_find_order(db, order_id):
+    for model in (models.Order, models.ArchivedOrder):
+        result = await db.execute(select(model).where(model.id == order_id))
+        order = result.scalar_one_or_none()
+        if order:
+            return order
+
+
+LOOKUPS = [
+    ("get_restaurant", fresh_get_restaurant, crud.get_restaurant),
+    ("get_customer", fresh_get_customer, crud.get_customer),
+    ("get_menu_item", fresh_get_menu_item, crud.get_menu_item),
+    ("get_order", fresh_find_order, crud._find_order),
+]
+
+
+async def seed(session_factory) -> None:
+    async with session_factory() as db:
+        restaurant = models.Restaurant(
+            id=1, name="Spice Hub", description="d", cuisine_type="Indian", address="1 Road",
+            phone_number="+911234567890", location="Bangalore",
+            opening_time=clock(0, 0), closing_time=clock(23, 59)
+        )
+        customer = models.Customer(
+            id=1, name="John", email="j@example.com", phone_number="+911234567890", address="123 Main Street"
+        )
+        menu_item = models.MenuItems(
+            id=1, name="Paneer Tikka", description="grilled", price_paise=25050,
+            category="Starter", preparation_time=15, restaurant_id=1
+        )
+        order = models.Order(id=1, customer_id=1, restaurant_id=1, total_amount_paise=50100, delivery_address="123 Main Street")
+        db.add_all([restaurant, customer, menu_item, order])
+        await db.commit()
+
+
+async def time_calls(session_factory, lookup, calls: int, repeat: int = 5) -> float:
+    best = float("inf")
+    async with session_factory() as db:
+        await lookup(db, 1)
+        for _ in range(repeat):
+            db.expunge_all()
+            start = time.perf_counter()
+            for _ in range(calls):
+                await lookup(db, 1)
+            best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+
+def old_listener_criteria():
+    return (
+        with_loader_criteria(models.Restaurant, models.Restaurant.deleted_at.is_(None), include_aliases=True),
+        with_loader_criteria(models.Customer, models.Customer.deleted_at.is_(None), include_aliases=True),
+        with_loader_criteria(
+            models.MenuItems, models.MenuItems.restaurant_id.not_in(models._deleted_restaurant_ids), include_aliases=True
+        ),
+    )
+
+
+def bench_statement(calls: int) -> None:
+    def before():
+        statement = select(models.Restaurant).where(models.Restaurant.id == 1)
+        return statement.options(*old_listener_criteria())._generate_cache_key()
+
+    filtered = crud._restaurant_by_id.options(*models._SOFT_DELETE_CRITERIA)
+
+    def after():
+        return filtered._generate_cache_key()
+
+    print("statement: build + soft-delete criteria + cache key")
+    for label, fn in (("before", before), ("after", after)):
+        seconds = min(timeit.repeat(fn, number=calls, repeat=5)) / calls
+        print(f"  {label:>6}: {seconds * 1e6:8.2f} us/call")
+
+
+async def main(calls: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory, 'bench.db')}")
+        query_cache_stats.watch("benchmark", engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+        session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        await seed(session_factory)
+
+        print(f"crud lookups, {calls} calls each (SQLite round trip included)")
+        for name, before, after in LOOKUPS:
+            before_seconds = await time_calls(session_factory, before, calls)
+            after_seconds = await time_calls(session_factory, after, calls)
+            print(f"  {name:>15}: before {before_seconds * 1e6:8.1f} us  after {after_seconds * 1e6:8.1f} us"
+                  f"  ({1 - after_seconds / before_seconds:.0%} less)")
+        await engine.dispose()
+
+    bench_statement(calls)
+    print(f"compiled cache: {query_cache_stats.snapshot()['benchmark']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.calls))
@@ -0,0 +1,71 @@
+"""Accuracy of the popular-item sketches on larger streams than the tests use.
+
+    python benchmarks/heavy_hitters_accuracy.py [--items 2000] [--capacity 100]
+
+Feeds a Zipf-distributed stream of (menu item, quantity) into a SpaceSaving
+summary and into seven per-day summaries (the sliding window), and reports
+against a Counter the largest error, the recall of the top k and how many of
+them are ``guaranteed``. The bounds themselves are asserted in
+tests/test_heavy_hitters.py.
+"""
+import argparse
+import os
+import random
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.heavy_hitters import SpaceSaving, top_k  # noqa: E402
+
+
+def zipf_stream(ids, length: int, skew: float, rng: random.Random):
+    weights = [1 / rank ** skew for rank in range(1, len(ids) + 1)]
+    for item in rng.choices(ids, weights, k=length):
+        yield item, rng.randint(1, 3)
+
+
+def report(summaries, exact: Counter, capacity: int, k: int, label: str) -> None:
+    total = sum(exact.values())
+    reported = top_k(summaries, len(exact))
+    true_top = exact.most_common()
+    kth = true_top[k - 1][1] if len(true_top) >= k else 0
+    top = top_k(summaries, k)
+    recall = len({entry["menu_item_id"] for entry in top} & {item for item, count in true_top if count >= kth}) / k
+    max_error = max((entry["error"] for entry in reported), default=0)
+    guaranteed = sum(entry["guaranteed"] for entry in top)
+    print(f"{label:>10}: N={total} bound={total / capacity:.0f} "
+          f"max_error={max_error} top{k} recall={recall:.2f} guaranteed={guaranteed}/{k}")
+
+
+def main(args) -> None:
+    rng = random.Random(args.seed)
+    ids = rng.sample(range(1, 10 * args.items), args.items)
+
+    all_time, exact = SpaceSaving(args.capacity), Counter()
+    for item, quantity in zipf_stream(ids, args.length, args.skew, rng):
+        all_time.add(item, quantity)
+        exact[item] += quantity
+    report([all_time], exact, args.capacity, args.k, "all time")
+
+    days, window_exact = [], Counter()
+    for _ in range(7):
+        # Popularity drifts a little from day to day.
+        ids = ids[1:] + ids[:1] if rng.random() < 0.5 else ids
+        day = SpaceSaving(args.capacity)
+        for item, quantity in zipf_stream(ids, args.length // 7, args.skew, rng):
+            day.add(item, quantity)
+            window_exact[item] += quantity
+        days.append(day)
+    report(days, window_exact, args.capacity, args.k, "7 days")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--length", type=int, default=200_000)
+    parser.add_argument("--capacity", type=int, default=100)
+    parser.add_argument("--skew", type=float, default=1.1)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
@@ -0,0 +1,133 @@
+"""Latency and memory of one 100-row list page: ORM entities versus column projections.
+
+    python benchmarks/list_projections.py [--rows 100] [--calls 200]
+
+"before" selects the mapped class, as the list endpoints did, so every row
+becomes an entity in the session's identity map with its instance state.
+"after" runs the crud projection, which selects only the response columns
+and returns plain rows. "load" times the query and row handling alone;
+"page" also validates the rows into the response model the way FastAPI
+does (``from_attributes``). The customers page is dominated by e-mail
+validation, so its "page" difference is within noise. Memory is the
+tracemalloc peak while building one validated page.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import time as clock
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crud  # noqa: E402
+import models  # noqa: E402
+import schemas  # noqa: E402
+
+
+def entity_page(model):
+    async def page(db, rows):
+        result = await db.execute(select(model).offset(0).limit(rows))
+        return result.scalars().all()
+    return page
+
+
+def projection_page(statement):
+    async def page(db, rows):
+        result = await db.execute(statement.offset(0).limit(rows))
+        return result.all()
+    return page
+
+
+PAGES = [
+    ("restaurants", schemas.RestaurantOut, entity_page(models.Restaurant), projection_page(crud._restaurant_rows)),
+    ("menu items", schemas.MenuItemOut, entity_page(models.MenuItems), projection_page(crud._menu_item_rows)),
+    ("customers", schemas.CustomerOut, entity_page(models.Customer), projection_page(crud._customer_rows)),
+    ("orders", schemas.OrderOut, entity_page(models.Order), projection_page(crud._order_rows[models.Order])),
+]
+
+
+async def seed(session_factory, rows: int) -> None:
+    async with session_factory() as db:
+        for i in range(1, rows + 1):
+            db.add(models.Restaurant(
+                id=i, name=f"Restaurant {i}", description="Family style", cuisine_type="Indian",
+                address=f"{i} Road", phone_number="+911234567890", location="Bangalore",
+                opening_time=clock(0, 0), closing_time=clock(23, 59)
+            ))
+            db.add(models.Customer(
+                id=i, name=f"Customer {i}", email=f"c{i}@example.com", phone_number="+911234567890",
+                address=f"{i} Main Street, Bangalore"
+            ))
+            db.add(models.MenuItems(
+                id=i, name=f"Dish {i}", description="grilled", price_paise=25050,
+                category="Starter", preparation_time=15, restaurant_id=i
+            ))
+            db.add(models.Order(
+                id=i, customer_id=i, restaurant_id=i, total_amount_paise=50100,
+                delivery_address=f"{i} Main Street, Bangalore"
+            ))
+        await db.commit()
+
+
+async def time_page(session_factory, page, adapter, rows: int, calls: int) -> float:
+    async with session_factory() as db:
+        await page(db, rows)
+    # A fresh session per call, like a request: the identity map starts empty.
+    start = time.perf_counter()
+    for _ in range(calls):
+        async with session_factory() as db:
+            loaded = await page(db, rows)
+            if adapter is not None:
+                adapter.validate_python(loaded, from_attributes=True)
+    return (time.perf_counter() - start) / calls
+
+
+async def page_peak(session_factory, page, adapter, rows: int) -> int:
+    async with session_factory() as db:
+        tracemalloc.start()
+        try:
+            adapter.validate_python(await page(db, rows), from_attributes=True)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+
+async def main(rows: int, calls: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory, 'bench.db')}")
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+        session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        await seed(session_factory, rows)
+
+        print(f"{rows}-row page, {calls} calls")
+        for name, schema, before, after in PAGES:
+            adapter = TypeAdapter(List[schema])
+            print(f"  {name}")
+            for label, page_adapter in (("load", None), ("page", adapter)):
+                before_seconds = await time_page(session_factory, before, page_adapter, rows, calls)
+                after_seconds = await time_page(session_factory, after, page_adapter, rows, calls)
+                print(f"    {label}: before {before_seconds * 1e3:6.2f} ms  after {after_seconds * 1e3:6.2f} ms"
+                      f"  ({1 - after_seconds / before_seconds:.0%} less)")
+            before_peak = await page_peak(session_factory, before, adapter, rows)
+            after_peak = await page_peak(session_factory, after, adapter, rows)
+            print(f"    peak memory: before {before_peak / 1024:6.1f} KiB  after {after_peak / 1024:6.1f} KiB"
+                  f"  ({1 - after_peak / before_peak:.0%} less)")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.calls))
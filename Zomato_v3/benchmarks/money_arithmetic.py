@@ -0,0 +1,120 @@
+"""Money as DECIMAL(10, 2) versus integer paise: analytics SUMs and checkout totals.
+
+    python benchmarks/money_arithmetic.py [--rows 200000]
+
+"before" is the old layout: a DECIMAL(10, 2) column (a REAL in SQLite) summed
+in SQL and converted to Decimal, and order totals added up with Decimal.
+"after" is the current one: INTEGER paise summed in SQL and converted once,
+and totals in integer arithmetic (utils.business_logic.calculate_order_total).
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from decimal import Decimal
+
+from sqlalchemy import DECIMAL, Column, Integer, MetaData, Table, create_engine, func, insert, select
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import schemas  # noqa: E402
+from utils.business_logic import calculate_order_total  # noqa: E402
+from utils.money import to_paise, to_rupees  # noqa: E402
+
+
+def decimal_order_total(order_items, menu_items_prices):
+    # calculate_order_total before the move to paise.
+    total = Decimal("0.00")
+    for item in order_items:
+        total += menu_items_prices[item.menu_item_id] * item.quantity
+    return total
+
+
+def best(statement, number: int, repeat: int = 5) -> float:
+    return min(timeit.repeat(statement, number=number, repeat=repeat)) / number
+
+
+def bench_sums(rows: int, restaurants: int, rng: random.Random) -> None:
+    metadata = MetaData()
+    before = Table("orders_before", metadata, Column("id", Integer, primary_key=True),
+                   Column("restaurant_id", Integer), Column("total_amount", DECIMAL(10, 2)))
+    after = Table("orders_after", metadata, Column("id", Integer, primary_key=True),
+                  Column("restaurant_id", Integer), Column("total_amount_paise", Integer))
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+
+    amounts = [rng.randrange(100, 500_000) for _ in range(rows)]
+    owners = [rng.randrange(restaurants) for _ in range(rows)]
+    with engine.begin() as conn:
+        conn.execute(insert(before), [
+            {"restaurant_id": owner, "total_amount": to_rupees(paise)} for owner, paise in zip(owners, amounts)
+        ])
+        conn.execute(insert(after), [
+            {"restaurant_id": owner, "total_amount_paise": paise} for owner, paise in zip(owners, amounts)
+        ])
+
+    exact = to_rupees(sum(amounts))
+    exact_by_restaurant = {}
+    for owner, paise in zip(owners, amounts):
+        exact_by_restaurant[owner] = exact_by_restaurant.get(owner, 0) + paise
+    exact_by_restaurant = {owner: to_rupees(paise) for owner, paise in exact_by_restaurant.items()}
+    with engine.connect() as conn:
+        def sum_before():
+            return Decimal(str(conn.execute(select(func.sum(before.c.total_amount))).scalar()))
+
+        def sum_after():
+            return to_rupees(conn.execute(select(func.sum(after.c.total_amount_paise))).scalar())
+
+        def by_restaurant_before():
+            query = select(before.c.restaurant_id, func.sum(before.c.total_amount)).group_by(before.c.restaurant_id)
+            return {owner: Decimal(str(total)) for owner, total in conn.execute(query)}
+
+        def by_restaurant_after():
+            query = select(after.c.restaurant_id, func.sum(after.c.total_amount_paise)).group_by(after.c.restaurant_id)
+            return {owner: to_rupees(total) for owner, total in conn.execute(query)}
+
+        print(f"SUM over {rows} orders (exact total {exact})")
+        for label, fn in (("before", sum_before), ("after", sum_after)):
+            print(f"  {label:>6}: {best(fn, 10) * 1e3:8.2f} ms  total={fn()}  exact={fn() == exact}")
+        print(f"SUM grouped by {restaurants} restaurants")
+        for label, fn in (("before", by_restaurant_before), ("after", by_restaurant_after)):
+            wrong = sum(total != exact_by_restaurant[owner] for owner, total in fn().items())
+            print(f"  {label:>6}: {best(fn, 10) * 1e3:8.2f} ms  inexact totals={wrong}")
+
+
+def show_float_drift() -> None:
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        conn.exec_driver_sql("CREATE TABLE t (amount DECIMAL(10, 2), amount_paise INTEGER)")
+        conn.exec_driver_sql("INSERT INTO t VALUES (0.10, 10), (0.20, 20)")
+        real_sum, paise_sum = conn.exec_driver_sql("SELECT SUM(amount), SUM(amount_paise) FROM t").one()
+    print(f"0.10 + 0.20: before {Decimal(str(real_sum))}  after {to_rupees(paise_sum)}")
+
+
+def bench_checkout(orders: int, rng: random.Random) -> None:
+    menu = {menu_item_id: Decimal(rng.randrange(1000, 60_000)).scaleb(-2) for menu_item_id in range(1, 51)}
+    menu_paise = {menu_item_id: to_paise(price) for menu_item_id, price in menu.items()}
+    carts = [
+        [schemas.OrderItemCreate(menu_item_id=rng.randrange(1, 51), quantity=rng.randrange(1, 4)) for _ in range(5)]
+        for _ in range(orders)
+    ]
+    assert all(to_paise(decimal_order_total(cart, menu)) == calculate_order_total(cart, menu_paise) for cart in carts)
+
+    print(f"Checkout totals, {orders} orders of 5 items")
+    before = best(lambda: [decimal_order_total(cart, menu) for cart in carts], 1)
+    after = best(lambda: [calculate_order_total(cart, menu_paise) for cart in carts], 1)
+    print(f"  before: {before / orders * 1e6:8.2f} us/order")
+    print(f"   after: {after / orders * 1e6:8.2f} us/order")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--restaurants", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=20_000)
+    args = parser.parse_args()
+    rng = random.Random(5)
+    bench_sums(args.rows, args.restaurants, rng)
+    bench_checkout(args.orders, rng)
+    show_float_drift()
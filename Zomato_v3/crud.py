@@ -1,24 +1,111 @@
 from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import update, delete, and_, func
+from sqlalchemy import update, delete, and_, func, bindparam
 from sqlalchemy.orm import joinedload, selectinload
 from fastapi import HTTPException, status
 from typing import List, Optional, Dict
+from itertools import chain
 from decimal import Decimal
-from datetime import datetime, timedelta
-import models, schemas
+from datetime import datetime, timedelta, time
+import models, schemas, database, sharding
 from utils.business_logic import (
     calculate_order_total, validate_order_items, validate_status_transition,
-    validate_review_eligibility, estimate_delivery_time, validate_restaurant_operating_hours
+    validate_review_eligibility, estimate_delivery_time, validate_restaurant_operating_hours,
+    minute_of_day, operating_intervals, get_next_order_status
 )
+from utils.jobs import job_runner
+from utils.archive import read_with_archive
+from utils.leaderboards import leaderboards
+from utils.autocomplete import autocomplete
+from utils.events import OrderStatusChanged, order_events
+from utils.heavy_hitters import popular_items
+from utils import customer_activity
+from sharding import shard_for_restaurant, shard_for_id, allocate_id, attach_related, merge_newest_first
+from utils.geo import grid_cell, cells_within, haversine_km
+from utils.money import as_rupees
+
+# Rows removed per transaction when a deleted restaurant or customer is purged.
+PURGE_BATCH_SIZE = 500
+
+# Lookups by key are built once with bound parameters. Executing a prebuilt
+# statement skips constructing the select and computing its cache key, which
+# costs more than the SQLite round trip (benchmarks/crud_overhead.py).
+_restaurant_by_id = select(models.Restaurant).where(models.Restaurant.id == bindparam("restaurant_id"))
+_restaurant_with_menu_by_id = (
+    select(models.Restaurant)
+    .options(joinedload(models.Restaurant.menu_items))
+    .where(models.Restaurant.id == bindparam("restaurant_id"))
+)
+_menu_item_by_id = select(models.MenuItems).where(models.MenuItems.id == bindparam("menu_item_id"))
+_menu_item_with_restaurant_by_id = (
+    select(models.MenuItems)
+    .options(joinedload(models.MenuItems.restaurant))
+    .where(models.MenuItems.id == bindparam("menu_item_id"))
+)
+_customer_by_id = select(models.Customer).where(models.Customer.id == bindparam("customer_id"))
+_customer_by_email = select(models.Customer).where(models.Customer.email == bindparam("email"))
+_order_by_id = {
+    (model, with_items): (
+        select(model).options(selectinload(model.order_items)) if with_items else select(model)
+    ).where(model.id == bindparam("order_id"))
+    for model in (models.Order, models.ArchivedOrder)
+    for with_items in (False, True)
+}
+
+
+def _projection(model, schema, **expressions):
+    """Select just the columns of ``model`` that ``schema`` shows, named after its fields."""
+    return select(*(expressions[name] if name in expressions else getattr(model, name) for name in schema.model_fields))
+
+
+# List endpoints select only their response columns. The rows skip the
+# identity map, instance state and relationship loaders, and the response
+# models read them by attribute like ORM objects (benchmarks/list_projections.py).
+_restaurant_rows = _projection(models.Restaurant, schemas.RestaurantOut)
+_menu_item_rows = _projection(
+    models.MenuItems, schemas.MenuItemOut, price=as_rupees(models.MenuItems.price_paise, "price")
+)
+_customer_rows = _projection(models.Customer, schemas.CustomerOut)
+_order_rows = {
+    model: _projection(model, schemas.OrderOut, total_amount=as_rupees(model.total_amount_paise, "total_amount"))
+    for model in (models.Order, models.ArchivedOrder)
+}
+
+
+def build_open_intervals(restaurant):
+    return [
+        models.RestaurantOpenInterval(restaurant_id=restaurant.id, open_minute=open_minute, close_minute=close_minute)
+        for open_minute, close_minute in operating_intervals(restaurant.opening_time, restaurant.closing_time)
+    ]
+
+def open_at_filter(at:time):
+    minute=minute_of_day(at)
+    open_restaurants=select(models.RestaurantOpenInterval.restaurant_id).where(
+        and_(
+            models.RestaurantOpenInterval.open_minute <= minute,
+            models.RestaurantOpenInterval.close_minute >= minute
+        )
+    )
+    return models.Restaurant.id.in_(open_restaurants)
+
+async def backfill_open_intervals(db):
+    missing=select(models.Restaurant).where(~models.Restaurant.open_intervals.any())
+    result=await db.execute(missing)
+    for restaurant in result.scalars().all():
+        db.add_all(build_open_intervals(restaurant))
+    await db.commit()
 
 
 async def create_restaurant(db, restaurant:schemas.RestaurantCreate):
     new_restaurant=models.Restaurant(**restaurant.dict())
+    new_restaurant.geo_cell=grid_cell(new_restaurant.latitude, new_restaurant.longitude)
+    new_restaurant.open_intervals=build_open_intervals(new_restaurant)
     db.add(new_restaurant)
     try:
         await db.commit()
         await db.refresh(new_restaurant)
+        leaderboards.upsert_restaurant(new_restaurant)
+        autocomplete.upsert_restaurant(new_restaurant)
         return new_restaurant
     except IntegrityError as e:
         db.rollback()
@@ -26,54 +113,90 @@ async def create_restaurant(db, restaurant:schemas.RestaurantCreate):
     
 
 async def get_restaurant(db, restaurant_id:int):
-    result=await db.execute(select(models.Restaurant).where(models.Restaurant.id==restaurant_id))
+    result=await db.execute(_restaurant_by_id, {"restaurant_id": restaurant_id})
     restaurant=result.scalar_one_or_none()
     if not restaurant:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Restaurant not found")
     return restaurant
 
-async def get_all_restaurants(db,skip:int=0,limit:int=10):
-    result=await db.execute(select(models.Restaurant).offset(skip).limit(limit))
-    return result.scalars().all()
+async def get_all_restaurants(db,skip:int=0,limit:int=10,open_at:Optional[time]=None):
+    query=_restaurant_rows
+    if open_at:
+        query=query.where(open_at_filter(open_at))
+    result=await db.execute(query.offset(skip).limit(limit))
+    return result.all()
 
 async def update_restaurant(db, restaurant_id:int, restaurant_data:schemas.RestaurantUpdate):
-    query=select(models.Restaurant).where(models.Restaurant.id==restaurant_id)
-    result=await db.execute(query)
+    result=await db.execute(_restaurant_by_id, {"restaurant_id": restaurant_id})
     db_restaurant=result.scalar_one_or_none()
     if not db_restaurant:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Restaurant not found")
 
     for key,value in restaurant_data.dict().items():
         setattr(db_restaurant, key, value)
+    db_restaurant.geo_cell=grid_cell(db_restaurant.latitude, db_restaurant.longitude)
+    await db.execute(delete(models.RestaurantOpenInterval).where(models.RestaurantOpenInterval.restaurant_id==restaurant_id))
+    db.add_all(build_open_intervals(db_restaurant))
 
     
     await db.commit()
     await db.refresh(db_restaurant)
+    leaderboards.upsert_restaurant(db_restaurant)
+    autocomplete.upsert_restaurant(db_restaurant)
     return db_restaurant
 
 async def delete_restaurant(db, restaurant_id:int):
-    result=await db.execute(select(models.Restaurant).where(models.Restaurant.id==restaurant_id))
-    restaurant=result.scalar_one_or_none()
-    if not restaurant:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Restaurant not found")
-    
+    restaurant=await get_restaurant(db, restaurant_id)
 
-    await db.delete(restaurant)
+    # Hide it now; its menu, orders and the row itself go in the purge job.
+    restaurant.deleted_at=datetime.utcnow()
+    purge_job=job_runner.enqueue(db, "purge_restaurant", restaurant_id=restaurant_id)
     await db.commit()
+    leaderboards.remove_restaurant(restaurant_id)
+    autocomplete.remove_restaurant(restaurant_id)
+    popular_items.forget(restaurant_id)
+    job_runner.dispatch(purge_job)
     return {"message": "Restaurant deleted successfully"}
 
+@job_runner.task("purge_restaurant")
+async def purge_restaurant(db, restaurant_id: int):
+    shard = shard_for_restaurant(restaurant_id)
+    await purge_orders(shard, lambda order: [order.restaurant_id == restaurant_id])
+    await shard.writer.submit(lambda session: session.execute(
+        delete(models.RestaurantDailyCustomers).where(models.RestaurantDailyCustomers.restaurant_id == restaurant_id)
+    ))
+
+    while True:
+        batch = select(models.MenuItems.id).where(models.MenuItems.restaurant_id == restaurant_id).limit(PURGE_BATCH_SIZE)
+        result = await db.execute(delete(models.MenuItems).where(models.MenuItems.id.in_(batch)))
+        await db.commit()
+        if result.rowcount < PURGE_BATCH_SIZE:
+            break
+    await db.execute(delete(models.Sketch).where(models.Sketch.restaurant_id == restaurant_id))
+    # Open intervals go with the row through ON DELETE CASCADE.
+    await db.execute(delete(models.Restaurant).where(
+        models.Restaurant.id == restaurant_id, models.Restaurant.deleted_at.is_not(None)
+    ))
+    await db.commit()
+
 
-async def search_by_cuisine(db, cuisine_type:str):
-    result=await db.execute(select(models.Restaurant).where(models.Restaurant.cuisine_type.ilike(f"%{cuisine_type}%")))
+async def search_by_cuisine(db, cuisine_type:str, open_at:Optional[time]=None):
+    query=select(models.Restaurant).where(models.Restaurant.cuisine_type.ilike(f"%{cuisine_type}%"))
+    if open_at:
+        query=query.where(open_at_filter(open_at))
+    result=await db.execute(query)
     return result.scalars().all()
 
-async def get_active_restaurants(db):
-    result=await db.execute(select(models.Restaurant).where(models.Restaurant.is_active==True))
+async def get_active_restaurants(db, open_at:Optional[time]=None):
+    query=select(models.Restaurant).where(models.Restaurant.is_active==True)
+    if open_at:
+        query=query.where(open_at_filter(open_at))
+    result=await db.execute(query)
     return result.scalars().all()
 
 
 async def create_menu_item(db, restaurant_id:int, menu_item:schemas.MenuItemCreate):
-    result=await db.execute(select(models.Restaurant).where(models.Restaurant.id==restaurant_id))
+    result=await db.execute(_restaurant_by_id, {"restaurant_id": restaurant_id})
     restaurant=result.scalar_one_or_none()
     if not restaurant:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Restaurant not found")
@@ -82,30 +205,31 @@ async def create_menu_item(db, restaurant_id:int, menu_item:schemas.MenuItemCrea
     db.add(new_menu_item)
     await db.commit()
     await db.refresh(new_menu_item)
+    autocomplete.upsert_menu_item(new_menu_item)
     return new_menu_item
 
 
 async def get_menu_item(db, menu_item_id:int):
-    result=await db.execute(select(models.MenuItems).where(models.MenuItems.id==menu_item_id))
+    result=await db.execute(_menu_item_by_id, {"menu_item_id": menu_item_id})
     item=result.scalar_one_or_none()
     if not item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Menu item not found")
     return item
 
 async def get_menu_item_with_restaurant(db, menu_item_id:int):
-    result=await db.execute(select(models.MenuItems).options(joinedload(models.MenuItems.restaurant)).where(models.MenuItems.id==menu_item_id))
+    result=await db.execute(_menu_item_with_restaurant_by_id, {"menu_item_id": menu_item_id})
     item = result.scalar_one_or_none()
     if not item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Menu item not found")
     return item
 
 async def get_all_menu_items(db, skip:int=0, limit:int=10):
-    result=await db.execute(select(models.MenuItems).offset(skip).limit(limit))
-    return result.scalars().all()
+    result=await db.execute(_menu_item_rows.offset(skip).limit(limit))
+    return result.all()
 
 
 async def update_menu_item(db, menu_item_id:int, menu_item_data:schemas.MenuItemUpdate):
-    result=await db.execute(select(models.MenuItems).where(models.MenuItems.id==menu_item_id))
+    result=await db.execute(_menu_item_by_id, {"menu_item_id": menu_item_id})
     item=result.scalar_one_or_none()
     if not item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Menu item not found")
@@ -115,17 +239,25 @@ async def update_menu_item(db, menu_item_id:int, menu_item_data:schemas.MenuItem
 
     await db.commit()
     await db.refresh(item)
+    autocomplete.upsert_menu_item(item)
     return item
 
 
 async def delete_menu_item(db, menu_item_id:int):
-    result=await db.execute(select(models.MenuItems).where(models.MenuItems.id==menu_item_id))
+    result=await db.execute(_menu_item_by_id, {"menu_item_id": menu_item_id})
     item=result.scalar_one_or_none()
     if not item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Menu item not found")
     
     await db.delete(item)
     await db.commit()
+    autocomplete.remove_menu_item(menu_item_id)
+
+    async def purge(session):
+        await session.execute(delete(models.OrderItem).where(models.OrderItem.menu_item_id == menu_item_id))
+        await session.execute(delete(models.ArchivedOrderItem).where(models.ArchivedOrderItem.menu_item_id == menu_item_id))
+
+    await shard_for_restaurant(item.restaurant_id).writer.submit(purge)
     return {"message": "Menu item deleted successfully"}
 
 
@@ -136,8 +268,8 @@ async def get_menu_items_by_restaurant(db, restaurant_id:int, skip:int=0, limit:
 
 
 async def restaurant_with_menu_items(db, restaurant_id:int):
-    result=await db.execute(select(models.Restaurant).options(joinedload(models.Restaurant.menu_items)).where(models.Restaurant.id==restaurant_id))
-    restaurant=result.scalar_one_or_none()
+    result=await db.execute(_restaurant_with_menu_by_id, {"restaurant_id": restaurant_id})
+    restaurant=result.unique().scalar_one_or_none()
 
 
 async def get_menu_by_restaurant(db, restaurant_id:int):
@@ -145,8 +277,8 @@ async def get_menu_by_restaurant(db, restaurant_id:int):
     return result.scalars().all()
 
 async def get_restaurant_with_menu(db, restaurant_id:int):
-    result=await db.execute(select(models.Restaurant).options(joinedload(models.Restaurant.menu_items)).where(models.Restaurant.id==restaurant_id))
-    restaurant=result.scalar_one_or_none()
+    result=await db.execute(_restaurant_with_menu_by_id, {"restaurant_id": restaurant_id})
+    restaurant=result.unique().scalar_one_or_none()
     if not restaurant:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Restaurant not found")
     return restaurant
@@ -176,22 +308,22 @@ async def create_customer(db, customer: schemas.CustomerCreate):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 async def get_customer(db, customer_id: int):
-    result = await db.execute(select(models.Customer).where(models.Customer.id == customer_id))
+    result = await db.execute(_customer_by_id, {"customer_id": customer_id})
     customer = result.scalar_one_or_none()
     if not customer:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Customer not found")
     return customer
 
 async def get_customer_by_email(db, email: str):
-    result = await db.execute(select(models.Customer).where(models.Customer.email == email))
+    result = await db.execute(_customer_by_email, {"email": email})
     return result.scalar_one_or_none()
 
 async def get_all_customers(db, skip: int = 0, limit: int = 10):
-    result = await db.execute(select(models.Customer).offset(skip).limit(limit))
-    return result.scalars().all()
+    result = await db.execute(_customer_rows.offset(skip).limit(limit))
+    return result.all()
 
 async def update_customer(db, customer_id: int, customer_data: schemas.CustomerUpdate):
-    result = await db.execute(select(models.Customer).where(models.Customer.id == customer_id))
+    result = await db.execute(_customer_by_id, {"customer_id": customer_id})
     customer = result.scalar_one_or_none()
     if not customer:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Customer not found")
@@ -213,32 +345,80 @@ async def update_customer(db, customer_id: int, customer_data: schemas.CustomerU
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 async def delete_customer(db, customer_id: int):
-    result = await db.execute(select(models.Customer).where(models.Customer.id == customer_id))
-    customer = result.scalar_one_or_none()
-    if not customer:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Customer not found")
-    
-    await db.delete(customer)
+    customer = await get_customer(db, customer_id)
+
+    customer.deleted_at = datetime.utcnow()
+    purge_job = job_runner.enqueue(db, "purge_customer", customer_id=customer_id)
     await db.commit()
+    job_runner.dispatch(purge_job)
     return {"message": "Customer deleted successfully"}
 
+@job_runner.task("purge_customer")
+async def purge_customer(db, customer_id: int):
+    await sharding.fan_out(lambda shard: purge_orders(shard, lambda order: [order.customer_id == customer_id]))
+    await db.execute(delete(models.Customer).where(
+        models.Customer.id == customer_id, models.Customer.deleted_at.is_not(None)
+    ))
+    await db.commit()
+
 
-async def create_order(db, customer_id: int, order_data: schemas.OrderCreate):
+# Orders, order items and reviews live in the order shards (sharding.py), so
+# these functions use ``db`` only for catalog lookups. Order placement, status
+# updates and reviews are the hot write paths; they run on the owning shard's
+# write coordinator (group commit). Finished orders are eventually moved to the
+# archive tables (utils/archive.py); lookups by id and customer history fall
+# through to them, restaurant dashboards only see live orders.
+
+async def _find_order(session, order_id: int, with_items: bool = False):
+    for model in (models.Order, models.ArchivedOrder):
+        result = await session.execute(_order_by_id[(model, with_items)], {"order_id": order_id})
+        order = result.scalar_one_or_none()
+        if order:
+            return order
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+
+async def purge_orders(shard, criteria):
+    # The catalog cannot cascade into the shards, so the purge jobs of a deleted
+    # restaurant or customer remove its orders, items, reviews and activity
+    # rollups here. Each batch of orders is one write coordinator operation, so
+    # order placement on the shard is not held up by a large purge.
+    async def purge_batch(session, order_model, item_model):
+        result = await session.execute(
+            select(order_model.id).where(*criteria(order_model)).limit(PURGE_BATCH_SIZE)
+        )
+        order_ids = result.scalars().all()
+        if order_ids:
+            await session.execute(delete(models.Review).where(models.Review.order_id.in_(order_ids)))
+            await session.execute(delete(item_model).where(item_model.order_id.in_(order_ids)))
+            await session.execute(delete(order_model).where(order_model.id.in_(order_ids)))
+        return len(order_ids)
+
+    for order_model, item_model in ((models.Order, models.OrderItem), (models.ArchivedOrder, models.ArchivedOrderItem)):
+        while await shard.writer.submit(lambda session: purge_batch(session, order_model, item_model)) == PURGE_BATCH_SIZE:
+            pass
+    await shard.writer.submit(lambda session: session.execute(
+        delete(models.CustomerMonthlyActivity).where(*criteria(models.CustomerMonthlyActivity))
+    ))
+
+async def create_order(db, customer_id: int, order_data: schemas.OrderCreate, fence=None):
     validate_order_items(order_data.order_items)
-    
-    restaurant = await get_restaurant(db, order_data.restaurant_id)
-    validate_restaurant_operating_hours(restaurant)
 
-    menu_item_ids = [item.menu_item_id for item in order_data.order_items]
-    menu_items_query = select(models.MenuItems).where(
-        and_(
-            models.MenuItems.id.in_(menu_item_ids),
-            models.MenuItems.restaurant_id == order_data.restaurant_id,
-            models.MenuItems.is_available == True
+    # Validate against the catalog before queueing on the shard's writer.
+    async with database.ReadSessionLocal() as catalog:
+        await get_customer(catalog, customer_id)
+        restaurant = await get_restaurant(catalog, order_data.restaurant_id)
+        validate_restaurant_operating_hours(restaurant)
+
+        menu_item_ids = [item.menu_item_id for item in order_data.order_items]
+        menu_items_query = select(models.MenuItems).where(
+            and_(
+                models.MenuItems.id.in_(menu_item_ids),
+                models.MenuItems.restaurant_id == order_data.restaurant_id,
+                models.MenuItems.is_available == True
+            )
         )
-    )
-    menu_items_result = await db.execute(menu_items_query)
-    menu_items = menu_items_result.scalars().all()
+        menu_items_result = await catalog.execute(menu_items_query)
+        menu_items = menu_items_result.scalars().all()
     
     if len(menu_items) != len(menu_item_ids):
         raise HTTPException(
@@ -246,8 +426,8 @@ async def create_order(db, customer_id: int, order_data: schemas.OrderCreate):
             detail="Some menu items are not available or don't belong to this restaurant"
         )
     
-    menu_prices = {item.id: item.price for item in menu_items}
-    total_amount = calculate_order_total(order_data.order_items, menu_prices)
+    menu_prices = {item.id: item.price_paise for item in menu_items}
+    total_amount_paise = calculate_order_total(order_data.order_items, menu_prices)
     
     max_prep_time = max(item.preparation_time for item in menu_items)
     estimated_delivery = estimate_delivery_time(max_prep_time)
@@ -255,148 +435,304 @@ async def create_order(db, customer_id: int, order_data: schemas.OrderCreate):
     order_dict = order_data.dict(exclude={'order_items'})
     order_dict.update({
         'customer_id': customer_id,
-        'total_amount': total_amount,
+        'total_amount_paise': total_amount_paise,
         'delivery_time': estimated_delivery
     })
-    
-    new_order = models.Order(**order_dict)
-    db.add(new_order)
-    await db.flush()  
-    
-    for order_item_data in order_data.order_items:
-        order_item = models.OrderItem(
-            order_id=new_order.id,
-            menu_item_id=order_item_data.menu_item_id,
-            quantity=order_item_data.quantity,
-            item_price=menu_prices[order_item_data.menu_item_id],
-            special_requests=order_item_data.special_requests
-        )
-        db.add(order_item)
-    
-    await db.commit()
-    await db.refresh(new_order)
+    shard = shard_for_restaurant(order_data.restaurant_id)
+
+    async def place(session):
+        if fence is not None:
+            placed_id = await fence.find(session)
+            if placed_id is not None:
+                return await _find_order(session, placed_id), False
+
+        new_order = models.Order(id=await allocate_id(session, models.Order, shard), **order_dict)
+        session.add(new_order)
+        await session.flush()
+        
+        for order_item_data in order_data.order_items:
+            order_item = models.OrderItem(
+                id=await allocate_id(session, models.OrderItem, shard),
+                order_id=new_order.id,
+                menu_item_id=order_item_data.menu_item_id,
+                quantity=order_item_data.quantity,
+                item_price_paise=menu_prices[order_item_data.menu_item_id],
+                special_requests=order_item_data.special_requests
+            )
+            session.add(order_item)
+            await session.flush()
+        
+        await session.refresh(new_order)
+        await customer_activity.record_order(session, new_order)
+        if fence is not None:
+            fence.record(session, new_order.id)
+        return new_order, True
+
+    if fence is not None:
+        fence.shard = shard
+    new_order, placed = await shard.writer.submit(place)
+    if not placed:
+        return new_order
+    ordered = [(item.menu_item_id, item.quantity) for item in order_data.order_items]
+    leaderboards.record_order(new_order.restaurant_id, new_order.order_date)
+    popular_items.record(new_order.id, new_order.restaurant_id, ordered, new_order.order_date)
+    autocomplete.record_order(new_order.restaurant_id, ordered)
     return new_order
 
 async def get_order(db, order_id: int):
-    result = await db.execute(select(models.Order).where(models.Order.id == order_id))
-    order = result.scalar_one_or_none()
-    if not order:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
-    return order
+    async with shard_for_id(order_id).read_session() as session:
+        return await _find_order(session, order_id)
 
 async def get_order_with_details(db, order_id: int):
-    result = await db.execute(
-        select(models.Order)
-        .options(
-            joinedload(models.Order.customer),
-            joinedload(models.Order.restaurant),
-            selectinload(models.Order.order_items).joinedload(models.OrderItem.menu_item)
-        )
-        .where(models.Order.id == order_id)
-    )
-    order = result.scalar_one_or_none()
-    if not order:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+    async with shard_for_id(order_id).read_session() as session:
+        order = await _find_order(session, order_id, with_items=True)
+    
+    await attach_related(db, [order], "customer", models.Customer, "customer_id")
+    await attach_related(db, [order], "restaurant", models.Restaurant, "restaurant_id")
+    await attach_related(db, order.order_items, "menu_item", models.MenuItems, "menu_item_id")
     return order
 
 async def update_order_status(db, order_id: int, status_data: schemas.OrderUpdate):
-    order = await get_order(db, order_id)
-    
-    validate_status_transition(order.order_status, status_data.order_status)
-    
-    for key, value in status_data.dict(exclude_unset=True).items():
-        setattr(order, key, value)
-    
-    await db.commit()
-    await db.refresh(order)
+    async def apply(session):
+        order = await _find_order(session, order_id)
+        
+        new_status = models.OrderStatus(status_data.order_status.value)
+        validate_status_transition(order.order_status, new_status)
+        previous_status = order.order_status
+        
+        for key, value in status_data.dict(exclude_unset=True).items():
+            setattr(order, key, value)
+        order.order_status = new_status
+        
+        await session.flush()
+        await session.refresh(order)
+        return order, previous_status
+
+    order, previous_status = await shard_for_id(order_id).writer.submit(apply)
+    order_events.publish([OrderStatusChanged(
+        order.id, order.restaurant_id, order.customer_id, previous_status, order.order_status, order.order_date
+    )])
     return order
 
+async def bulk_update_order_status(db, restaurant_id: int, bulk: schemas.OrderStatusBulkUpdate) -> List[schemas.OrderStatusOutcome]:
+    await get_restaurant(db, restaurant_id)
+    new_status = models.OrderStatus(bulk.order_status.value)
+    sources = [source for source in models.OrderStatus if new_status in get_next_order_status(source)]
+    order_ids = list(dict.fromkeys(bulk.order_ids))
+
+    # A restaurant's orders share one shard, so the whole batch is one write
+    # coordinator operation: one UPDATE per source status that may move to
+    # new_status, then a lookup of the orders left behind to explain why.
+    async def apply(session):
+        changed = []
+        for source in sources:
+            result = await session.execute(
+                update(models.Order)
+                .where(
+                    models.Order.id.in_(order_ids),
+                    models.Order.restaurant_id == restaurant_id,
+                    models.Order.order_status == source
+                )
+                .values(order_status=new_status)
+                .returning(models.Order.id, models.Order.customer_id, models.Order.order_date)
+                .execution_options(synchronize_session=False)
+            )
+            changed.extend(
+                OrderStatusChanged(row.id, restaurant_id, row.customer_id, source, new_status, row.order_date)
+                for row in result.all()
+            )
+
+        updated = {event.order_id for event in changed}
+        remaining = [order_id for order_id in order_ids if order_id not in updated]
+        current = {}
+        for model in (models.Order, models.ArchivedOrder):
+            if remaining:
+                result = await session.execute(
+                    select(model.id, model.order_status)
+                    .where(model.id.in_(remaining), model.restaurant_id == restaurant_id)
+                )
+                current.update(result.all())
+        return changed, current
+
+    changed, current = await shard_for_restaurant(restaurant_id).writer.submit(apply)
+    order_events.publish(changed)
+
+    updated = {event.order_id for event in changed}
+    outcomes = []
+    for order_id in order_ids:
+        if order_id in updated:
+            outcomes.append(schemas.OrderStatusOutcome(order_id=order_id, updated=True, order_status=new_status.value))
+        elif order_id in current:
+            outcomes.append(schemas.OrderStatusOutcome(
+                order_id=order_id, updated=False, order_status=current[order_id].value,
+                detail=f"Cannot change status from {current[order_id].value} to {new_status.value}"
+            ))
+        else:
+            outcomes.append(schemas.OrderStatusOutcome(order_id=order_id, updated=False, detail="Order not found"))
+    return outcomes
+
 async def get_customer_orders(db, customer_id: int, skip: int = 0, limit: int = 10):
-    result = await db.execute(
-        select(models.Order)
-        .options(joinedload(models.Order.restaurant))
-        .where(models.Order.customer_id == customer_id)
-        .order_by(models.Order.order_date.desc())
-        .offset(skip)
-        .limit(limit)
-    )
-    return result.scalars().all()
+    def history(model):
+        return (
+            select(model)
+            .where(model.customer_id == customer_id)
+            .order_by(model.order_date.desc(), model.id.desc())
+            .limit(skip + limit)
+        )
+
+    results = await sharding.fan_out(lambda shard: read_with_archive(shard, history))
+    orders = merge_newest_first(chain.from_iterable(results), lambda order: (order.order_date, order.id), skip, limit)
+    await attach_related(db, orders, "restaurant", models.Restaurant, "restaurant_id")
+    return orders
 
 async def get_restaurant_orders(db, restaurant_id: int, skip: int = 0, limit: int = 10, status: Optional[models.OrderStatus] = None):
-    query = select(models.Order).options(joinedload(models.Order.customer)).where(models.Order.restaurant_id == restaurant_id)
+    query = select(models.Order).where(models.Order.restaurant_id == restaurant_id)
     
     if status:
         query = query.where(models.Order.order_status == status)
     
-    query = query.order_by(models.Order.order_date.desc()).offset(skip).limit(limit)
-    result = await db.execute(query)
-    return result.scalars().all()
+    query = query.order_by(models.Order.order_date.desc(), models.Order.id.desc()).offset(skip).limit(limit)
+    return await sharding.read(shard_for_restaurant(restaurant_id), query)
 
 
-async def create_review(db, customer_id: int, order_id: int, review_data: schemas.ReviewCreate):
-    order = await get_order_with_details(db, order_id)
-    validate_review_eligibility(order, customer_id)
-    
-    existing_review_query = select(models.Review).where(
-        and_(
-            models.Review.order_id == order_id,
-            models.Review.customer_id == customer_id
-        )
+async def get_kitchen_queue(db, restaurant_id: int) -> schemas.KitchenQueue:
+    await get_restaurant(db, restaurant_id)
+    orders = await sharding.read(
+        shard_for_restaurant(restaurant_id),
+        select(models.Order)
+        .options(selectinload(models.Order.order_items))
+        .where(models.Order.restaurant_id == restaurant_id, models.is_active_order(models.Order.order_status))
+        .order_by(models.Order.order_date, models.Order.id)
     )
-    existing_result = await db.execute(existing_review_query)
-    if existing_result.scalar_one_or_none():
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Review already exists for this order"
-        )
-    
-    new_review = models.Review(
-        customer_id=customer_id,
-        restaurant_id=order.restaurant_id,
-        order_id=order_id,
-        **review_data.dict()
+    await attach_related(db, [item for order in orders for item in order.order_items], "menu_item", models.MenuItems, "menu_item_id")
+
+    # Oldest first within each status; orders out for delivery no longer load the kitchen.
+    orders_by_status = {status.value: [] for status in models.ACTIVE_ORDER_STATUSES}
+    kitchen_load_minutes = 0
+    for order in orders:
+        items = [
+            schemas.KitchenQueueItem(
+                menu_item_id=item.menu_item_id,
+                name=item.menu_item.name,
+                quantity=item.quantity,
+                special_requests=item.special_requests,
+                preparation_time=item.menu_item.preparation_time
+            )
+            for item in order.order_items
+        ]
+        preparation_minutes = sum(item.preparation_time * item.quantity for item in items)
+        if order.order_status != models.OrderStatus.OUT_FOR_DELIVERY:
+            kitchen_load_minutes += preparation_minutes
+        orders_by_status[order.order_status.value].append(schemas.KitchenQueueOrder(
+            id=order.id,
+            customer_id=order.customer_id,
+            order_date=order.order_date,
+            delivery_time=order.delivery_time,
+            special_instructions=order.special_instructions,
+            preparation_minutes=preparation_minutes,
+            items=items
+        ))
+    return schemas.KitchenQueue(
+        restaurant_id=restaurant_id,
+        active_orders=len(orders),
+        kitchen_load_minutes=kitchen_load_minutes,
+        orders_by_status=orders_by_status
     )
-    db.add(new_review)
-    await db.commit()
-    await db.refresh(new_review)
-    
-    await update_restaurant_rating(db, order.restaurant_id)
+
+
+async def create_review(db, customer_id: int, order_id: int, review_data: schemas.ReviewCreate, fence=None):
+    shard = shard_for_id(order_id)
+
+    async def add(session):
+        if fence is not None:
+            review_id = await fence.find(session)
+            if review_id is not None:
+                return await session.get(models.Review, review_id), False, None
+
+        order = await _find_order(session, order_id)
+        validate_review_eligibility(order, customer_id)
+        
+        existing_review_query = select(models.Review).where(
+            and_(
+                models.Review.order_id == order_id,
+                models.Review.customer_id == customer_id
+            )
+        )
+        existing_result = await session.execute(existing_review_query)
+        if existing_result.scalar_one_or_none():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Review already exists for this order"
+            )
+        
+        new_review = models.Review(
+            id=await allocate_id(session, models.Review, shard),
+            customer_id=customer_id,
+            restaurant_id=order.restaurant_id,
+            order_id=order_id,
+            **review_data.dict()
+        )
+        session.add(new_review)
+        if fence is not None:
+            fence.record(session, new_review.id)
+        rating_job = None
+        if shard.shares_catalog:
+            rating_job = job_runner.enqueue(session, "update_restaurant_rating", restaurant_id=order.restaurant_id)
+        await session.flush()
+        await session.refresh(new_review)
+        return new_review, True, rating_job
+
+    if fence is not None:
+        fence.shard = shard
+    new_review, added, rating_job = await shard.writer.submit(add)
+    if not added:
+        return new_review
+    if rating_job is None:
+        # The jobs table is in the catalog, so the job commits after the review.
+        rating_job = job_runner.enqueue(db, "update_restaurant_rating", restaurant_id=new_review.restaurant_id)
+        await db.commit()
+    job_runner.dispatch(rating_job)
     
     return new_review
 
 async def get_restaurant_reviews(db, restaurant_id: int, skip: int = 0, limit: int = 10):
-    result = await db.execute(
+    reviews = await sharding.read(
+        shard_for_restaurant(restaurant_id),
         select(models.Review)
-        .options(joinedload(models.Review.customer))
         .where(models.Review.restaurant_id == restaurant_id)
         .order_by(models.Review.created_at.desc())
         .offset(skip)
         .limit(limit)
     )
-    return result.scalars().all()
+    await attach_related(db, reviews, "customer", models.Customer, "customer_id")
+    return reviews
 
 async def get_customer_reviews(db, customer_id: int, skip: int = 0, limit: int = 10):
-    result = await db.execute(
+    query = (
         select(models.Review)
-        .options(joinedload(models.Review.restaurant))
         .where(models.Review.customer_id == customer_id)
-        .order_by(models.Review.created_at.desc())
-        .offset(skip)
-        .limit(limit)
+        .order_by(models.Review.created_at.desc(), models.Review.id.desc())
+        .limit(skip + limit)
     )
-    return result.scalars().all()
+    results = await sharding.fan_out(lambda shard: sharding.read(shard, query))
+    return merge_newest_first(results, lambda review: (review.created_at, review.id), skip, limit)
 
+@job_runner.task("update_restaurant_rating")
 async def update_restaurant_rating(db, restaurant_id: int):
     avg_rating_query = select(func.avg(models.Review.rating)).where(models.Review.restaurant_id == restaurant_id)
-    result = await db.execute(avg_rating_query)
-    avg_rating = result.scalar() or 0.0
-    
-    restaurant_query = select(models.Restaurant).where(models.Restaurant.id == restaurant_id)
-    restaurant_result = await db.execute(restaurant_query)
-    restaurant = restaurant_result.scalar_one()
+    async with shard_for_restaurant(restaurant_id).read_session() as session:
+        result = await session.execute(avg_rating_query)
+        avg_rating = result.scalar() or 0.0
+    
+    restaurant_result = await db.execute(_restaurant_by_id, {"restaurant_id": restaurant_id})
+    restaurant = restaurant_result.scalar_one_or_none()
+    if restaurant is None:
+        return
     restaurant.rating = float(avg_rating)
     
     await db.commit()
+    leaderboards.set_rating(restaurant_id, restaurant.rating)
+    autocomplete.set_rating(restaurant_id, restaurant.rating)
 
 
 async def search_restaurants_advanced(
@@ -406,7 +742,8 @@ async def search_restaurants_advanced(
     min_rating: Optional[float] = None,
     is_active: bool = True,
     skip: int = 0,
-    limit: int = 10
+    limit: int = 10,
+    open_at: Optional[time] = None
 ):
     query = select(models.Restaurant).where(models.Restaurant.is_active == is_active)
     
@@ -419,42 +756,86 @@ async def search_restaurants_advanced(
     if min_rating:
         query = query.where(models.Restaurant.rating >= min_rating)
     
+    if open_at:
+        query = query.where(open_at_filter(open_at))
+    
     query = query.order_by(models.Restaurant.rating.desc()).offset(skip).limit(limit)
     result = await db.execute(query)
     return result.scalars().all()
 
-async def get_orders_by_date_range(
+async def search_restaurants_nearby(
     db,
-    restaurant_id: Optional[int] = None,
-    customer_id: Optional[int] = None,
-    start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None,
-    status: Optional[models.OrderStatus] = None,
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    cuisine_type: Optional[str] = None,
+    min_rating: Optional[float] = None,
+    is_active: bool = True,
     skip: int = 0,
-    limit: int = 10
+    limit: int = 10,
+    open_at: Optional[time] = None
 ):
-    
-    query = select(models.Order).options(
-        joinedload(models.Order.customer),
-        joinedload(models.Order.restaurant)
+    query = select(models.Restaurant).where(
+        and_(
+            models.Restaurant.geo_cell.in_(cells_within(latitude, longitude, radius_km)),
+            models.Restaurant.is_active == is_active
+        )
     )
     
-    if restaurant_id:
-        query = query.where(models.Order.restaurant_id == restaurant_id)
-    
-    if customer_id:
-        query = query.where(models.Order.customer_id == customer_id)
-    
-    if start_date:
-        query = query.where(models.Order.order_date >= start_date)
+    if cuisine_type:
+        query = query.where(models.Restaurant.cuisine_type.ilike(f"%{cuisine_type}%"))
     
-    if end_date:
-        query = query.where(models.Order.order_date <= end_date)
+    if min_rating:
+        query = query.where(models.Restaurant.rating >= min_rating)
     
-    if status:
-        query = query.where(models.Order.order_status == status)
+    if open_at:
+        query = query.where(open_at_filter(open_at))
     
-    query = query.order_by(models.Order.order_date.desc()).offset(skip).limit(limit)
     result = await db.execute(query)
-    return result.scalars().all()
+    candidates = []
+    for restaurant in result.scalars().all():
+        distance = haversine_km(latitude, longitude, restaurant.latitude, restaurant.longitude)
+        if distance <= radius_km:
+            candidates.append((distance, restaurant))
+    
+    candidates.sort(key=lambda candidate: candidate[0])
+    return candidates[skip:skip + limit]
 
+async def get_orders_by_date_range(
+    db,
+    restaurant_id: Optional[int] = None,
+    customer_id: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    status: Optional[models.OrderStatus] = None,
+    skip: int = 0,
+    limit: int = 10,
+    include_archived: bool = False
+):
+    
+    def matching(model):
+        query = _order_rows[model]
+        
+        if restaurant_id:
+            query = query.where(model.restaurant_id == restaurant_id)
+        
+        if customer_id:
+            query = query.where(model.customer_id == customer_id)
+        
+        if start_date:
+            query = query.where(model.order_date >= start_date)
+        
+        if end_date:
+            query = query.where(model.order_date <= end_date)
+        
+        if status:
+            query = query.where(model.order_status == status)
+        
+        return query.order_by(model.order_date.desc(), model.id.desc()).limit(skip + limit)
+    
+    targets = [shard_for_restaurant(restaurant_id)] if restaurant_id else None
+    models_to_read = (models.Order, models.ArchivedOrder) if include_archived else (models.Order,)
+    results = chain.from_iterable(await sharding.fan_out(
+        lambda shard: sharding.read_rows(shard, *(matching(model) for model in models_to_read)), targets
+    ))
+    return merge_newest_first(results, lambda order: (order.order_date, order.id), skip, limit)
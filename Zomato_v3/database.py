@@ -1,27 +1,93 @@
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from utils.deadlines import enforce_deadlines
+from utils.instrumentation import query_cache_stats
+
+
+DATABASE_PATH = "./database.db"
+DATABASE_URL = f"sqlite+aiosqlite:///{DATABASE_PATH}"
+READ_DATABASE_URL = f"sqlite+aiosqlite:///file:{DATABASE_PATH}?mode=ro&uri=true"
+# Compiled statements cached per engine. About a hundred statement sites, many
+# with optional filters that each compile to their own shape, plus ORM flushes
+# and relationship loaders, can outgrow SQLAlchemy's default of 500 entries and
+# make the LRU evict hot lookups. Hit rates are reported by GET /metrics.
+QUERY_CACHE_SIZE = 2000
+
+# SQLite has a single write lock, so writes share one connection and queue on the
+# pool instead of failing with "database is locked". Reads use read-only
+# connections; in WAL mode they never wait on the writer. The write coordinator
+# (utils/write_coordinator.py) owns a second writer connection for the hot
+# order and review paths.
+engine=create_async_engine(DATABASE_URL, echo=True, pool_size=1, max_overflow=0, pool_timeout=30, query_cache_size=QUERY_CACHE_SIZE)
+coordinator_engine=create_async_engine(DATABASE_URL, echo=True, pool_size=1, max_overflow=0, query_cache_size=QUERY_CACHE_SIZE)
+read_engine=create_async_engine(READ_DATABASE_URL, echo=True, pool_size=10, max_overflow=10, query_cache_size=QUERY_CACHE_SIZE)
+query_cache_stats.watch("catalog_write", engine)
+query_cache_stats.watch("catalog_coordinator", coordinator_engine)
+query_cache_stats.watch("catalog_read", read_engine)
 
-DATABASE_URL = "sqlite+aiosqlite:///./database.db"
-
-engine=create_async_engine(DATABASE_URL, echo=True)
 SessionLocal=sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+CoordinatorSessionLocal=sessionmaker(coordinator_engine, class_=AsyncSession, expire_on_commit=False)
+ReadSessionLocal=sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
 
 Base=declarative_base()
 
 
+def configure_writer(async_engine, foreign_keys=True):
+    # Take the write lock when the transaction starts (BEGIN IMMEDIATE) so writers
+    # wait in SQLite's busy handler instead of failing on a lock upgrade. The
+    # driver's own implicit BEGIN is disabled, which also makes SAVEPOINT work.
+    # Foreign keys are enforced, so ON DELETE CASCADE runs in the database; order
+    # shards turn them off because their tables reference the catalog's.
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _configure_write_connection(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level=None
+        cursor=dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.execute(f"PRAGMA foreign_keys={'ON' if foreign_keys else 'OFF'}")
+        cursor.close()
+
+    @event.listens_for(async_engine.sync_engine, "begin")
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+configure_writer(engine)
+configure_writer(coordinator_engine)
+
+
+def configure_reader(async_engine):
+    # Reads are bounded by the deadline of the request that issued them.
+    enforce_deadlines(async_engine)
 
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _configure_read_connection(dbapi_connection, connection_record):
+        cursor=dbapi_connection.cursor()
+        cursor.execute("PRAGMA query_only=ON")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
 
 
+configure_reader(read_engine)
 
 
-async def get_db():
+
+
+async def get_write_db():
     async with SessionLocal() as session:
         yield session
 
 
+async def get_read_db():
+    async with ReadSessionLocal() as session:
+        yield session
+
+
 
 
 
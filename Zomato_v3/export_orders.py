@@ -0,0 +1,293 @@
+"""Export orders, order items, menu items and reviews to partitioned Parquet.
+
+    python export_orders.py exports/          # rows changed since the last export
+    python export_orders.py exports/ --full   # everything
+
+Files are laid out as ``<table>/month=YYYY-MM/restaurant_id=N/part-<run>.parquet``
+(menu items by restaurant only). An incremental run writes changed rows again
+in new part files, so readers should keep the row with the latest
+``updated_at`` per id. Archiving an order sets its ``updated_at``, so the
+next incremental run exports it again with ``archived`` set.
+
+The watermark of a run is the database clock read before its first chunk,
+less ``COMMIT_GRACE`` for writes stamped before that but committed after.
+Rows changed while the run reads are therefore exported again by the next
+one rather than skipped. Watermarks are kept in ``_watermark.json`` and only
+advanced after every file of the run has been closed.
+"""
+import argparse
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func, literal
+from sqlalchemy.future import select
+
+import database
+import models
+import sharding
+from utils.money import to_rupees
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only the export needs it
+    pa = pq = None
+
+CHUNK_SIZE = 10_000
+MAX_OPEN_FILES = 128
+WATERMARK_FILE = "_watermark.json"
+WATERMARK_FORMAT = "%Y-%m-%d %H:%M:%S"
+COMMIT_GRACE = timedelta(minutes=1)
+STATUSES = [order_status.value for order_status in models.OrderStatus]
+
+
+def _schemas():
+    money = pa.decimal128(10, 2)
+    timestamp = pa.timestamp("us", tz="UTC")
+    # Every status is in the dictionary, in enum order, whatever a batch contains.
+    order_status = pa.dictionary(pa.int8(), pa.string())
+    # restaurant_id and month are partition columns: they are only in the path,
+    # which is where Hive-style readers (pyarrow.dataset, Spark, DuckDB) take them from.
+    return {
+        "orders": pa.schema([
+            ("id", pa.int64()),
+            ("customer_id", pa.int64()),
+            ("order_status", order_status),
+            ("total_amount", money),
+            ("delivery_address", pa.string()),
+            ("special_instructions", pa.string()),
+            ("order_date", timestamp),
+            ("delivery_time", timestamp),
+            ("created_at", timestamp),
+            ("updated_at", timestamp),
+            ("archived", pa.bool_()),
+        ]),
+        "order_items": pa.schema([
+            ("id", pa.int64()),
+            ("order_id", pa.int64()),
+            ("menu_item_id", pa.int64()),
+            ("quantity", pa.int32()),
+            ("item_price", money),
+            ("special_requests", pa.string()),
+            ("created_at", timestamp),
+        ]),
+        "menu_items": pa.schema([
+            ("id", pa.int64()),
+            ("name", pa.string()),
+            ("description", pa.string()),
+            ("category", pa.string()),
+            ("price", money),
+            ("is_vegetarian", pa.bool_()),
+            ("is_vegan", pa.bool_()),
+            ("is_available", pa.bool_()),
+            ("preparation_time", pa.int32()),
+            ("created_at", timestamp),
+            ("updated_at", timestamp),
+        ]),
+        "reviews": pa.schema([
+            ("id", pa.int64()),
+            ("customer_id", pa.int64()),
+            ("order_id", pa.int64()),
+            ("rating", pa.int8()),
+            ("comment", pa.string()),
+            ("created_at", timestamp),
+        ]),
+    }
+
+
+def _column(field, values):
+    if pa.types.is_dictionary(field.type):
+        indices = pa.array([None if value is None else STATUSES.index(value.value) for value in values], pa.int8())
+        return pa.DictionaryArray.from_arrays(indices, pa.array(STATUSES))
+    return pa.array(values, type=field.type)
+
+
+def _record_batch(schema, rows, **extra):
+    columns = []
+    for field in schema:
+        if field.name in extra:
+            values = [extra[field.name](row) for row in rows]
+        else:
+            values = [getattr(row, field.name) for row in rows]
+        columns.append(_column(field, values))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def _month(value: Optional[datetime]) -> str:
+    return value.strftime("%Y-%m") if value else "unknown"
+
+
+class PartitionedWriter:
+    """Parquet writers per partition, at most ``max_open`` open at a time.
+
+    A partition whose writer was closed to make room continues in a new part
+    file, so no file is ever reopened.
+    """
+
+    def __init__(self, out_dir: str, run_id: str, max_open: int = MAX_OPEN_FILES):
+        self.out_dir = out_dir
+        self.run_id = run_id
+        self.max_open = max_open
+        self._writers: "OrderedDict[Tuple[str, ...], pq.ParquetWriter]" = OrderedDict()
+        self._parts: Dict[Tuple[str, ...], int] = {}
+        self.rows_written = 0
+
+    def write(self, table: str, partition: Tuple[str, ...], batch) -> None:
+        key = (table, *partition)
+        writer = self._writers.get(key)
+        if writer is None:
+            while len(self._writers) >= self.max_open:
+                self._writers.popitem(last=False)[1].close()
+            part = self._parts.get(key, 0)
+            self._parts[key] = part + 1
+            directory = os.path.join(self.out_dir, table, *partition)
+            os.makedirs(directory, exist_ok=True)
+            suffix = f"-{part}" if part else ""
+            writer = pq.ParquetWriter(os.path.join(directory, f"part-{self.run_id}{suffix}.parquet"), batch.schema)
+            self._writers[key] = writer
+        else:
+            self._writers.move_to_end(key)
+        writer.write_batch(batch)
+        self.rows_written += batch.num_rows
+
+    def close(self) -> None:
+        while self._writers:
+            self._writers.popitem(last=False)[1].close()
+
+
+def _write_grouped(writer, table, schema, rows, partition_of, **extra):
+    groups: Dict[Tuple[str, ...], list] = {}
+    for row in rows:
+        groups.setdefault(partition_of(row), []).append(row)
+    for partition, group in groups.items():
+        writer.write(table, partition, _record_batch(schema, group, **extra))
+
+
+async def _chunks(session_factory, model, changed_at, since: Optional[str], chunk_size: int):
+    """Rows of ``model`` changed at or after ``since``, ``chunk_size`` at a time by id."""
+    columns = model.__table__.columns
+    last_id = 0
+    while True:
+        query = select(*columns).where(model.id > last_id).order_by(model.id).limit(chunk_size)
+        if since is not None:
+            query = query.where(changed_at(model) >= literal(since))
+        async with session_factory() as session:
+            rows = (await session.execute(query)).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _order_changed_at(model):
+    return func.coalesce(model.updated_at, model.created_at)
+
+
+async def _export_orders(writer, schemas, since: Optional[str], chunk_size: int) -> None:
+    for shard in sharding.shards:
+        for order_model, item_model in ((models.Order, models.OrderItem), (models.ArchivedOrder, models.ArchivedOrderItem)):
+            archived = order_model is models.ArchivedOrder
+            async for orders in _chunks(shard.read_session, order_model, _order_changed_at, since, chunk_size):
+                partitions = {
+                    order.id: (f"month={_month(order.order_date)}", f"restaurant_id={order.restaurant_id}")
+                    for order in orders
+                }
+                _write_grouped(
+                    writer, "orders", schemas["orders"], orders,
+                    lambda order: partitions[order.id], archived=lambda order: archived,
+                    total_amount=lambda order: to_rupees(order.total_amount_paise)
+                )
+
+                async with shard.read_session() as session:
+                    items = (await session.execute(
+                        select(*item_model.__table__.columns)
+                        .where(item_model.order_id.in_(list(partitions)))
+                        .order_by(item_model.id)
+                    )).all()
+                _write_grouped(
+                    writer, "order_items", schemas["order_items"], items,
+                    lambda item: partitions[item.order_id], item_price=lambda item: to_rupees(item.item_price_paise)
+                )
+
+
+async def _export_reviews(writer, schemas, since: Optional[str], chunk_size: int) -> None:
+    for shard in sharding.shards:
+        async for reviews in _chunks(shard.read_session, models.Review, lambda model: model.created_at, since, chunk_size):
+            _write_grouped(
+                writer, "reviews", schemas["reviews"], reviews,
+                lambda review: (f"month={_month(review.created_at)}", f"restaurant_id={review.restaurant_id}")
+            )
+
+
+async def _export_menu_items(writer, schemas, since: Optional[str], chunk_size: int) -> None:
+    async for items in _chunks(database.ReadSessionLocal, models.MenuItems, _order_changed_at, since, chunk_size):
+        _write_grouped(
+            writer, "menu_items", schemas["menu_items"], items,
+            lambda item: (f"restaurant_id={item.restaurant_id}",), price=lambda item: to_rupees(item.price_paise)
+        )
+
+
+async def _watermark() -> str:
+    # The database's clock, which is the one func.now() stamps rows with.
+    async with database.ReadSessionLocal() as session:
+        now = (await session.execute(select(func.current_timestamp()))).scalar_one()
+    if isinstance(now, str):
+        now = datetime.strptime(now, WATERMARK_FORMAT)
+    return (now - COMMIT_GRACE).strftime(WATERMARK_FORMAT)
+
+
+def _load_watermarks(out_dir: str) -> Dict[str, str]:
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_watermarks(out_dir: str, watermarks: Dict[str, str]) -> None:
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(watermarks, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+async def export(out_dir: str, full: bool = False, chunk_size: int = CHUNK_SIZE) -> Dict[str, str]:
+    if pa is None:
+        raise RuntimeError("The Parquet export needs pyarrow: pip install pyarrow")
+
+    os.makedirs(out_dir, exist_ok=True)
+    since = {} if full else _load_watermarks(out_dir)
+    schemas = _schemas()
+    writer = PartitionedWriter(out_dir, datetime.utcnow().strftime("%Y%m%dT%H%M%S%f"))
+    watermark = await _watermark()
+    exporters = (("orders", _export_orders), ("reviews", _export_reviews), ("menu_items", _export_menu_items))
+    try:
+        for table, exporter in exporters:
+            await exporter(writer, schemas, since.get(table), chunk_size)
+    finally:
+        writer.close()
+    watermarks = {table: watermark for table, _ in exporters}
+    _save_watermarks(out_dir, watermarks)
+    print(f"Exported {writer.rows_written} rows to {out_dir}")
+    return watermarks
+
+
+async def _main(args) -> None:
+    try:
+        await export(args.out_dir, args.full, args.chunk_size)
+    finally:
+        for shard in sharding.shards:
+            await shard.read_engine.dispose()
+        await database.read_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out_dir")
+    parser.add_argument("--full", action="store_true", help="ignore the watermarks and export everything")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    asyncio.run(_main(parser.parse_args()))
@@ -1,12 +1,46 @@
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
-import models, database, routes
+import models, database, routes, migrations, crud, sharding
+from utils.jobs import job_runner
+from utils.write_coordinator import write_coordinator
+from utils.rate_limit import RateLimitMiddleware
+from utils.platform_analytics import platform_analytics
+from utils.leaderboards import leaderboards
+from utils.autocomplete import autocomplete
+from utils.heavy_hitters import popular_items
+from utils import customer_activity
+from utils.instrumentation import query_cache_stats, query_deadline_stats
+from utils.deadlines import QueryDeadlineExceeded, QueryDeadlineMiddleware, deadline_exceeded_handler
+from utils import profiling
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     async with database.engine.begin() as conn:
-        await conn.run_sync(models.Base.metadata.create_all)
+        await conn.run_sync(models.Base.metadata.create_all, tables=sharding.catalog_tables())
+        await conn.run_sync(migrations.add_missing_columns, models.Base.metadata)
+    async with database.SessionLocal() as db:
+        await crud.backfill_open_intervals(db)
+    await write_coordinator.start()
+    await sharding.start()
+    await customer_activity.backfill()
+    async with database.ReadSessionLocal() as db:
+        await leaderboards.rebuild(db)
+    async with database.ReadSessionLocal() as db:
+        await autocomplete.rebuild(db)
+    async with database.ReadSessionLocal() as db:
+        await popular_items.load(db)
+    await popular_items.start(database.SessionLocal)
+    await job_runner.start()
+    await platform_analytics.start()
     yield
+    await platform_analytics.stop()
+    await job_runner.stop()
+    await popular_items.stop()
+    await sharding.stop()
+    await write_coordinator.stop()
+    await database.read_engine.dispose()
+    await database.coordinator_engine.dispose()
+    await database.engine.dispose()
 
 app = FastAPI(
     title="Zomato v3 - Complete Food Delivery System",
@@ -16,11 +50,21 @@ app = FastAPI(
 )
 
 
+# Profiling is opt-in: without DEBUG_TOKEN requests do not pass through it at all.
+if profiling.DEBUG_TOKEN:
+    app.add_middleware(profiling.ProfilingMiddleware)
+app.add_middleware(QueryDeadlineMiddleware)
+app.add_middleware(RateLimitMiddleware)
+app.add_exception_handler(QueryDeadlineExceeded, deadline_exceeded_handler)
+
 app.include_router(routes.restaurants_router)
 app.include_router(routes.menu_items_router)
 app.include_router(routes.customers_router)
 app.include_router(routes.orders_router)
 app.include_router(routes.reviews_router)
+app.include_router(routes.analytics_router)
+app.include_router(routes.autocomplete_router)
+app.include_router(routes.debug_router)
 
 @app.get("/")
 async def root():
@@ -43,3 +87,7 @@ async def root():
 async def health_check():
     return {"status": "healthy", "version": "3.0.0"}
 
+@app.get("/metrics")
+async def metrics():
+    return {"query_cache": query_cache_stats.snapshot(), "query_deadlines": query_deadline_stats.snapshot()}
+
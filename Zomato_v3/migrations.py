@@ -0,0 +1,93 @@
+import logging
+
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
+
+logger = logging.getLogger(__name__)
+
+# Money columns that moved from DECIMAL(10, 2) rupees to integer paise.
+PAISE_COLUMNS = {
+    "menu_items": ("price", "price_paise"),
+    "orders": ("total_amount", "total_amount_paise"),
+    "order_items": ("item_price", "item_price_paise"),
+    "archived_orders": ("total_amount", "total_amount_paise"),
+    "archived_order_items": ("item_price", "item_price_paise"),
+    "customer_monthly_activity": ("total_spent", "total_spent_paise"),
+}
+
+
+def _convert_to_paise(conn, inspector, existing_tables) -> None:
+    for table, (rupee_column, paise_column) in PAISE_COLUMNS.items():
+        if table not in existing_tables:
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table)}
+        if rupee_column not in columns or paise_column in columns:
+            continue
+        logger.info("Converting %s.%s to integer paise", table, rupee_column)
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {paise_column} INTEGER NOT NULL DEFAULT 0")
+        conn.exec_driver_sql(f"UPDATE {table} SET {paise_column} = CAST(ROUND({rupee_column} * 100) AS INTEGER)")
+        conn.exec_driver_sql(f"ALTER TABLE {table} DROP COLUMN {rupee_column}")
+
+
+def _drop_removed_foreign_keys(conn, metadata, inspector, existing_tables) -> None:
+    # SQLite cannot drop a constraint, so a table whose model no longer declares
+    # one of its foreign keys (reviews.order_id, so reviews survive archiving)
+    # is rebuilt from the model and its rows copied over.
+    if conn.dialect.name != "sqlite":
+        return
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        declared = {
+            (tuple(fk.parent.name for fk in constraint.elements), constraint.referred_table.name)
+            for constraint in table.foreign_key_constraints
+        }
+        existing = {
+            (tuple(fk["constrained_columns"]), fk["referred_table"])
+            for fk in inspector.get_foreign_keys(table.name)
+        }
+        if existing <= declared:
+            continue
+        logger.info("Rebuilding %s without foreign keys %s", table.name, sorted(existing - declared))
+        old_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        columns = ", ".join(column.name for column in table.columns if column.name in old_columns)
+        for index in inspector.get_indexes(table.name):
+            conn.exec_driver_sql(f"DROP INDEX {index['name']}")
+        conn.exec_driver_sql(f"ALTER TABLE {table.name} RENAME TO _{table.name}_old")
+        table.create(conn)
+        conn.exec_driver_sql(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM _{table.name}_old")
+        conn.exec_driver_sql(f"DROP TABLE _{table.name}_old")
+
+
+def add_missing_columns(conn, metadata) -> None:
+    """Bring tables created by an older ``create_all`` up to date.
+
+    ``create_all`` only creates missing tables, so columns and indexes added to
+    existing models are applied here. Only nullable columns or columns with a
+    server default can be added in place, which is all SQLite's ``ADD COLUMN``
+    supports; anything else is logged and needs the table rebuilt. Money
+    columns are converted to integer paise first (see ``PAISE_COLUMNS``), and
+    tables holding foreign keys the models dropped are rebuilt.
+    """
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    _convert_to_paise(conn, inspector, existing_tables)
+    inspector = inspect(conn)
+    _drop_removed_foreign_keys(conn, metadata, inspector, existing_tables)
+    inspector = inspect(conn)
+
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            if not column.nullable and column.server_default is None:
+                logger.warning("Cannot add NOT NULL column %s.%s in place; rebuild the table",
+                               table.name, column.name)
+                continue
+            ddl = CreateColumn(column).compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
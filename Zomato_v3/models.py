@@ -1,7 +1,10 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, Text, Time, DateTime, func, ForeignKey, DECIMAL, DATETIME, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, Boolean, Text, Time, DateTime, func, ForeignKey, DATETIME, Enum, Index, LargeBinary, Date
+from sqlalchemy import event, select, bindparam
+from sqlalchemy.orm import Session, relationship, with_loader_criteria
 from database import Base
+from utils.money import rupees
 import enum
+import weakref
 
 
 class Restaurant(Base):
@@ -15,17 +18,44 @@ class Restaurant(Base):
     address=Column(String, nullable=False)
     phone_number=Column(String, nullable=False)
     location=Column(String, nullable=False)
+    latitude=Column(Float)
+    longitude=Column(Float)
+    geo_cell=Column(String(32), index=True)
     rating=Column(Float, default=0.0)
     is_active=Column(Boolean, default=True)
     opening_time=Column(Time, nullable=False)
     closing_time=Column(Time, nullable=False)
     created_at=Column(DateTime(timezone=True), server_default=func.now())
     updated_at=Column(DateTime(timezone=True),  onupdate=func.now())
+    deleted_at=Column(DateTime)  # set by crud.delete_restaurant; the row is purged in the background
 
 
-    menu_items=relationship("MenuItems", back_populates="restaurant", cascade="all, delete-orphan")
-    orders=relationship("Order", back_populates="restaurant", cascade="all, delete-orphan")
-    reviews=relationship("Review", back_populates="restaurant", cascade="all, delete-orphan")
+    menu_items=relationship("MenuItems", back_populates="restaurant", cascade="all, delete-orphan", passive_deletes=True)
+    # Orders and reviews may live in another database (sharding.py); crud deletes them.
+    orders=relationship("Order", back_populates="restaurant", cascade="all, delete-orphan", passive_deletes=True)
+    reviews=relationship("Review", back_populates="restaurant", cascade="all, delete-orphan", passive_deletes=True)
+    open_intervals=relationship("RestaurantOpenInterval", back_populates="restaurant", cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__=(
+        # Only the few restaurants awaiting their purge are indexed.
+        Index("ix_restaurants_deleted", "id", sqlite_where=deleted_at.is_not(None)),
+    )
+
+
+class RestaurantOpenInterval(Base):
+    __tablename__="restaurant_open_intervals"
+
+    # Operating hours as minute-of-day ranges; overnight hours are split at midnight.
+    id=Column(Integer, primary_key=True, index=True)
+    restaurant_id=Column(Integer, ForeignKey("restaurants.id", ondelete="CASCADE"), nullable=False, index=True)
+    open_minute=Column(Integer, nullable=False)
+    close_minute=Column(Integer, nullable=False)
+
+    restaurant=relationship("Restaurant", back_populates="open_intervals")
+
+    __table_args__=(
+        Index("ix_restaurant_open_intervals_window", "open_minute", "close_minute"),
+    )
 
 
 
@@ -37,7 +67,7 @@ class MenuItems(Base):
     id=Column(Integer, primary_key=True, index=True)
     name=Column(String, nullable=False)
     description=Column(Text, nullable=False)
-    price=Column(DECIMAL(10, 2), nullable=False)
+    price_paise=Column(Integer, nullable=False)
     category=Column(String, nullable=False)
     is_vegetarian=Column(Boolean, default=False)
     is_vegan=Column(Boolean, default=False)
@@ -48,7 +78,9 @@ class MenuItems(Base):
     updated_at=Column(DateTime(timezone=True), onupdate=func.now())
 
     restaurant=relationship("Restaurant", back_populates="menu_items")
-    order_items=relationship("OrderItem", back_populates="menu_item", cascade="all, delete-orphan")
+    order_items=relationship("OrderItem", back_populates="menu_item", cascade="all, delete-orphan", passive_deletes=True)
+
+    price=rupees("price_paise")
 
 
 class Customer(Base):
@@ -62,9 +94,10 @@ class Customer(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    deleted_at = Column(DateTime)  # set by crud.delete_customer; the row is purged in the background
     
-    orders = relationship("Order", back_populates="customer", cascade="all, delete-orphan")
-    reviews = relationship("Review", back_populates="customer", cascade="all, delete-orphan")
+    orders = relationship("Order", back_populates="customer", cascade="all, delete-orphan", passive_deletes=True)
+    reviews = relationship("Review", back_populates="customer", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class OrderStatus(enum.Enum):
@@ -76,6 +109,16 @@ class OrderStatus(enum.Enum):
     CANCELLED = "cancelled"
 
 
+# Orders the restaurant still has to act on; ix_orders_active_queue covers only these.
+ACTIVE_ORDER_STATUSES = (OrderStatus.PLACED, OrderStatus.CONFIRMED, OrderStatus.PREPARING, OrderStatus.OUT_FOR_DELIVERY)
+
+
+def is_active_order(status_column):
+    # SQLite only uses a partial index when the query repeats its WHERE term with
+    # the same literals, so the statuses are rendered inline instead of bound.
+    return status_column.in_(bindparam("active_statuses", ACTIVE_ORDER_STATUSES, unique=True, expanding=True, literal_execute=True))
+
+
 class Order(Base):
     __tablename__ = "orders"
     
@@ -83,7 +126,7 @@ class Order(Base):
     customer_id = Column(Integer, ForeignKey("customers.id", ondelete="CASCADE"), nullable=False)
     restaurant_id = Column(Integer, ForeignKey("restaurants.id", ondelete="CASCADE"), nullable=False)
     order_status = Column(Enum(OrderStatus), default=OrderStatus.PLACED)
-    total_amount = Column(DECIMAL(10, 2), nullable=False)
+    total_amount_paise = Column(Integer, nullable=False)
     delivery_address = Column(Text, nullable=False)
     special_instructions = Column(Text)
     order_date = Column(DateTime(timezone=True), server_default=func.now())
@@ -94,7 +137,15 @@ class Order(Base):
     customer = relationship("Customer", back_populates="orders")
     restaurant = relationship("Restaurant", back_populates="orders")
     order_items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
-    reviews = relationship("Review", back_populates="order", cascade="all, delete-orphan")
+    reviews = relationship("Review", back_populates="order", cascade="all, delete-orphan",
+                           primaryjoin="Order.id == foreign(Review.order_id)")
+
+    total_amount = rupees("total_amount_paise")
+
+    __table_args__ = (
+        Index("ix_orders_active_queue", "restaurant_id", "order_date", "id",
+              sqlite_where=order_status.in_(ACTIVE_ORDER_STATUSES)),
+    )
 
 
 class OrderItem(Base):
@@ -104,13 +155,79 @@ class OrderItem(Base):
     order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False)
     menu_item_id = Column(Integer, ForeignKey("menu_items.id", ondelete="CASCADE"), nullable=False)
     quantity = Column(Integer, nullable=False)
-    item_price = Column(DECIMAL(10, 2), nullable=False)  # Price at time of order
+    item_price_paise = Column(Integer, nullable=False)  # Price at time of order
     special_requests = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     order = relationship("Order", back_populates="order_items")
     menu_item = relationship("MenuItems", back_populates="order_items")
 
+    item_price = rupees("item_price_paise")
+
+
+class ArchivedOrder(Base):
+    __tablename__ = "archived_orders"
+
+    # Delivered and cancelled orders past the retention window (utils/archive.py).
+    # Same columns as orders, ids included, so archived rows keep their identity.
+    id = Column(Integer, primary_key=True)
+    customer_id = Column(Integer, ForeignKey("customers.id", ondelete="CASCADE"), nullable=False, index=True)
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id", ondelete="CASCADE"), nullable=False, index=True)
+    order_status = Column(Enum(OrderStatus), nullable=False)
+    total_amount_paise = Column(Integer, nullable=False)
+    delivery_address = Column(Text, nullable=False)
+    special_instructions = Column(Text)
+    order_date = Column(DateTime(timezone=True))
+    delivery_time = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True))
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    customer = relationship("Customer")
+    restaurant = relationship("Restaurant")
+    order_items = relationship("ArchivedOrderItem", back_populates="order")
+
+    total_amount = rupees("total_amount_paise")
+
+
+class ArchivedOrderItem(Base):
+    __tablename__ = "archived_order_items"
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey("archived_orders.id", ondelete="CASCADE"), nullable=False, index=True)
+    menu_item_id = Column(Integer, ForeignKey("menu_items.id", ondelete="CASCADE"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    item_price_paise = Column(Integer, nullable=False)
+    special_requests = Column(Text)
+    created_at = Column(DateTime(timezone=True))
+
+    order = relationship("ArchivedOrder", back_populates="order_items")
+    menu_item = relationship("MenuItems")
+
+    item_price = rupees("item_price_paise")
+
+
+class CustomerMonthlyActivity(Base):
+    __tablename__ = "customer_monthly_activity"
+
+    # Maintained by utils/customer_activity.py; month is YYYY-MM of order_date.
+    customer_id = Column(Integer, primary_key=True)
+    month = Column(String(7), primary_key=True)
+    restaurant_id = Column(Integer, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    total_spent_paise = Column(Integer, nullable=False, default=0)
+
+
+class RestaurantDailyCustomers(Base):
+    __tablename__ = "restaurant_daily_customers"
+
+    # HyperLogLog sketches (utils/hyperloglog.py) of the customers who ordered
+    # on a UTC day, and of those among them who had ordered there before.
+    restaurant_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    customers = Column(LargeBinary, nullable=False)
+    returning_customers = Column(LargeBinary, nullable=False)
+
 
 class Review(Base):
     __tablename__ = "reviews"
@@ -118,11 +235,124 @@ class Review(Base):
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(Integer, ForeignKey("customers.id", ondelete="CASCADE"), nullable=False)
     restaurant_id = Column(Integer, ForeignKey("restaurants.id", ondelete="CASCADE"), nullable=False)
-    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False)
+    # No foreign key: a review stays when its order moves to archived_orders.
+    order_id = Column(Integer, nullable=False)
     rating = Column(Integer, nullable=False)  # 1-5 rating
     comment = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     customer = relationship("Customer", back_populates="reviews")
     restaurant = relationship("Restaurant", back_populates="reviews")
-    order = relationship("Order", back_populates="reviews")
\ No newline at end of file
+    order = relationship("Order", back_populates="reviews", primaryjoin="foreign(Review.order_id) == Order.id")
+
+class JobStatus(enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    FAILED = "failed"
+
+
+class BackgroundJob(Base):
+    __tablename__ = "background_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(Enum(JobStatus), default=JobStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    run_after = Column(DateTime, nullable=False)
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_background_jobs_status_run_after", "status", "run_after"),
+    )
+
+
+class IdempotencyRecord(Base):
+    __tablename__ = "idempotency_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String(100), nullable=False)
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer)  # NULL while the original request is in flight
+    response_body = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    claimed_at = Column(DateTime)  # start of the in-flight request's lease
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_scope_key", "scope", "key", unique=True),
+    )
+
+
+class IdempotencyFence(Base):
+    # Lives with the orders: written in the same shard transaction as the row
+    # an idempotent request created, so that row exists exactly when this does.
+    __tablename__ = "idempotency_fences"
+
+    id = Column(Integer, primary_key=True)
+    scope = Column(String(100), nullable=False)
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    resource_id = Column(Integer, nullable=False)  # the order or review created
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        Index("ix_idempotency_fences_scope_key", "scope", "key", unique=True),
+    )
+
+
+class Sketch(Base):
+    __tablename__ = "sketches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(32), nullable=False)
+    restaurant_id = Column(Integer, nullable=False)
+    period = Column(String(16), nullable=False)  # "all" or a UTC day, YYYY-MM-DD
+    payload = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_sketches_kind_restaurant_period", "kind", "restaurant_id", "period", unique=True),
+    )
+
+
+class SketchCheckpoint(Base):
+    __tablename__ = "sketch_checkpoints"
+
+    # Last order id per shard already folded into the persisted sketches of a kind.
+    kind = Column(String(32), primary_key=True)
+    shard_index = Column(Integer, primary_key=True)
+    last_order_id = Column(Integer, nullable=False)
+
+
+_restaurants = Restaurant.__table__
+_deleted_restaurant_ids = select(_restaurants.c.id).where(_restaurants.c.deleted_at.is_not(None))
+_SOFT_DELETE_CRITERIA = (
+    with_loader_criteria(Restaurant, Restaurant.deleted_at.is_(None), include_aliases=True),
+    with_loader_criteria(Customer, Customer.deleted_at.is_(None), include_aliases=True),
+    with_loader_criteria(MenuItems, MenuItems.restaurant_id.not_in(_deleted_restaurant_ids), include_aliases=True),
+)
+# Statement -> statement with the criteria. Module-level statements (crud's
+# prebuilt lookups) get one filtered copy whose cache key is computed once.
+_filtered_statements = weakref.WeakKeyDictionary()
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _hide_deleted(execute_state):
+    # Soft-deleted restaurants and customers, and the menus of those restaurants,
+    # are invisible to every ORM query until they are purged, unless it passes
+    # execution_options(include_deleted=True).
+    if (
+        execute_state.is_select
+        and not execute_state.is_column_load
+        and not execute_state.execution_options.get("include_deleted", False)
+    ):
+        statement = execute_state.statement
+        filtered = _filtered_statements.get(statement)
+        if filtered is None:
+            filtered = _filtered_statements[statement] = statement.options(*_SOFT_DELETE_CRITERIA)
+        execute_state.statement = filtered
@@ -3,6 +3,9 @@ from .menu_items import router as menu_items_router
 from .customers import router as customers_router
 from .orders import router as orders_router
 from .reviews import router as reviews_router
+from .analytics import router as analytics_router
+from .autocomplete import router as autocomplete_router
+from .debug import router as debug_router
 
 
 
@@ -0,0 +1,46 @@
+from fastapi import APIRouter
+import schemas
+from utils.money import to_rupees
+from utils.platform_analytics import platform_analytics
+
+router = APIRouter(prefix="/analytics/platform", tags=["Analytics"])
+
+
+def _revenue(rows):
+    return [
+        schemas.RevenueBreakdown(key=row["key"], orders=row["orders"], revenue=to_rupees(row["revenue_paise"]))
+        for row in rows
+    ]
+
+
+@router.get("/revenue", response_model=schemas.PlatformRevenue)
+async def platform_revenue():
+    """Revenue of non-cancelled orders by city, cuisine and hour of day (UTC)"""
+    stats = await platform_analytics.stats()
+    return schemas.PlatformRevenue(
+        computed_at=platform_analytics.computed_at,
+        total_orders=stats["total_orders"],
+        total_revenue=to_rupees(stats["revenue_paise"]),
+        by_city=_revenue(stats["revenue_by_city"]),
+        by_cuisine=_revenue(stats["revenue_by_cuisine"]),
+        by_hour={hour: to_rupees(paise) for hour, paise in enumerate(stats["revenue_by_hour"])}
+    )
+
+
+@router.get("/funnel", response_model=schemas.PlatformFunnel)
+async def status_funnel():
+    """Orders reaching each status and the conversion from the previous one"""
+    stats = await platform_analytics.stats()
+    return schemas.PlatformFunnel(computed_at=platform_analytics.computed_at, stages=stats["funnel"])
+
+
+@router.get("/cancellations", response_model=schemas.PlatformCancellations)
+async def cancellation_rates():
+    """Cancellation rate overall, by city and by cuisine"""
+    stats = await platform_analytics.stats()
+    return schemas.PlatformCancellations(
+        computed_at=platform_analytics.computed_at,
+        **stats["cancellations"],
+        by_city=stats["cancellations_by_city"],
+        by_cuisine=stats["cancellations_by_cuisine"]
+    )
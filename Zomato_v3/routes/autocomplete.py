@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Query
+from typing import List, Optional
+import schemas
+from utils.autocomplete import SUGGESTION_LIMIT, autocomplete
+
+router = APIRouter(prefix="/autocomplete", tags=["Search"])
+
+
+@router.get("", response_model=List[schemas.AutocompleteSuggestion])
+async def suggest(
+    q: str = Query(..., min_length=1, max_length=100, description="What has been typed so far"),
+    kind: Optional[schemas.SuggestionKind] = Query(None, description="Only restaurants, cuisines or dishes"),
+    limit: int = Query(SUGGESTION_LIMIT, ge=1, le=SUGGESTION_LIMIT)
+):
+    """Restaurants, cuisines and dishes with a word starting with ``q``, most ordered first"""
+    return autocomplete.suggest(q, kind.value if kind else None, limit)
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Header
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 import crud, schemas, database
 from utils.business_logic import calculate_customer_analytics
+from utils.idempotency import run_idempotent, request_fingerprint
+from utils.deadlines import query_deadline
 
 router = APIRouter(prefix="/customers", tags=["Customers"])
 
@@ -10,7 +12,7 @@ router = APIRouter(prefix="/customers", tags=["Customers"])
 @router.post("/", response_model=schemas.CustomerOut, status_code=201)
 async def create_customer(
     customer: schemas.CustomerCreate, 
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_write_db)
 ):
     return await crud.create_customer(db, customer)
 
@@ -19,7 +21,7 @@ async def create_customer(
 async def list_customers(
     skip: int = Query(0, ge=0), 
     limit: int = Query(10, ge=1, le=100), 
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_read_db)
 ):
     return await crud.get_all_customers(db, skip, limit)
 
@@ -27,7 +29,7 @@ async def list_customers(
 @router.get("/{customer_id}", response_model=schemas.CustomerOut)
 async def get_customer(
     customer_id: int, 
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_read_db)
 ):
     return await crud.get_customer(db, customer_id)
 
@@ -36,7 +38,7 @@ async def get_customer(
 async def update_customer(
     customer_id: int, 
     customer_data: schemas.CustomerUpdate, 
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_write_db)
 ):
     return await crud.update_customer(db, customer_id, customer_data)
 
@@ -44,7 +46,7 @@ async def update_customer(
 @router.delete("/{customer_id}", status_code=204)
 async def delete_customer(
     customer_id: int, 
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_write_db)
 ):
     return await crud.delete_customer(db, customer_id)
 
@@ -54,7 +56,7 @@ async def get_customer_orders(
     customer_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_read_db)
 ):
     orders = await crud.get_customer_orders(db, customer_id, skip, limit)
     return [
@@ -73,10 +75,17 @@ async def get_customer_orders(
 async def place_order(
     customer_id: int,
     order_data: schemas.OrderCreate,
-    db: AsyncSession = Depends(database.get_db)
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    db: AsyncSession = Depends(database.get_write_db)
 ):
-    await crud.get_customer(db, customer_id)
-    return await crud.create_order(db, customer_id, order_data)
+    async def place(fence):
+        order = await crud.create_order(db, customer_id, order_data, fence)
+        return schemas.OrderOut.from_orm(order)
+
+    return await run_idempotent(
+        db, f"orders:create:customer:{customer_id}", idempotency_key,
+        request_fingerprint(customer_id, order_data), 201, place
+    )
 
 
 @router.get("/{customer_id}/reviews", response_model=List[schemas.ReviewOut])
@@ -84,15 +93,15 @@ async def get_customer_reviews(
     customer_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_read_db)
 ):
     return await crud.get_customer_reviews(db, customer_id, skip, limit)
 
 
-@router.get("/{customer_id}/analytics", response_model=schemas.CustomerAnalytics)
+@router.get("/{customer_id}/analytics", response_model=schemas.CustomerAnalytics, dependencies=[query_deadline(5)])
 async def get_customer_analytics(
     customer_id: int,
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_read_db)
 ):
     await crud.get_customer(db, customer_id)
     return await calculate_customer_analytics(db, customer_id) 
\ No newline at end of file
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from typing import List
+import schemas
+from utils.profiling import memory_snapshots, profiler, require_debug_token
+
+router = APIRouter(prefix="/debug", tags=["Debug"], dependencies=[Depends(require_debug_token)], include_in_schema=False)
+
+
+@router.post("/profiles/arm", response_model=schemas.ProfileArmed)
+async def arm_profiler(arm: schemas.ProfileArm):
+    """Profile the next ``count`` requests whose path starts with ``path_prefix``"""
+    profiler.arm(arm.path_prefix, arm.count)
+    return profiler.armed()
+
+
+@router.get("/profiles", response_model=List[schemas.ProfileSummary])
+async def list_profiles():
+    """Recent request profiles, newest first"""
+    return profiler.list()
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: int):
+    """Folded stacks of one profile, for flamegraph.pl or speedscope"""
+    profile = profiler.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return PlainTextResponse(profile.folded())
+
+
+@router.post("/memory/start", status_code=204)
+async def start_memory_tracing(frames: int = Query(1, ge=1, le=50)):
+    memory_snapshots.start(frames)
+
+
+@router.post("/memory/snapshot", response_model=schemas.MemorySnapshot)
+async def take_memory_snapshot(
+    limit: int = Query(20, ge=1, le=200),
+    group_by: schemas.MemoryGroupBy = Query(schemas.MemoryGroupBy.LINENO)
+):
+    """Largest allocations, compared with the previous snapshot (or the start of tracing)"""
+    return memory_snapshots.snapshot(limit, group_by.value)
+
+
+@router.post("/memory/stop", status_code=204)
+async def stop_memory_tracing():
+    memory_snapshots.stop()
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Header
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 import crud, schemas, database, models
+from utils.idempotency import run_idempotent, request_fingerprint
+from utils.deadlines import query_deadline
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
@@ -10,7 +12,7 @@ router = APIRouter(prefix="/orders", tags=["Orders"])
 @router.get("/{order_id}", response_model=schemas.OrderWithDetails)
 async def get_order_details(
     order_id: int,
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_read_db)
 ):
     """Get detailed order information including customer, restaurant, and order items"""
     order = await crud.get_order_with_details(db, order_id)
@@ -49,22 +51,23 @@ async def get_order_details(
 async def update_order_status(
     order_id: int,
     status_update: schemas.OrderUpdate,
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_write_db)
 ):
     """Update order status (with business logic validation)"""
     return await crud.update_order_status(db, order_id, status_update)
 
 
-@router.get("/", response_model=List[schemas.OrderOut])
+@router.get("/", response_model=List[schemas.OrderOut], dependencies=[query_deadline(5)])
 async def list_orders(
     restaurant_id: Optional[int] = Query(None, description="Filter by restaurant"),
     customer_id: Optional[int] = Query(None, description="Filter by customer"),
     status: Optional[schemas.OrderStatusEnum] = Query(None, description="Filter by status"),
     start_date: Optional[datetime] = Query(None, description="Filter orders from this date"),
     end_date: Optional[datetime] = Query(None, description="Filter orders until this date"),
+    include_archived: bool = Query(False, description="Also search archived (old finished) orders"),
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_read_db)
 ):
     """Get orders with various filters"""
     # Convert enum to model enum if provided
@@ -73,7 +76,7 @@ async def list_orders(
         model_status = models.OrderStatus(status.value)
     
     orders = await crud.get_orders_by_date_range(
-        db, restaurant_id, customer_id, start_date, end_date, model_status, skip, limit
+        db, restaurant_id, customer_id, start_date, end_date, model_status, skip, limit, include_archived
     )
     
     return [schemas.OrderOut.from_orm(order) for order in orders]
@@ -84,17 +87,25 @@ async def add_review(
     order_id: int,
     review_data: schemas.ReviewCreate,
     customer_id: int = Query(..., description="Customer ID adding the review"),
-    db: AsyncSession = Depends(database.get_db)
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    db: AsyncSession = Depends(database.get_write_db)
 ):
     """Add a review for a completed order"""
-    return await crud.create_review(db, customer_id, order_id, review_data)
+    async def add(fence):
+        review = await crud.create_review(db, customer_id, order_id, review_data, fence)
+        return schemas.ReviewOut.from_orm(review)
+
+    return await run_idempotent(
+        db, f"reviews:create:customer:{customer_id}", idempotency_key,
+        request_fingerprint(customer_id, order_id, review_data), 201, add
+    )
 
 
 @router.get("/{order_id}/can-review")
 async def check_review_eligibility(
     order_id: int,
     customer_id: int = Query(..., description="Customer ID to check eligibility"),
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_read_db)
 ):
     """Check if a customer can review this order"""
     order = await crud.get_order_with_details(db, order_id)
@@ -1,55 +1,95 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+from datetime import time
 import crud, schemas, database, models
-from utils.business_logic import calculate_restaurant_analytics
+from utils.business_logic import calculate_restaurant_analytics, popular_menu_items, resolve_open_at
+from utils.leaderboards import leaderboards
+from utils.deadlines import query_deadline
 
 router = APIRouter(prefix="/restaurants", tags=["Restaurants"])
 
 
 @router.post("/", response_model=schemas.RestaurantOut, status_code=201)
-async def create(restaurant:schemas.RestaurantCreate, db:AsyncSession=Depends(database.get_db)):
+async def create(restaurant:schemas.RestaurantCreate, db:AsyncSession=Depends(database.get_write_db)):
     return await crud.create_restaurant(db, restaurant)
 
 @router.get("/",response_model=List[schemas.RestaurantOut])
-async def list_all(skip:int=0, limit:int=10, db:AsyncSession=Depends(database.get_db)):
-    return await crud.get_all_restaurants(db, skip, limit)
+async def list_all(skip:int=0, limit:int=10, open_now:bool=False, open_at:Optional[time]=None, db:AsyncSession=Depends(database.get_read_db)):
+    return await crud.get_all_restaurants(db, skip, limit, resolve_open_at(open_now, open_at))
 
 
+@router.get("/search", response_model=List[schemas.RestaurantOut])
+async def search_by_cuisine(cuisine_type:str, open_now:bool=False, open_at:Optional[time]=None, db:AsyncSession=Depends(database.get_read_db)):
+    return await crud.search_by_cuisine(db, cuisine_type, resolve_open_at(open_now, open_at))
+
+
+@router.get("/active", response_model=List[schemas.RestaurantOut])
+async def get_active(open_now:bool=False, open_at:Optional[time]=None, db:AsyncSession=Depends(database.get_read_db)):
+    return await crud.get_active_restaurants(db, resolve_open_at(open_now, open_at))
+
+
+@router.get("/nearby", response_model=List[schemas.RestaurantNearby])
+async def nearby(
+    lat: float = Query(..., ge=-90, le=90, description="Latitude of the search centre"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitude of the search centre"),
+    radius_km: float = Query(5.0, gt=0, le=50, description="Search radius in kilometres"),
+    cuisine_type: Optional[str] = Query(None, description="Filter by cuisine type"),
+    min_rating: Optional[float] = Query(None, ge=0, le=5, description="Minimum rating"),
+    is_active: bool = Query(True, description="Filter active restaurants"),
+    open_now: bool = Query(False, description="Only restaurants open right now"),
+    open_at: Optional[time] = Query(None, description="Only restaurants open at this time of day"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    results = await crud.search_restaurants_nearby(
+        db, lat, lon, radius_km, cuisine_type, min_rating, is_active, skip, limit,
+        resolve_open_at(open_now, open_at)
+    )
+    return [
+        schemas.RestaurantNearby(**schemas.RestaurantOut.from_orm(restaurant).dict(), distance_km=round(distance, 3))
+        for distance, restaurant in results
+    ]
+
+
+@router.get("/leaderboard", response_model=List[schemas.LeaderboardEntry])
+async def leaderboard(
+    metric: schemas.LeaderboardMetric = Query(schemas.LeaderboardMetric.RATING, description="Rank by rating, order count or trending score"),
+    cuisine_type: Optional[str] = Query(None, description="Only restaurants of this cuisine"),
+    location: Optional[str] = Query(None, description="Only restaurants in this location"),
+    limit: int = Query(10, ge=1, le=100)
+):
+    if cuisine_type and location:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Filter by cuisine_type or location, not both")
+    entries = leaderboards.top(metric.value, cuisine_type, location, limit)
+    return [schemas.LeaderboardEntry(rank=rank, **entry) for rank, entry in enumerate(entries, start=1)]
+
 
 @router.get("/{restaurant_id}", response_model=schemas.RestaurantOut)
-async def get_one(restaurant_id:int, db:AsyncSession=Depends(database.get_db)):
+async def get_one(restaurant_id:int, db:AsyncSession=Depends(database.get_read_db)):
     return await crud.get_restaurant(db, restaurant_id)
 
 
 @router.put("/{restaurant_id}", response_model=schemas.RestaurantOut)
-async def update(restaurant_id:int, restaurant_data:schemas.RestaurantUpdate, db:AsyncSession=Depends(database.get_db)):
+async def update(restaurant_id:int, restaurant_data:schemas.RestaurantUpdate, db:AsyncSession=Depends(database.get_write_db)):
     return await crud.update_restaurant(db, restaurant_id, restaurant_data)
 
 @router.delete("/{restaurant_id}", status_code=204)
-async def delete(restaurant_id:int, db:AsyncSession=Depends(database.get_db)):
+async def delete(restaurant_id:int, db:AsyncSession=Depends(database.get_write_db)):
     return await crud.delete_restaurant(db, restaurant_id)
 
 
-@router.get("/search", response_model=List[schemas.RestaurantOut])
-async def search_by_cuisine(cuisine_type:str, db:AsyncSession=Depends(database.get_db)):
-    return await crud.search_by_cuisine(db, cuisine_type)
-
-
-@router.get("/active", response_model=List[schemas.RestaurantOut])
-async def get_active(db:AsyncSession=Depends(database.get_db)):
-    return await crud.get_active_restaurants(db)
-
 @router.post("/{restaurant_id}/menu-items/", response_model=schemas.MenuItemOut)
-async def add_menu_item(restaurant_id: int, item: schemas.MenuItemCreate, db: AsyncSession = Depends(database.get_db)):
+async def add_menu_item(restaurant_id: int, item: schemas.MenuItemCreate, db: AsyncSession = Depends(database.get_write_db)):
     return await crud.create_menu_item(db, restaurant_id, item)
 
 @router.get("/{restaurant_id}/menu", response_model=List[schemas.MenuItemOut])
-async def get_menu(restaurant_id: int, db: AsyncSession = Depends(database.get_db)):
+async def get_menu(restaurant_id: int, db: AsyncSession = Depends(database.get_read_db)):
     return await crud.get_menu_by_restaurant(db, restaurant_id)
 
 @router.get("/{restaurant_id}/with-menu", response_model=schemas.RestaurantWithMenu)
-async def get_restaurant_with_menu(restaurant_id: int, db: AsyncSession = Depends(database.get_db)):
+async def get_restaurant_with_menu(restaurant_id: int, db: AsyncSession = Depends(database.get_read_db)):
     return await crud.get_restaurant_with_menu(db, restaurant_id)
 
 @router.get("/search/advanced", response_model=List[schemas.RestaurantOut])
@@ -58,12 +98,15 @@ async def advanced_search(
     location: Optional[str] = Query(None, description="Filter by location"),
     min_rating: Optional[float] = Query(None, ge=0, le=5, description="Minimum rating"),
     is_active: bool = Query(True, description="Filter active restaurants"),
+    open_now: bool = Query(False, description="Only restaurants open right now"),
+    open_at: Optional[time] = Query(None, description="Only restaurants open at this time of day"),
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_read_db)
 ):
     return await crud.search_restaurants_advanced(
-        db, cuisine_type, location, min_rating, is_active, skip, limit
+        db, cuisine_type, location, min_rating, is_active, skip, limit,
+        resolve_open_at(open_now, open_at)
     )
 
 
@@ -73,7 +116,7 @@ async def get_restaurant_orders(
     status: Optional[schemas.OrderStatusEnum] = Query(None, description="Filter by order status"),
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_read_db)
 ):
     await crud.get_restaurant(db, restaurant_id)
     
@@ -85,10 +128,29 @@ async def get_restaurant_orders(
     return [schemas.OrderOut.from_orm(order) for order in orders]
 
 
-@router.get("/{restaurant_id}/analytics", response_model=schemas.RestaurantAnalytics)
+@router.get("/{restaurant_id}/queue", response_model=schemas.KitchenQueue)
+async def get_kitchen_queue(
+    restaurant_id: int,
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    """Active orders with their items, grouped by status and oldest first"""
+    return await crud.get_kitchen_queue(db, restaurant_id)
+
+
+@router.put("/{restaurant_id}/orders/status", response_model=List[schemas.OrderStatusOutcome])
+async def bulk_update_order_status(
+    restaurant_id: int,
+    bulk_update: schemas.OrderStatusBulkUpdate,
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    """Move many of the restaurant's orders to one status; each order reports its own outcome"""
+    return await crud.bulk_update_order_status(db, restaurant_id, bulk_update)
+
+
+@router.get("/{restaurant_id}/analytics", response_model=schemas.RestaurantAnalytics, dependencies=[query_deadline(5)])
 async def get_restaurant_analytics(
     restaurant_id: int,
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_read_db)
 ):
 
     await crud.get_restaurant(db, restaurant_id)
@@ -96,12 +158,25 @@ async def get_restaurant_analytics(
     return await calculate_restaurant_analytics(db, restaurant_id)
 
 
+@router.get("/{restaurant_id}/popular-items", response_model=List[schemas.PopularItem])
+async def get_popular_items(
+    restaurant_id: int,
+    window: schemas.PopularItemsWindow = Query(schemas.PopularItemsWindow.ALL_TIME, description="All time or the last 7 days"),
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(database.get_read_db)
+):
+
+    await crud.get_restaurant(db, restaurant_id)
+
+    return await popular_menu_items(db, restaurant_id, window.value, limit)
+
+
 @router.get("/{restaurant_id}/reviews", response_model=List[schemas.ReviewOut])
 async def get_restaurant_reviews(
     restaurant_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_read_db)
 ):
 
     await crud.get_restaurant(db, restaurant_id)
@@ -12,7 +12,7 @@ async def get_restaurant_reviews(
     restaurant_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_read_db)
 ):
     await crud.get_restaurant(db, restaurant_id)
     
@@ -37,7 +37,7 @@ async def get_restaurant_reviews(
 @router.get("/restaurants/{restaurant_id}/summary")
 async def get_restaurant_review_summary(
     restaurant_id: int,
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_read_db)
 ):
     restaurant = await crud.get_restaurant(db, restaurant_id)
     
@@ -88,7 +88,7 @@ async def get_customer_reviews(
     customer_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_read_db)
 ):
     await crud.get_customer(db, customer_id)
     
@@ -98,29 +98,27 @@ async def get_customer_reviews(
 @router.get("/{review_id}")
 async def get_review(
     review_id: int,
-    db: AsyncSession = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_read_db)
 ):  
     from sqlalchemy.future import select
-    from sqlalchemy.orm import joinedload
-    import models
+    import models, sharding
     
-    result = await db.execute(
-        select(models.Review)
-        .options(
-            joinedload(models.Review.customer),
-            joinedload(models.Review.restaurant),
-            joinedload(models.Review.order)
+    async with sharding.shard_for_id(review_id).read_session() as session:
+        result = await session.execute(
+            select(models.Review)
+            .where(models.Review.id == review_id)
         )
-        .where(models.Review.id == review_id)
-    )
+        review = result.scalar_one_or_none()
     
-    review = result.scalar_one_or_none()
     if not review:
         from fastapi import HTTPException, status
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Review not found"
         )
+    await sharding.attach_related(db, [review], "customer", models.Customer, "customer_id")
+    await sharding.attach_related(db, [review], "restaurant", models.Restaurant, "restaurant_id")
+    order = await crud.get_order(db, review.order_id)  # may have been archived
     
     return {
         "id": review.id,
@@ -137,8 +135,8 @@ async def get_review(
             "cuisine_type": review.restaurant.cuisine_type
         },
         "order": {
-            "id": review.order.id,
-            "total_amount": review.order.total_amount,
-            "order_date": review.order.order_date
+            "id": order.id,
+            "total_amount": order.total_amount,
+            "order_date": order.order_date
         }
     } 
\ No newline at end of file
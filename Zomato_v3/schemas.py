@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, validator, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import time, datetime
 from decimal import Decimal
 from enum import Enum
@@ -12,6 +12,8 @@ class RestaurantBase(BaseModel):
     address: str 
     phone_number: str 
     location: str
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
     rating: float = Field(default=0.0, ge=0, le=5)
     is_active: bool = True 
     opening_time: time 
@@ -23,6 +25,12 @@ class RestaurantBase(BaseModel):
         if not re.match(r'^\+?\d{10,15}$', v):
             raise ValueError("Invalid phone number format")
         return v
+
+    @validator("longitude", always=True)
+    def validate_coordinates(cls, v, values):
+        if (v is None) != (values.get("latitude") is None):
+            raise ValueError("latitude and longitude must be provided together")
+        return v
     
 class RestaurantCreate(RestaurantBase):
     pass
@@ -40,6 +48,40 @@ class RestaurantOut(RestaurantBase):
 
 
 
+class RestaurantNearby(RestaurantOut):
+    distance_km: float
+
+
+class LeaderboardMetric(str, Enum):
+    RATING = "rating"
+    ORDERS = "orders"
+    TRENDING = "trending"
+
+class SuggestionKind(str, Enum):
+    RESTAURANT = "restaurant"
+    CUISINE = "cuisine"
+    DISH = "dish"
+
+class AutocompleteSuggestion(BaseModel):
+    kind: SuggestionKind
+    text: str
+    restaurant_id: Optional[int] = None
+    orders: int
+    rating: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    restaurant_id: int
+    name: str
+    cuisine_type: str
+    location: str
+    score: float
+
+
+
 class MenuItemBase(BaseModel):
     name: str = Field(..., min_length=3, max_length=100)
     description: Optional[str]=None
@@ -166,6 +208,38 @@ class OrderWithDetails(OrderOut):
     restaurant: RestaurantOut
     order_items: List[OrderItemWithMenu]
 
+class OrderStatusBulkUpdate(BaseModel):
+    order_ids: List[int] = Field(..., min_items=1, max_items=500)
+    order_status: OrderStatusEnum
+
+class OrderStatusOutcome(BaseModel):
+    order_id: int
+    updated: bool
+    order_status: Optional[OrderStatusEnum] = None
+    detail: Optional[str] = None
+
+class KitchenQueueItem(BaseModel):
+    menu_item_id: int
+    name: str
+    quantity: int
+    special_requests: Optional[str] = None
+    preparation_time: int
+
+class KitchenQueueOrder(BaseModel):
+    id: int
+    customer_id: int
+    order_date: datetime
+    delivery_time: Optional[datetime] = None
+    special_instructions: Optional[str] = None
+    preparation_minutes: int
+    items: List[KitchenQueueItem]
+
+class KitchenQueue(BaseModel):
+    restaurant_id: int
+    active_orders: int
+    kitchen_load_minutes: int
+    orders_by_status: Dict[OrderStatusEnum, List[KitchenQueueOrder]]
+
 class OrderSummary(BaseModel):
     id: int
     restaurant_name: str
@@ -201,18 +275,108 @@ class ReviewWithDetails(ReviewOut):
 
 
 
+# Sections left as None did not finish before the endpoint's deadline; partial is then true.
 class RestaurantAnalytics(BaseModel):
-    total_orders: int
-    total_revenue: Decimal
-    average_rating: float
-    popular_items: List[dict]
-    orders_by_status: dict
+    total_orders: Optional[int] = None
+    total_revenue: Optional[Decimal] = None
+    average_rating: Optional[float] = None
+    popular_items: Optional[List[dict]] = None
+    orders_by_status: Optional[dict] = None
+    unique_customers: Optional[Dict[str, int]] = None
+    repeat_customer_rate: Optional[Dict[str, float]] = None
+    partial: bool = False
+
+class PopularItemsWindow(str, Enum):
+    ALL_TIME = "all"
+    LAST_7_DAYS = "7d"
+
+class PopularItem(BaseModel):
+    menu_item_id: int
+    name: str
+    count: int
+    error: int
+    guaranteed: bool
 
+# With partial true, totals only cover the shards that answered in time and
+# favorite_restaurants may be None.
 class CustomerAnalytics(BaseModel):
     total_orders: int
     total_spent: Decimal
-    favorite_restaurants: List[dict]
+    favorite_restaurants: Optional[List[dict]] = None
     order_frequency: dict
+    partial: bool = False
+
+
+class RevenueBreakdown(BaseModel):
+    key: str
+    orders: int
+    revenue: Decimal
+
+class PlatformRevenue(BaseModel):
+    computed_at: datetime
+    total_orders: int
+    total_revenue: Decimal
+    by_city: List[RevenueBreakdown]
+    by_cuisine: List[RevenueBreakdown]
+    by_hour: Dict[int, Decimal]
+
+class FunnelStage(BaseModel):
+    status: OrderStatusEnum
+    orders: int
+    conversion: float
+
+class PlatformFunnel(BaseModel):
+    computed_at: datetime
+    stages: List[FunnelStage]
+
+class CancellationRate(BaseModel):
+    key: str
+    orders: int
+    cancelled: int
+    rate: float
+
+class PlatformCancellations(BaseModel):
+    computed_at: datetime
+    orders: int
+    cancelled: int
+    rate: float
+    by_city: List[CancellationRate]
+    by_cuisine: List[CancellationRate]
+
+class ProfileArm(BaseModel):
+    path_prefix: str = Field(..., min_length=1)
+    count: int = Field(1, ge=1, le=100)
+
+class ProfileArmed(BaseModel):
+    path_prefix: Optional[str]
+    remaining: int
+
+class ProfileSummary(BaseModel):
+    id: int
+    method: str
+    path: str
+    status_code: Optional[int]
+    started_at: datetime
+    duration_ms: float
+    samples: int
+
+class MemoryGroupBy(str, Enum):
+    FILENAME = "filename"
+    LINENO = "lineno"
+    TRACEBACK = "traceback"
+
+class MemoryStat(BaseModel):
+    location: str
+    size_kib: float
+    size_diff_kib: float
+    count: int
+    count_diff: int
+
+class MemorySnapshot(BaseModel):
+    compared_to_previous: bool
+    traced_kib: float
+    peak_kib: float
+    top: List[MemoryStat]
 
 
 
@@ -0,0 +1,160 @@
+import asyncio
+import heapq
+import itertools
+import os
+import zlib
+from typing import Awaitable, Callable, Iterable, List, Optional, Sequence, TypeVar
+
+from sqlalchemy import bindparam, func
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.attributes import set_committed_value
+
+import database
+import migrations
+import models
+from utils.instrumentation import query_cache_stats
+from utils.write_coordinator import WriteCoordinator, write_coordinator
+
+T = TypeVar("T")
+
+# Orders, their items and reviews are split across ORDER_SHARD_COUNT SQLite files
+# by restaurant; restaurants, customers and menus stay in the catalog database.
+# With a single shard the order tables live in the catalog database itself.
+ORDER_SHARD_COUNT = int(os.getenv("ORDER_SHARD_COUNT", "1"))
+SHARD_PATH_TEMPLATE = "./orders_shard_{index}.db"
+
+SHARDED_MODELS = (
+    models.Order, models.OrderItem, models.Review, models.ArchivedOrder, models.ArchivedOrderItem,
+    models.CustomerMonthlyActivity, models.RestaurantDailyCustomers, models.IdempotencyFence
+)
+# Archived rows keep their ids, so new ids must not reuse an archived one.
+ARCHIVE_MODELS = {models.Order: models.ArchivedOrder, models.OrderItem: models.ArchivedOrderItem}
+SHARDED_TABLES = [model.__table__ for model in SHARDED_MODELS]
+
+
+class Shard:
+    def __init__(self, index: int):
+        self.index = index
+        self.shares_catalog = ORDER_SHARD_COUNT == 1
+        if self.shares_catalog:
+            self.write_engine = database.coordinator_engine
+            self.read_engine = database.read_engine
+            self.read_session = database.ReadSessionLocal
+            self.writer = write_coordinator
+            return
+
+        path = SHARD_PATH_TEMPLATE.format(index=index)
+        self.write_engine = create_async_engine(
+            f"sqlite+aiosqlite:///{path}", echo=True, pool_size=1, max_overflow=0,
+            query_cache_size=database.QUERY_CACHE_SIZE
+        )
+        self.read_engine = create_async_engine(
+            f"sqlite+aiosqlite:///file:{path}?mode=ro&uri=true", echo=True, pool_size=10, max_overflow=10,
+            query_cache_size=database.QUERY_CACHE_SIZE
+        )
+        query_cache_stats.watch(f"shard_{index}_write", self.write_engine)
+        query_cache_stats.watch(f"shard_{index}_read", self.read_engine)
+        database.configure_writer(self.write_engine, foreign_keys=False)
+        database.configure_reader(self.read_engine)
+        self.read_session = sessionmaker(
+            self.read_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
+        )
+        self.writer = WriteCoordinator(
+            sessionmaker(self.write_engine, class_=AsyncSession, expire_on_commit=False)
+        )
+
+
+shards = [Shard(index) for index in range(ORDER_SHARD_COUNT)]
+
+
+def catalog_tables():
+    if ORDER_SHARD_COUNT == 1:
+        return None  # everything
+    return [table for table in models.Base.metadata.sorted_tables if table not in SHARDED_TABLES]
+
+
+def shard_for_restaurant(restaurant_id: int) -> Shard:
+    return shards[zlib.crc32(str(restaurant_id).encode()) % ORDER_SHARD_COUNT]
+
+
+def shard_for_id(entity_id: int) -> Shard:
+    """Shard holding an order or review; their ids are allocated per shard by ``allocate_id``."""
+    return shards[entity_id % ORDER_SHARD_COUNT]
+
+
+async def allocate_id(session, model, shard: Shard) -> int:
+    """Next id for ``model`` on ``shard`` that is congruent to the shard index.
+
+    Must run on the shard's writer, which serializes allocations. Ids already
+    moved to the model's archive table are never handed out again.
+    """
+    current = 0
+    for table_model in (model, ARCHIVE_MODELS.get(model)):
+        if table_model is not None:
+            result = await session.execute(select(func.max(table_model.id)))
+            current = max(current, result.scalar() or 0)
+    return (current // ORDER_SHARD_COUNT + 1) * ORDER_SHARD_COUNT + shard.index
+
+
+async def start() -> None:
+    if ORDER_SHARD_COUNT == 1:
+        return  # shard 0 is the catalog; main starts its coordinator
+    for shard in shards:
+        async with shard.write_engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all, tables=SHARDED_TABLES)
+            await conn.run_sync(migrations.add_missing_columns, models.Base.metadata)
+        await shard.writer.start()
+
+
+async def stop() -> None:
+    if ORDER_SHARD_COUNT == 1:
+        return
+    for shard in shards:
+        await shard.writer.stop()
+        await shard.read_engine.dispose()
+        await shard.write_engine.dispose()
+
+
+async def fan_out(query: Callable[[Shard], Awaitable[T]], targets: Optional[Sequence[Shard]] = None) -> List[T]:
+    return await asyncio.gather(*(query(shard) for shard in (targets or shards)))
+
+
+async def read(shard: Shard, statement):
+    async with shard.read_session() as session:
+        result = await session.execute(statement)
+        return result.scalars().all()
+
+
+async def read_rows(shard: Shard, *statements) -> List[list]:
+    """Run column-only ``statements`` on one read session of ``shard``; a list of rows for each."""
+    async with shard.read_session() as session:
+        return [(await session.execute(statement)).all() for statement in statements]
+
+
+def merge_newest_first(results: Iterable[Sequence[T]], key: Callable[[T], object], skip: int, limit: int) -> List[T]:
+    """Merge per-shard lists that are each sorted newest first and page the result."""
+    merged = heapq.merge(*results, key=key, reverse=True)
+    return list(itertools.islice(merged, skip, skip + limit))
+
+
+_related_by_ids = {}
+
+
+async def attach_related(db, objects, relation: str, model, foreign_key: str) -> None:
+    """Populate a relationship that points into the catalog with one catalog query."""
+    ids = {getattr(obj, foreign_key) for obj in objects}
+    related = {}
+    if ids:
+        statement = _related_by_ids.get(model)
+        if statement is None:
+            # Soft-deleted parents still resolve until the purge removes their children.
+            statement = _related_by_ids[model] = (
+                select(model).where(model.id.in_(bindparam("ids", expanding=True)))
+                .execution_options(include_deleted=True)
+            )
+        result = await db.execute(statement, {"ids": list(ids)})
+        related = {row.id: row for row in result.scalars().all()}
+    for obj in objects:
+        set_committed_value(obj, relation, related.get(getattr(obj, foreign_key)))
@@ -0,0 +1,85 @@
+import random
+from collections import Counter
+
+import pytest
+
+from utils.heavy_hitters import SpaceSaving, top_k
+
+CAPACITY = 50
+K = 5
+
+
+def zipf_stream(ids, length: int, rng: random.Random, skew: float = 1.1):
+    weights = [1 / rank ** skew for rank in range(1, len(ids) + 1)]
+    for item in rng.choices(ids, weights, k=length):
+        yield item, rng.randint(1, 3)
+
+
+def all_time(seed: int):
+    rng = random.Random(seed)
+    ids = rng.sample(range(1, 10_000), 1000)
+    summary, exact = SpaceSaving(CAPACITY), Counter()
+    for item, quantity in zipf_stream(ids, 20_000, rng):
+        summary.add(item, quantity)
+        exact[item] += quantity
+    return [summary], exact
+
+
+def window(seed: int):
+    rng = random.Random(seed)
+    ids = rng.sample(range(1, 10_000), 1000)
+    days, exact = [], Counter()
+    for _ in range(7):
+        ids = ids[1:] + ids[:1] if rng.random() < 0.5 else ids
+        day = SpaceSaving(CAPACITY)
+        for item, quantity in zipf_stream(ids, 3000, rng):
+            day.add(item, quantity)
+            exact[item] += quantity
+        days.append(day)
+    return days, exact
+
+
+STREAMS = [pytest.param(build, seed, id=f"{build.__name__}-{seed}") for build in (all_time, window) for seed in (1, 2, 3)]
+
+
+@pytest.mark.parametrize("build, seed", STREAMS)
+def test_counts_bracket_true_counts(build, seed):
+    summaries, exact = build(seed)
+    total = sum(exact.values())
+    for entry in top_k(summaries, len(exact)):
+        true = exact[entry["menu_item_id"]]
+        assert entry["count"] - entry["error"] <= true <= entry["count"]
+        assert entry["error"] <= total / CAPACITY
+
+
+@pytest.mark.parametrize("build, seed", STREAMS)
+def test_items_above_threshold_are_reported(build, seed):
+    summaries, exact = build(seed)
+    total = sum(exact.values())
+    reported = {entry["menu_item_id"] for entry in top_k(summaries, len(exact))}
+    frequent = {item for item, count in exact.items() if count > total / CAPACITY}
+    assert frequent
+    assert frequent <= reported
+
+
+@pytest.mark.parametrize("build, seed", STREAMS)
+def test_guaranteed_items_are_in_true_top_k(build, seed):
+    summaries, exact = build(seed)
+    kth = exact.most_common(K)[-1][1]
+    top = top_k(summaries, K)
+    assert any(entry["guaranteed"] for entry in top)
+    for entry in top:
+        if entry["guaranteed"]:
+            assert exact[entry["menu_item_id"]] >= kth
+
+
+def test_counts_exact_while_menu_fits():
+    rng = random.Random(7)
+    summary, exact = SpaceSaving(CAPACITY), Counter()
+    for item, quantity in zipf_stream(list(range(1, CAPACITY + 1)), 5000, rng):
+        summary.add(item, quantity)
+        exact[item] += quantity
+    assert summary.counters() == {item: (count, 0) for item, count in exact.items()}
+    assert [(entry["menu_item_id"], entry["count"], entry["error"]) for entry in top_k([summary], K)] == [
+        (item, count, 0) for item, count in sorted(exact.items(), key=lambda entry: (-entry[1], entry[0]))[:K]
+    ]
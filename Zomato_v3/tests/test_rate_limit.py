@@ -0,0 +1,44 @@
+import asyncio
+
+from utils.rate_limit import RateLimitMiddleware
+
+
+async def _ok(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def rejected(requests) -> int:
+    """Number of ``(method, path, query, client ip)`` requests answered with 429."""
+    middleware = RateLimitMiddleware(_ok)
+
+    async def run():
+        count = 0
+        for method, path, query, ip in requests:
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {"type": "http", "method": method, "path": path, "query_string": query,
+                     "client": (ip, 1), "headers": []}
+            await middleware(scope, None, send)
+            count += sent[0]["status"] == 429
+        return count
+
+    return asyncio.run(run())
+
+
+def test_query_string_does_not_pick_the_bucket():
+    rotating = [("GET", "/orders/", f"customer_id={i}".encode(), "10.0.0.1") for i in range(80)]
+    assert rejected(rotating) == rejected([("GET", "/orders/", b"", "10.0.0.1")] * 80) == 20
+
+
+def test_public_reads_are_limited_per_client():
+    assert rejected([("GET", "/restaurants/7", b"", f"10.0.{i // 250}.{i % 250}") for i in range(400)]) == 0
+    assert rejected([("GET", "/restaurants/7", b"", "10.0.0.1")] * 400) == 100
+
+
+def test_order_placement_is_limited_per_customer_and_per_client():
+    assert rejected([("POST", "/customers/3/orders", b"", f"10.0.0.{i}") for i in range(20)]) == 10
+    assert rejected([("POST", f"/customers/{i}/orders", b"", "10.0.0.1") for i in range(80)]) == 50
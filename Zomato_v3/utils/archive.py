@@ -0,0 +1,95 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+from sqlalchemy import delete, func, insert, union_all
+from sqlalchemy.future import select
+
+import models
+import sharding
+from utils.jobs import job_runner
+
+logger = logging.getLogger(__name__)
+
+# Finished orders move from orders/order_items to archived_orders/
+# archived_order_items in the same shard once they have been untouched for
+# ARCHIVE_AFTER, keeping the live tables (and their indexes) small.
+ARCHIVE_AFTER = timedelta(days=21)
+ARCHIVE_BATCH_SIZE = 500
+TERMINAL_STATUSES = (models.OrderStatus.DELIVERED, models.OrderStatus.CANCELLED)
+
+
+def _copy_rows(source, target, criterion, **overrides):
+    columns = [column.name for column in source.__table__.columns]
+    selected = [
+        overrides[column.name].label(column.name) if column.name in overrides else column
+        for column in source.__table__.columns
+    ]
+    return insert(target).from_select(columns, select(*selected).where(criterion))
+
+
+async def _archive_batch(session, cutoff: datetime, batch_size: int) -> int:
+    result = await session.execute(
+        select(models.Order.id)
+        .where(
+            models.Order.order_status.in_(TERMINAL_STATUSES),
+            func.coalesce(models.Order.updated_at, models.Order.order_date) < cutoff
+        )
+        .order_by(models.Order.id)
+        .limit(batch_size)
+    )
+    order_ids = result.scalars().all()
+    if not order_ids:
+        return 0
+
+    # Moving an order counts as a change, so incremental exports pick up its
+    # archived flag.
+    await session.execute(_copy_rows(
+        models.Order, models.ArchivedOrder, models.Order.id.in_(order_ids), updated_at=func.now()
+    ))
+    await session.execute(_copy_rows(models.OrderItem, models.ArchivedOrderItem, models.OrderItem.order_id.in_(order_ids)))
+    await session.execute(delete(models.OrderItem).where(models.OrderItem.order_id.in_(order_ids)))
+    await session.execute(delete(models.Order).where(models.Order.id.in_(order_ids)))
+    return len(order_ids)
+
+
+async def archive_shard(shard, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move finished orders older than ``cutoff`` into the shard's archive tables.
+
+    Each batch is one operation on the shard's write coordinator, so live order
+    writes are committed in between batches instead of waiting for the whole run.
+    """
+    archived = 0
+    while True:
+        moved = await shard.writer.submit(lambda session: _archive_batch(session, cutoff, batch_size))
+        archived += moved
+        if moved < batch_size:
+            return archived
+
+
+@job_runner.task("archive_finished_orders")
+async def archive_finished_orders(db):
+    cutoff = datetime.utcnow() - ARCHIVE_AFTER
+    for shard in sharding.shards:
+        archived = await archive_shard(shard, cutoff)
+        if archived:
+            logger.info("Archived %d orders from shard %d", archived, shard.index)
+
+
+job_runner.schedule("archive_finished_orders", every_seconds=3600)
+
+
+async def read_with_archive(shard, build: Callable) -> List[list]:
+    """Run ``build(model)`` against the live and the archived orders of ``shard``."""
+    async with shard.read_session() as session:
+        live = await session.execute(build(models.Order))
+        archived = await session.execute(build(models.ArchivedOrder))
+        return [live.scalars().all(), archived.scalars().all()]
+
+
+def order_history(build: Callable):
+    """``build(order_model, item_model)`` over live and archived rows, as one subquery."""
+    return union_all(
+        build(models.Order, models.OrderItem),
+        build(models.ArchivedOrder, models.ArchivedOrderItem)
+    ).subquery()
@@ -0,0 +1,357 @@
+import heapq
+import re
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+import models
+import sharding
+
+KINDS = ("restaurant", "cuisine", "dish")
+SUGGESTION_LIMIT = 10
+# Prefixes matching more terms than this keep their top suggestions ranked
+# as they change; shorter runs are ranked when queried.
+SCAN_LIMIT = 64
+
+_WORD = re.compile(r"\w+")
+
+Key = Tuple[str, object]  # (kind, restaurant id or normalised name)
+
+
+def normalize(text: str) -> str:
+    return " ".join(_WORD.findall(text.casefold()))
+
+
+def _terms(text: str) -> Tuple[str, ...]:
+    # Every word-boundary suffix, so "tik" and "paneer t" both find "Paneer Tikka".
+    words = normalize(text).split()
+    return tuple(" ".join(words[i:]) for i in range(len(words)))
+
+
+class Suggestion:
+    __slots__ = ("kind", "text", "restaurant_id", "orders", "rating", "terms")
+
+    def __init__(self, kind: str, text: str, restaurant_id: Optional[int] = None, orders: int = 0, rating: Optional[float] = None):
+        self.kind = kind
+        self.text = text
+        self.restaurant_id = restaurant_id
+        self.orders = orders
+        self.rating = rating
+        self.terms = _terms(text)
+
+    def rank(self) -> tuple:
+        # Most ordered first, then best rated, then alphabetical.
+        return (-self.orders, -(self.rating or 0.0), self.text.casefold())
+
+
+class PrefixIndex:
+    """Suggestions by prefix of any word in their text.
+
+    Terms sit in a sorted list of ``(term, key)`` pairs, so the terms starting
+    with a prefix are one contiguous run found by binary search. Runs longer
+    than ``scan_limit`` (short prefixes, common words) keep their best
+    ``limit`` keys, overall and per kind, ranked as suggestions change, so a
+    query never ranks more than ``scan_limit`` terms. Rank improvements (new
+    orders) adjust those lists in place; a removal or a drop in rank refills
+    the affected lists from the run.
+    """
+
+    def __init__(self, limit: int = SUGGESTION_LIMIT, scan_limit: int = SCAN_LIMIT):
+        self.limit = limit
+        self.scan_limit = scan_limit
+        self._terms: List[Tuple[str, Key]] = []
+        self._entries: Dict[Key, Suggestion] = {}
+        self._top: Dict[Tuple[Optional[str], str], List[Key]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Key) -> Optional[Suggestion]:
+        return self._entries.get(key)
+
+    def load(self, entries: Dict[Key, Suggestion]) -> None:
+        """Replace the contents, sorting once instead of inserting one by one."""
+        self._entries = dict(entries)
+        self._terms = sorted((term, key) for key, suggestion in self._entries.items() for term in suggestion.terms)
+        self._top = {}
+        length = 1
+        while True:
+            runs = Counter(term[:length] for term, _ in self._terms if len(term) >= length)
+            long_runs = [prefix for prefix, count in runs.items() if count > self.scan_limit]
+            if not long_runs:
+                break
+            for prefix in long_runs:
+                self._rank_prefix(prefix)
+            length += 1
+
+    def put(self, key: Key, suggestion: Suggestion) -> None:
+        self.remove(key)
+        self._entries[key] = suggestion
+        for term in suggestion.terms:
+            insort(self._terms, (term, key))
+            for length in range(1, len(term) + 1):
+                prefix = term[:length]
+                if (None, prefix) not in self._top:
+                    if self._run_length(prefix) <= self.scan_limit:
+                        break
+                    self._rank_prefix(prefix)
+        for top_key in self._top_keys(suggestion):
+            self._offer(top_key, key)
+
+    def remove(self, key: Key) -> None:
+        suggestion = self._entries.pop(key, None)
+        if suggestion is None:
+            return
+        for term in suggestion.terms:
+            del self._terms[bisect_left(self._terms, (term, key))]
+        for top_key in self._top_keys(suggestion):
+            if key in self._top[top_key]:
+                self._refill(top_key)
+
+    def rescore(self, key: Key, orders: Optional[int] = None, rating: Optional[float] = None) -> None:
+        suggestion = self._entries.get(key)
+        if suggestion is None:
+            return
+        before = suggestion.rank()
+        if orders is not None:
+            suggestion.orders = orders
+        if rating is not None:
+            suggestion.rating = rating
+        after = suggestion.rank()
+        if after == before:
+            return
+        for top_key in self._top_keys(suggestion):
+            if after < before:
+                self._offer(top_key, key)
+            elif key in self._top[top_key]:
+                self._refill(top_key)
+
+    def search(self, prefix: str, kind: Optional[str] = None, limit: int = SUGGESTION_LIMIT) -> List[Suggestion]:
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        top = self._top.get((kind, prefix))
+        if top is not None and limit <= self.limit:
+            keys = top[:limit]
+        else:
+            keys = heapq.nsmallest(limit, self._matching(prefix, kind), key=self._rank)
+        return [self._entries[key] for key in keys]
+
+    def _rank(self, key: Key) -> tuple:
+        return self._entries[key].rank()
+
+    def _run_length(self, prefix: str) -> int:
+        # Every term starting with prefix sorts below prefix + the highest code point.
+        return bisect_left(self._terms, (prefix + "\U0010ffff",)) - bisect_left(self._terms, (prefix,))
+
+    def _matching(self, prefix: str, kind: Optional[str]) -> Set[Key]:
+        keys = set()
+        for index in range(bisect_left(self._terms, (prefix,)), len(self._terms)):
+            term, key = self._terms[index]
+            if not term.startswith(prefix):
+                break
+            if kind is None or key[0] == kind:
+                keys.add(key)
+        return keys
+
+    def _top_keys(self, suggestion: Suggestion) -> Set[Tuple[Optional[str], str]]:
+        # Runs only get shorter as the prefix grows, so the ranked prefixes of
+        # a term are the ones shorter than its first unranked prefix.
+        top_keys = set()
+        for term in suggestion.terms:
+            for length in range(1, len(term) + 1):
+                prefix = term[:length]
+                if (None, prefix) not in self._top:
+                    break
+                top_keys.add((None, prefix))
+                top_keys.add((suggestion.kind, prefix))
+        return top_keys
+
+    def _rank_prefix(self, prefix: str) -> None:
+        matching = self._matching(prefix, None)
+        self._top[(None, prefix)] = heapq.nsmallest(self.limit, matching, key=self._rank)
+        for kind in KINDS:
+            self._top[(kind, prefix)] = heapq.nsmallest(
+                self.limit, (key for key in matching if key[0] == kind), key=self._rank
+            )
+
+    def _offer(self, top_key, key: Key) -> None:
+        top = self._top[top_key]
+        if key in top:
+            top.remove(key)
+        elif len(top) >= self.limit and self._rank(key) >= self._rank(top[-1]):
+            return
+        insort(top, key, key=self._rank)
+        del top[self.limit:]
+
+    def _refill(self, top_key) -> None:
+        kind, prefix = top_key
+        self._top[top_key] = heapq.nsmallest(self.limit, self._matching(prefix, kind), key=self._rank)
+
+
+class RestaurantInfo(NamedTuple):
+    name: str
+    cuisine_type: str
+    rating: float
+
+
+class Autocomplete:
+    """Typeahead over restaurant names, cuisines and dish names.
+
+    Restaurants rank by orders placed, then rating. A cuisine's orders are
+    those of its restaurants, and a dish groups every available menu item
+    with the same name and counts the quantity ordered. Inactive and deleted
+    restaurants, unavailable items and the menus of deleted restaurants are
+    left out. ``rebuild`` loads it all at startup; crud keeps it current on
+    writes, as it does for the leaderboards.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self) -> None:
+        self._index = PrefixIndex()
+        self._restaurants: Dict[int, RestaurantInfo] = {}
+        self._restaurant_orders: Counter = Counter()
+        self._menu_items: Dict[int, Tuple[Key, int]] = {}  # id -> (dish key, restaurant id)
+        self._item_orders: Counter = Counter()
+        # Cuisines and dishes: their members, summed orders and display text.
+        self._members: Dict[Key, Set[int]] = {}
+        self._group_orders: Counter = Counter()
+        self._group_texts: Dict[Key, str] = {}
+
+    def suggest(self, prefix: str, kind: Optional[str] = None, limit: int = SUGGESTION_LIMIT) -> List[Suggestion]:
+        return self._index.search(prefix, kind, limit)
+
+    def upsert_restaurant(self, restaurant: models.Restaurant) -> None:
+        self._withdraw_restaurant(restaurant.id)
+        if not restaurant.is_active or restaurant.deleted_at is not None:
+            return
+        cuisine = self._add_restaurant(restaurant)
+        self._index.put(("restaurant", restaurant.id), self._restaurant_suggestion(restaurant.id))
+        self._sync(cuisine)
+
+    def remove_restaurant(self, restaurant_id: int) -> None:
+        self._withdraw_restaurant(restaurant_id)
+        for menu_item_id in [item_id for item_id, (_, owner) in self._menu_items.items() if owner == restaurant_id]:
+            self.remove_menu_item(menu_item_id)
+
+    def set_rating(self, restaurant_id: int, rating: float) -> None:
+        info = self._restaurants.get(restaurant_id)
+        if info is not None:
+            self._restaurants[restaurant_id] = info._replace(rating=rating)
+            self._index.rescore(("restaurant", restaurant_id), rating=rating)
+
+    def upsert_menu_item(self, item: models.MenuItems) -> None:
+        entry = self._menu_items.get(item.id)
+        if item.is_available and entry is not None and entry[0] == ("dish", normalize(item.name)):
+            return
+        self.remove_menu_item(item.id)
+        if item.is_available:
+            self._sync(self._add_menu_item(item))
+
+    def remove_menu_item(self, menu_item_id: int) -> None:
+        entry = self._menu_items.pop(menu_item_id, None)
+        if entry is not None:
+            self._leave(entry[0], menu_item_id, self._item_orders[menu_item_id])
+            self._sync(entry[0])
+
+    def record_order(self, restaurant_id: int, items: Iterable[Tuple[int, int]]) -> None:
+        self._restaurant_orders[restaurant_id] += 1
+        self._index.rescore(("restaurant", restaurant_id), orders=self._restaurant_orders[restaurant_id])
+        info = self._restaurants.get(restaurant_id)
+        if info is not None:
+            cuisine = ("cuisine", normalize(info.cuisine_type))
+            self._group_orders[cuisine] += 1
+            self._sync(cuisine)
+        for menu_item_id, quantity in items:
+            self._item_orders[menu_item_id] += quantity
+            entry = self._menu_items.get(menu_item_id)
+            if entry is not None:
+                self._group_orders[entry[0]] += quantity
+                self._sync(entry[0])
+
+    def _add_restaurant(self, restaurant) -> Key:
+        self._restaurants[restaurant.id] = RestaurantInfo(restaurant.name, restaurant.cuisine_type, restaurant.rating or 0.0)
+        cuisine = ("cuisine", normalize(restaurant.cuisine_type))
+        self._join(cuisine, restaurant.id, self._restaurant_orders[restaurant.id], restaurant.cuisine_type)
+        return cuisine
+
+    def _add_menu_item(self, item) -> Key:
+        dish = ("dish", normalize(item.name))
+        self._menu_items[item.id] = (dish, item.restaurant_id)
+        self._join(dish, item.id, self._item_orders[item.id], item.name)
+        return dish
+
+    def _withdraw_restaurant(self, restaurant_id: int) -> None:
+        info = self._restaurants.pop(restaurant_id, None)
+        if info is None:
+            return
+        self._index.remove(("restaurant", restaurant_id))
+        cuisine = ("cuisine", normalize(info.cuisine_type))
+        self._leave(cuisine, restaurant_id, self._restaurant_orders[restaurant_id])
+        self._sync(cuisine)
+
+    def _restaurant_suggestion(self, restaurant_id: int) -> Suggestion:
+        info = self._restaurants[restaurant_id]
+        return Suggestion("restaurant", info.name, restaurant_id, self._restaurant_orders[restaurant_id], info.rating)
+
+    def _join(self, key: Key, member: int, orders: int, text: str) -> None:
+        self._members.setdefault(key, set()).add(member)
+        self._group_orders[key] += orders
+        self._group_texts.setdefault(key, text)
+
+    def _leave(self, key: Key, member: int, orders: int) -> None:
+        members = self._members[key]
+        members.discard(member)
+        self._group_orders[key] -= orders
+        if not members:
+            del self._members[key], self._group_orders[key], self._group_texts[key]
+
+    def _sync(self, key: Key) -> None:
+        # A cuisine or dish is suggested while it has members.
+        if key not in self._members:
+            self._index.remove(key)
+        elif self._index.get(key) is None:
+            self._index.put(key, Suggestion(key[0], self._group_texts[key], orders=self._group_orders[key]))
+        else:
+            self._index.rescore(key, orders=self._group_orders[key])
+
+    async def rebuild(self, db) -> None:
+        """Reload from the catalog (``db``) and the order counts of every shard."""
+        async def load(shard):
+            async with shard.read_session() as session:
+                counts = []
+                for order, item in ((models.Order, models.OrderItem), (models.ArchivedOrder, models.ArchivedOrderItem)):
+                    restaurants = await session.execute(select(order.restaurant_id, func.count(order.id)).group_by(order.restaurant_id))
+                    items = await session.execute(select(item.menu_item_id, func.sum(item.quantity)).group_by(item.menu_item_id))
+                    counts.append((restaurants.all(), items.all()))
+                return counts
+
+        per_shard = await sharding.fan_out(load)
+        restaurants = (await db.execute(select(models.Restaurant))).scalars().all()
+        menu_items = (await db.execute(select(models.MenuItems))).scalars().all()
+
+        self._reset()
+        for counts in per_shard:
+            for restaurant_counts, item_counts in counts:
+                self._restaurant_orders.update(dict(restaurant_counts))
+                self._item_orders.update({menu_item_id: int(quantity) for menu_item_id, quantity in item_counts})
+        deleted = {restaurant.id for restaurant in restaurants if restaurant.deleted_at is not None}
+        for restaurant in restaurants:
+            if restaurant.is_active and restaurant.id not in deleted:
+                self._add_restaurant(restaurant)
+        for item in menu_items:
+            if item.is_available and item.restaurant_id not in deleted:
+                self._add_menu_item(item)
+
+        entries = {("restaurant", restaurant_id): self._restaurant_suggestion(restaurant_id) for restaurant_id in self._restaurants}
+        for key in self._members:
+            entries[key] = Suggestion(key[0], self._group_texts[key], orders=self._group_orders[key])
+        self._index.load(entries)
+
+
+autocomplete = Autocomplete()
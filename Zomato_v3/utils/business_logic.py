@@ -1,14 +1,26 @@
-from decimal import Decimal
-from typing import List, Dict, Any
-from datetime import datetime, timedelta
-import models, schemas
-from sqlalchemy import func, and_
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timedelta, time
+import models, schemas, sharding, database
+from sqlalchemy import func
 from sqlalchemy.future import select
 from fastapi import HTTPException, status
+from utils import customer_activity
+from utils.archive import order_history
+from utils.heavy_hitters import ALL_TIME, popular_items as popular_items_tracker
+from utils.money import to_rupees
 
+# Trailing windows (in UTC days, including today) for unique customer counts.
+CUSTOMER_WINDOWS = {"day": 1, "week": 7, "month": 30}
+# Seconds the analytics endpoints wait for their queries before answering with
+# what has finished and ``partial: true``.
+RESTAURANT_ANALYTICS_DEADLINE = 2.0
+CUSTOMER_ANALYTICS_DEADLINE = 2.0
 
-def calculate_order_total(order_items: List[schemas.OrderItemCreate], menu_items_prices: Dict[int, Decimal]) -> Decimal:
-    total = Decimal('0.00')
+
+def calculate_order_total(order_items: List[schemas.OrderItemCreate], menu_items_prices: Dict[int, int]) -> int:
+    """Order total in paise, from menu prices in paise."""
+    total = 0
     for item in order_items:
         if item.menu_item_id not in menu_items_prices:
             raise HTTPException(
@@ -79,120 +91,200 @@ def validate_review_eligibility(order: models.Order, customer_id: int) -> bool:
     return True
 
 
-async def calculate_restaurant_analytics(db, restaurant_id: int) -> schemas.RestaurantAnalytics:
-    
-    orders_query = select(
-        func.count(models.Order.id).label('total_orders'),
-        func.coalesce(func.sum(models.Order.total_amount), 0).label('total_revenue')
-    ).where(models.Order.restaurant_id == restaurant_id)
-    
-    result = await db.execute(orders_query)
-    orders_data = result.fetchone()
-    
-    rating_query = select(func.avg(models.Review.rating)).where(
-        models.Review.restaurant_id == restaurant_id
+async def popular_menu_items(db, restaurant_id: int, window: str = ALL_TIME, limit: int = 10) -> List[Dict[str, Any]]:
+    """Most ordered menu items, estimated from the order stream (utils/heavy_hitters.py).
+
+    ``count`` is an upper bound and ``count - error`` a lower bound on the
+    quantity ordered; both are exact while the restaurant has had no more
+    distinct items ordered than the sketch capacity. Deleted items are skipped.
+    """
+    entries = popular_items_tracker.top(restaurant_id, window, limit + 10)
+    names_result = await db.execute(
+        select(models.MenuItems.id, models.MenuItems.name)
+        .where(models.MenuItems.id.in_([entry["menu_item_id"] for entry in entries]))
     )
-    rating_result = await db.execute(rating_query)
-    avg_rating = rating_result.scalar() or 0.0
-    
-    status_query = select(
-        models.Order.order_status,
-        func.count(models.Order.id)
-    ).where(
-        models.Order.restaurant_id == restaurant_id
-    ).group_by(models.Order.order_status)
-    
-    status_result = await db.execute(status_query)
-    orders_by_status = {status.value: count for status, count in status_result.fetchall()}
-
-    popular_items_query = select(
-        models.MenuItems.name,
-        func.sum(models.OrderItem.quantity).label('total_ordered')
-    ).join(
-        models.OrderItem, models.MenuItems.id == models.OrderItem.menu_item_id
-    ).join(
-        models.Order, models.OrderItem.order_id == models.Order.id
-    ).where(
-        models.Order.restaurant_id == restaurant_id
-    ).group_by(
-        models.MenuItems.id, models.MenuItems.name
-    ).order_by(
-        func.sum(models.OrderItem.quantity).desc()
-    ).limit(5)
-    
-    popular_result = await db.execute(popular_items_query)
-    popular_items = [
-        {"name": name, "total_ordered": count}
-        for name, count in popular_result.fetchall()
-    ]
-    
-    return schemas.RestaurantAnalytics(
-        total_orders=orders_data.total_orders or 0,
-        total_revenue=orders_data.total_revenue or Decimal('0.00'),
-        average_rating=float(avg_rating),
-        popular_items=popular_items,
-        orders_by_status=orders_by_status
+    names = dict(names_result.fetchall())
+    return [
+        {**entry, "name": names[entry["menu_item_id"]]}
+        for entry in entries
+        if entry["menu_item_id"] in names
+    ][:limit]
+
+
+async def gather_within(timeout: float, **parts) -> Tuple[Dict[str, Any], bool]:
+    """Run the named coroutines concurrently for at most ``timeout`` seconds.
+
+    Returns the results of those that finished and whether any were cut off.
+    Late ones are cancelled without waiting for them, so a slow query cannot
+    hold up the response; it is interrupted when the request's query deadline
+    expires at the end of the response (utils/deadlines.py).
+    """
+    tasks = {name: asyncio.ensure_future(coroutine) for name, coroutine in parts.items()}
+    done, pending = await asyncio.wait(tasks.values(), timeout=max(timeout, 0))
+    for task in pending:
+        task.cancel()
+        task.add_done_callback(_discard_result)
+    return {name: task.result() for name, task in tasks.items() if task in done}, bool(pending)
+
+
+def _discard_result(task: asyncio.Task) -> None:
+    if not task.cancelled():
+        task.exception()
+
+
+async def calculate_restaurant_analytics(db, restaurant_id: int) -> schemas.RestaurantAnalytics:
+    # Each aggregate runs on its own read session, concurrently; whatever has
+    # not finished by the deadline is left out and the result marked partial.
+    shard = sharding.shard_for_restaurant(restaurant_id)
+    orders = order_history(lambda order, item: select(
+        order.id, order.total_amount_paise, order.order_status
+    ).where(order.restaurant_id == restaurant_id))
+    today = datetime.utcnow().date()
+
+    async def totals():
+        async with shard.read_session() as session:
+            result = await session.execute(select(
+                func.count(orders.c.id).label('total_orders'),
+                func.coalesce(func.sum(orders.c.total_amount_paise), 0).label('total_revenue')
+            ))
+            return result.fetchone()
+
+    async def average_rating():
+        async with shard.read_session() as session:
+            rating_result = await session.execute(
+                select(func.avg(models.Review.rating)).where(models.Review.restaurant_id == restaurant_id)
+            )
+            return float(rating_result.scalar() or 0.0)
+
+    async def orders_by_status():
+        async with shard.read_session() as session:
+            status_result = await session.execute(
+                select(orders.c.order_status, func.count(orders.c.id)).group_by(orders.c.order_status)
+            )
+            return {status.value: count for status, count in status_result.fetchall()}
+
+    async def daily_customers():
+        async with shard.read_session() as session:
+            return await customer_activity.load_daily_customers(
+                session, restaurant_id, today - timedelta(days=max(CUSTOMER_WINDOWS.values()) - 1), today
+            )
+
+    async def popular_items():
+        async with database.ReadSessionLocal() as catalog:
+            return [
+                {"name": item["name"], "total_ordered": item["count"]}
+                for item in await popular_menu_items(catalog, restaurant_id, limit=5)
+            ]
+
+    results, partial = await gather_within(
+        RESTAURANT_ANALYTICS_DEADLINE,
+        totals=totals(), average_rating=average_rating(), orders_by_status=orders_by_status(),
+        daily_customers=daily_customers(), popular_items=popular_items()
     )
 
+    sections = {
+        "average_rating": results.get("average_rating"),
+        "popular_items": results.get("popular_items"),
+        "orders_by_status": results.get("orders_by_status"),
+    }
+    if "totals" in results:
+        sections["total_orders"] = results["totals"].total_orders or 0
+        sections["total_revenue"] = to_rupees(results["totals"].total_revenue)
+    if "daily_customers" in results:
+        unique_customers, repeat_customer_rate = {}, {}
+        for window, days in CUSTOMER_WINDOWS.items():
+            unique_customers[window], repeat_customer_rate[window] = customer_activity.count_customers(
+                results["daily_customers"], today - timedelta(days=days - 1), today
+            )
+        sections.update(unique_customers=unique_customers, repeat_customer_rate=repeat_customer_rate)
+    return schemas.RestaurantAnalytics(**sections, partial=partial)
+
+
+async def _customer_rollup(shard, customer_id: int):
+    activity = models.CustomerMonthlyActivity
+    async with shard.read_session() as session:
+        result = await session.execute(
+            select(activity.restaurant_id, activity.month, activity.order_count, activity.total_spent_paise)
+            .where(activity.customer_id == customer_id)
+        )
+        return result.fetchall()
+
+
+async def _customer_first_month_orders(shard, customer_id: int, since: datetime, month_end: datetime) -> int:
+    # The window's first month is only partly inside it, so its orders are
+    # counted from the order history; every later month comes from the rollup.
+    first_month = order_history(lambda order, item: select(order.id).where(
+        order.customer_id == customer_id, order.order_date >= since, order.order_date < month_end
+    ))
+    async with shard.read_session() as session:
+        return await session.scalar(select(func.count()).select_from(first_month))
+
+
+async def _restaurant_names(restaurant_ids: List[int]) -> Dict[int, str]:
+    async with database.ReadSessionLocal() as catalog:
+        result = await catalog.execute(
+            select(models.Restaurant.id, models.Restaurant.name).where(models.Restaurant.id.in_(restaurant_ids))
+        )
+        return dict(result.fetchall())
+
 
 async def calculate_customer_analytics(db, customer_id: int) -> schemas.CustomerAnalytics:
+    since = datetime.now() - timedelta(days=365)
+    first_month = since.strftime("%Y-%m")
+    month_end = (since.replace(day=1, hour=0, minute=0, second=0, microsecond=0) + timedelta(days=32)).replace(day=1)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + CUSTOMER_ANALYTICS_DEADLINE
+
+    # A customer's orders are spread over every shard; each shard's share of
+    # the monthly rollup and of the first month is read concurrently, on its
+    # own session, and merged here. Shards that miss the deadline are left out.
+    parts = {}
+    for shard in sharding.shards:
+        parts[f"rollup_{shard.index}"] = _customer_rollup(shard, customer_id)
+        parts[f"first_month_{shard.index}"] = _customer_first_month_orders(shard, customer_id, since, month_end)
+    results, partial = await gather_within(deadline - loop.time(), **parts)
     
-    orders_query = select(
-        func.count(models.Order.id).label('total_orders'),
-        func.coalesce(func.sum(models.Order.total_amount), 0).label('total_spent')
-    ).where(models.Order.customer_id == customer_id)
-    
-    result = await db.execute(orders_query)
-    orders_data = result.fetchone()
-    
-    favorite_query = select(
-        models.Restaurant.name,
-        func.count(models.Order.id).label('order_count'),
-        func.sum(models.Order.total_amount).label('total_spent')
-    ).join(
-        models.Order, models.Restaurant.id == models.Order.restaurant_id
-    ).where(
-        models.Order.customer_id == customer_id
-    ).group_by(
-        models.Restaurant.id, models.Restaurant.name
-    ).order_by(
-        func.count(models.Order.id).desc()
-    ).limit(5)
-    
-    favorite_result = await db.execute(favorite_query)
-    favorite_restaurants = [
-        {
-            "name": name,
-            "order_count": count,
-            "total_spent": float(total_spent or 0)
-        }
-        for name, count, total_spent in favorite_result.fetchall()
-    ]
+    spent_by_restaurant = {}
+    order_frequency = {}
+    for shard in sharding.shards:
+        for restaurant_id, month, count, total_spent in results.get(f"rollup_{shard.index}", []):
+            orders, spent = spent_by_restaurant.get(restaurant_id, (0, 0))
+            spent_by_restaurant[restaurant_id] = (orders + count, spent + total_spent)
+            if month > first_month:
+                order_frequency[month] = order_frequency.get(month, 0) + count
+        first_month_orders = results.get(f"first_month_{shard.index}")
+        if first_month_orders:
+            order_frequency[first_month] = order_frequency.get(first_month, 0) + first_month_orders
+    order_frequency = dict(sorted(order_frequency.items()))
     
-    frequency_query = select(
-        func.strftime('%Y-%m', models.Order.order_date).label('month'),
-        func.count(models.Order.id).label('order_count')
-    ).where(
-        and_(
-            models.Order.customer_id == customer_id,
-            models.Order.order_date >= datetime.now() - timedelta(days=365)
-        )
-    ).group_by(
-        func.strftime('%Y-%m', models.Order.order_date)
-    ).order_by(
-        func.strftime('%Y-%m', models.Order.order_date)
-    )
+    total_orders = sum(count for count, _ in spent_by_restaurant.values())
+    total_spent = sum(spent for _, spent in spent_by_restaurant.values())
     
-    frequency_result = await db.execute(frequency_query)
-    order_frequency = {
-        month: count for month, count in frequency_result.fetchall()
-    }
+    # Names depend on the rollup, so they get what is left of the deadline.
+    names, late = await gather_within(deadline - loop.time(), names=_restaurant_names(list(spent_by_restaurant)))
+    favorite_restaurants = None
+    if not late:
+        names = names["names"]
+        favorites = sorted(
+            ((restaurant_id, count, spent) for restaurant_id, (count, spent) in spent_by_restaurant.items()
+             if restaurant_id in names),
+            key=lambda favorite: (-favorite[1], favorite[0])
+        )[:5]
+        favorite_restaurants = [
+            {
+                "name": names[restaurant_id],
+                "order_count": count,
+                "total_spent": float(to_rupees(spent))
+            }
+            for restaurant_id, count, spent in favorites
+        ]
     
     return schemas.CustomerAnalytics(
-        total_orders=orders_data.total_orders or 0,
-        total_spent=orders_data.total_spent or Decimal('0.00'),
+        total_orders=total_orders,
+        total_spent=to_rupees(total_spent),
         favorite_restaurants=favorite_restaurants,
-        order_frequency=order_frequency
+        order_frequency=order_frequency,
+        partial=partial or late
     )
 
 
@@ -214,4 +306,21 @@ def validate_restaurant_operating_hours(restaurant: models.Restaurant) -> bool:
             detail=f"Restaurant is closed. Operating hours: {restaurant.opening_time} - {restaurant.closing_time}"
         )
     
-    return True 
\ No newline at end of file
+    return True 
+
+
+def minute_of_day(value: time) -> int:
+    return value.hour * 60 + value.minute
+
+
+def operating_intervals(opening_time: time, closing_time: time) -> List[Tuple[int, int]]:
+    opening, closing = minute_of_day(opening_time), minute_of_day(closing_time)
+    if opening <= closing:
+        return [(opening, closing)]
+    return [(opening, 24 * 60 - 1), (0, closing)]
+
+
+def resolve_open_at(open_now: bool, open_at: Optional[time]) -> Optional[time]:
+    if open_at is not None:
+        return open_at
+    return datetime.now().time() if open_now else None
@@ -0,0 +1,184 @@
+import logging
+from datetime import date, datetime
+from typing import Dict, List, Tuple
+
+from sqlalchemy import func, update
+from sqlalchemy.future import select
+
+import models
+import sharding
+from utils import hyperloglog
+
+logger = logging.getLogger(__name__)
+
+# Two rollups live next to the orders in each shard and are updated in the same
+# transaction as create_order; archiving does not touch them, so they cover
+# archived orders too.
+# - customer_monthly_activity: orders placed and their total per customer,
+#   month and restaurant, so customer analytics never scans the order history.
+# - restaurant_daily_customers: HyperLogLog sketches of a restaurant's
+#   customers per UTC day. Sketches cannot forget a customer, so deleting a
+#   customer leaves past days unchanged.
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def month_of(at: datetime) -> str:
+    return at.strftime("%Y-%m")
+
+
+async def _has_ordered_from(session, customer_id: int, restaurant_id: int) -> bool:
+    activity = models.CustomerMonthlyActivity
+    result = await session.execute(
+        select(activity.month)
+        .where(activity.customer_id == customer_id, activity.restaurant_id == restaurant_id)
+        .limit(1)
+    )
+    return result.first() is not None
+
+
+async def _record_monthly(session, order: models.Order) -> None:
+    activity = models.CustomerMonthlyActivity
+    result = await session.execute(
+        update(activity)
+        .where(
+            activity.customer_id == order.customer_id,
+            activity.month == month_of(order.order_date),
+            activity.restaurant_id == order.restaurant_id
+        )
+        .values(
+            order_count=activity.order_count + 1,
+            total_spent_paise=activity.total_spent_paise + order.total_amount_paise
+        )
+    )
+    if result.rowcount == 0:
+        session.add(activity(
+            customer_id=order.customer_id,
+            month=month_of(order.order_date),
+            restaurant_id=order.restaurant_id,
+            order_count=1,
+            total_spent_paise=order.total_amount_paise
+        ))
+        await session.flush()
+
+
+async def _record_daily_customer(session, order: models.Order, returning: bool) -> None:
+    result = await session.execute(
+        select(models.RestaurantDailyCustomers).where(
+            models.RestaurantDailyCustomers.restaurant_id == order.restaurant_id,
+            models.RestaurantDailyCustomers.day == order.order_date.date()
+        )
+    )
+    daily = result.scalar_one_or_none()
+    if daily is None:
+        daily = models.RestaurantDailyCustomers(
+            restaurant_id=order.restaurant_id,
+            day=order.order_date.date(),
+            customers=hyperloglog.dumps(hyperloglog.empty()),
+            returning_customers=hyperloglog.dumps(hyperloglog.empty())
+        )
+        session.add(daily)
+
+    customers = hyperloglog.loads(daily.customers)
+    hyperloglog.add(customers, order.customer_id)
+    daily.customers = hyperloglog.dumps(customers)
+    if returning:
+        returning_customers = hyperloglog.loads(daily.returning_customers)
+        hyperloglog.add(returning_customers, order.customer_id)
+        daily.returning_customers = hyperloglog.dumps(returning_customers)
+    await session.flush()
+
+
+async def record_order(session, order: models.Order) -> None:
+    returning = await _has_ordered_from(session, order.customer_id, order.restaurant_id)
+    await _record_monthly(session, order)
+    await _record_daily_customer(session, order, returning)
+
+
+async def load_daily_customers(session, restaurant_id: int, first_day: date, last_day: date) -> List[models.RestaurantDailyCustomers]:
+    result = await session.execute(
+        select(models.RestaurantDailyCustomers).where(
+            models.RestaurantDailyCustomers.restaurant_id == restaurant_id,
+            models.RestaurantDailyCustomers.day >= first_day,
+            models.RestaurantDailyCustomers.day <= last_day
+        )
+    )
+    return result.scalars().all()
+
+
+def count_customers(days: List[models.RestaurantDailyCustomers], first_day: date, last_day: date) -> Tuple[int, float]:
+    """Estimated unique customers between two days (inclusive) and the share who had ordered before."""
+    in_range = [daily for daily in days if first_day <= daily.day <= last_day]
+    unique = hyperloglog.estimate(hyperloglog.merge(daily.customers for daily in in_range))
+    returning = hyperloglog.estimate(hyperloglog.merge(daily.returning_customers for daily in in_range))
+    return unique, min(1.0, returning / unique) if unique else 0.0
+
+
+async def _rebuild_monthly(session) -> int:
+    if await session.scalar(select(func.count()).select_from(models.CustomerMonthlyActivity)):
+        return 0
+
+    totals: Dict[Tuple[int, str, int], list] = {}
+    async for row in _order_history(session):
+        total = totals.setdefault((row.customer_id, month_of(row.order_date), row.restaurant_id), [0, 0])
+        total[0] += 1
+        total[1] += row.total_amount_paise
+
+    session.add_all(
+        models.CustomerMonthlyActivity(
+            customer_id=customer_id, month=month, restaurant_id=restaurant_id,
+            order_count=order_count, total_spent_paise=total_spent_paise
+        )
+        for (customer_id, month, restaurant_id), (order_count, total_spent_paise) in totals.items()
+    )
+    return len(totals)
+
+
+async def _rebuild_daily_customers(session) -> int:
+    if await session.scalar(select(func.count()).select_from(models.RestaurantDailyCustomers)):
+        return 0
+
+    seen = set()
+    sketches: Dict[Tuple[int, date], Tuple[bytearray, bytearray]] = {}
+    async for row in _order_history(session):
+        customers, returning_customers = sketches.setdefault(
+            (row.restaurant_id, row.order_date.date()), (hyperloglog.empty(), hyperloglog.empty())
+        )
+        hyperloglog.add(customers, row.customer_id)
+        if (row.customer_id, row.restaurant_id) in seen:
+            hyperloglog.add(returning_customers, row.customer_id)
+        seen.add((row.customer_id, row.restaurant_id))
+
+    session.add_all(
+        models.RestaurantDailyCustomers(
+            restaurant_id=restaurant_id, day=day,
+            customers=hyperloglog.dumps(customers), returning_customers=hyperloglog.dumps(returning_customers)
+        )
+        for (restaurant_id, day), (customers, returning_customers) in sketches.items()
+    )
+    return len(sketches)
+
+
+async def _order_history(session):
+    # Archived orders first: they are the older ones.
+    for model in (models.ArchivedOrder, models.Order):
+        last_id = 0
+        while True:
+            result = await session.execute(
+                select(model.id, model.customer_id, model.restaurant_id, model.order_date, model.total_amount_paise)
+                .where(model.id > last_id).order_by(model.id).limit(BACKFILL_CHUNK_SIZE)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            for row in rows:
+                yield row
+            last_id = rows[-1].id
+
+
+async def backfill() -> None:
+    """Build the rollups from the order history of shards that do not have them yet."""
+    for shard in sharding.shards:
+        for rebuild, table in ((_rebuild_monthly, "customer activity"), (_rebuild_daily_customers, "daily customer")):
+            rows = await shard.writer.submit(rebuild)
+            if rows:
+                logger.info("Backfilled %d %s rows in shard %d", rows, table, shard.index)
@@ -0,0 +1,170 @@
+import asyncio
+import sqlite3
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import Depends
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from sqlalchemy.util.concurrency import await_
+
+from utils.instrumentation import query_deadline_stats
+from utils.rate_limit import READ_METHODS
+
+# Reads started by a request get this long unless the route sets its own
+# deadline with ``query_deadline``.
+DEFAULT_QUERY_DEADLINE = 10.0
+# SQLite calls the progress handler every this many virtual machine
+# instructions, which is tens of microseconds of query work.
+PROGRESS_HANDLER_INSTRUCTIONS = 1000
+
+
+class Deadline:
+    __slots__ = ("seconds", "expires_at")
+
+    def __init__(self, seconds: float):
+        self.set(seconds)
+
+    def set(self, seconds: float) -> None:
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def expire(self) -> None:
+        self.expires_at = 0.0
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+class QueryDeadlineExceeded(Exception):
+    def __init__(self, deadline: Deadline):
+        super().__init__(f"Query deadline of {deadline.seconds:g}s exceeded")
+
+
+# The deadline of the request being served. Tasks the request spawns (shard
+# fan-out, analytics parts) copy the context and so share the same object.
+current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+
+def query_deadline(seconds: float):
+    """Route dependency giving the request's reads ``seconds`` instead of the default."""
+    async def apply_deadline():
+        deadline = current_deadline.get()
+        if deadline is None:
+            current_deadline.set(Deadline(seconds))
+        else:
+            deadline.set(seconds)
+    return Depends(apply_deadline)
+
+
+def enforce_deadlines(async_engine) -> None:
+    """Interrupt statements on ``async_engine`` that outlive their request's deadline.
+
+    Each connection gets a SQLite progress handler, which runs on the driver
+    thread in the middle of a statement and aborts it by returning true.
+    Before every statement the request's deadline is stored on the
+    connection, where that handler can see it; the context variable itself is
+    only visible on the event loop.
+    """
+    engine = async_engine.sync_engine
+
+    @event.listens_for(engine, "connect")
+    def _install_progress_handler(dbapi_connection, connection_record):
+        info = connection_record.info
+
+        def past_deadline():
+            deadline = info.get("deadline")
+            return deadline is not None and deadline.expired()
+
+        await_(dbapi_connection.driver_connection.set_progress_handler(
+            past_deadline, PROGRESS_HANDLER_INSTRUCTIONS
+        ))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _attach_deadline(conn, cursor, statement, parameters, context, executemany):
+        deadline = current_deadline.get()
+        conn.info["deadline"] = deadline
+        if deadline is not None and deadline.expired():
+            query_deadline_stats.record("expired_before_start")
+            raise QueryDeadlineExceeded(deadline)
+
+    @event.listens_for(engine, "handle_error")
+    def _interrupted(context):
+        error = context.original_exception
+        deadline = context.connection.info.get("deadline") if context.connection is not None else None
+        if isinstance(error, sqlite3.OperationalError) and "interrupted" in str(error) and deadline is not None:
+            query_deadline_stats.record("interrupted")
+            raise QueryDeadlineExceeded(deadline) from error
+
+    @event.listens_for(engine, "checkin")
+    def _detach_deadline(dbapi_connection, connection_record):
+        connection_record.info.pop("deadline", None)
+
+
+async def deadline_exceeded_handler(request, exc: QueryDeadlineExceeded):
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "1"})
+
+
+class QueryDeadlineMiddleware:
+    """Give every request a query deadline and stop its reads when it is over.
+
+    The deadline expires when the response is finished, so queries the
+    request abandoned (cut-off analytics parts) are interrupted instead of
+    running on. For GET and HEAD the request is also cancelled as soon as the
+    client disconnects; writes are left to finish.
+    """
+
+    def __init__(self, app, default_seconds: float = DEFAULT_QUERY_DEADLINE):
+        self.app = app
+        self.default_seconds = default_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        deadline = Deadline(self.default_seconds)
+        token = current_deadline.set(deadline)
+        try:
+            if scope["method"] in READ_METHODS:
+                await self._cancel_on_disconnect(deadline, scope, receive, send)
+            else:
+                await self.app(scope, receive, send)
+        finally:
+            deadline.expire()
+            current_deadline.reset(token)
+
+    async def _cancel_on_disconnect(self, deadline: Deadline, scope, receive, send):
+        # The app reads its messages from a queue fed by a watcher, so the
+        # watcher sees the disconnect even while the app is not listening.
+        messages: asyncio.Queue = asyncio.Queue()
+        responded = False
+
+        async def watch():
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    return
+
+        async def send_tracked(message):
+            nonlocal responded
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                responded = True
+
+        watcher = asyncio.ensure_future(watch())
+        handler = asyncio.ensure_future(self.app(scope, messages.get, send_tracked))
+        try:
+            await asyncio.wait({watcher, handler}, return_when=asyncio.FIRST_COMPLETED)
+            if not handler.done() and not responded:
+                query_deadline_stats.record("client_disconnects")
+                deadline.expire()
+                handler.cancel()
+                await asyncio.wait({handler})
+                return
+            await handler
+        finally:
+            watcher.cancel()
+            handler.cancel()
@@ -0,0 +1,47 @@
+import logging
+from datetime import datetime
+from typing import Callable, List, NamedTuple
+
+import models
+
+logger = logging.getLogger(__name__)
+
+
+class OrderStatusChanged(NamedTuple):
+    order_id: int
+    restaurant_id: int
+    customer_id: int
+    previous_status: models.OrderStatus
+    order_status: models.OrderStatus
+    order_date: datetime
+
+
+OrderEventHandler = Callable[[List[OrderStatusChanged]], None]
+
+
+class OrderEvents:
+    """In-process fan-out of committed order status changes.
+
+    Handlers receive every published batch as one list, so a bulk transition
+    of many orders costs each subscriber a single call. A failing handler is
+    logged and does not stop the others: the changes are already committed.
+    """
+
+    def __init__(self):
+        self._handlers: List[OrderEventHandler] = []
+
+    def subscribe(self, handler: OrderEventHandler) -> OrderEventHandler:
+        self._handlers.append(handler)
+        return handler
+
+    def publish(self, events: List[OrderStatusChanged]) -> None:
+        if not events:
+            return
+        for handler in self._handlers:
+            try:
+                handler(events)
+            except Exception:
+                logger.exception("Order event handler %r failed", handler)
+
+
+order_events = OrderEvents()
@@ -0,0 +1,52 @@
+import math
+from typing import List, Optional
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Grid cells are GRID_SIZE_DEG x GRID_SIZE_DEG, roughly 5.5 km tall.
+GRID_SIZE_DEG = 0.05
+_LAT_CELLS = round(180 / GRID_SIZE_DEG)
+_LON_CELLS = round(360 / GRID_SIZE_DEG)
+_KM_PER_DEG_LAT = math.pi * EARTH_RADIUS_KM / 180
+
+
+def _lat_index(lat: float) -> int:
+    return min(int(math.floor((lat + 90) / GRID_SIZE_DEG)), _LAT_CELLS - 1)
+
+
+def _lon_index(lon: float) -> int:
+    return int(math.floor((lon + 180) / GRID_SIZE_DEG)) % _LON_CELLS
+
+
+def grid_cell(latitude: Optional[float], longitude: Optional[float]) -> Optional[str]:
+    if latitude is None or longitude is None:
+        return None
+    return f"{_lat_index(latitude)}:{_lon_index(longitude)}"
+
+
+def cells_within(latitude: float, longitude: float, radius_km: float) -> List[str]:
+    """Every grid cell that intersects the bounding box of the search circle."""
+    lat_delta = radius_km / _KM_PER_DEG_LAT
+    lat_lo = _lat_index(max(-90.0, latitude - lat_delta))
+    lat_hi = _lat_index(min(90.0, latitude + lat_delta))
+
+    # Longitude degrees shrink with latitude; use the widest edge of the box.
+    widest_lat = min(89.9, abs(latitude) + lat_delta)
+    lon_delta = radius_km / (_KM_PER_DEG_LAT * math.cos(math.radians(widest_lat)))
+    if lon_delta >= 180:
+        lon_indexes = range(_LON_CELLS)
+    else:
+        lon_lo = _lon_index(longitude - lon_delta)
+        span = int(math.floor((longitude + lon_delta + 180) / GRID_SIZE_DEG)) - \
+            int(math.floor((longitude - lon_delta + 180) / GRID_SIZE_DEG))
+        lon_indexes = [(lon_lo + k) % _LON_CELLS for k in range(span + 1)]
+
+    return [f"{i}:{j}" for i in range(lat_lo, lat_hi + 1) for j in lon_indexes]
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
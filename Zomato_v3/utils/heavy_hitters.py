@@ -0,0 +1,270 @@
+import asyncio
+import heapq
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, delete
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+
+import models
+import sharding
+
+logger = logging.getLogger(__name__)
+
+SKETCH_CAPACITY = 100
+WINDOW_DAYS = 7
+PERSIST_INTERVAL = 300
+REPLAY_CHUNK_SIZE = 1000
+SKETCH_KIND = "popular_items"
+ALL_TIME = "all"
+
+
+class SpaceSaving:
+    """Space-Saving summary (Metwally et al.) of weighted item counts.
+
+    Keeps at most ``capacity`` counters. With ``N = total``:
+
+    - a monitored item's ``count`` is an upper bound on its true count and
+      ``count - error`` a lower bound, with ``error <= N / capacity``;
+    - an unmonitored item occurred at most ``min_count() <= N / capacity``
+      times, so every item with a true count above ``N / capacity`` is monitored.
+
+    Counts are exact while there are no more distinct items than counters.
+    """
+
+    def __init__(self, capacity: int = SKETCH_CAPACITY):
+        self.capacity = capacity
+        self.total = 0
+        self._counters: Dict[int, List[int]] = {}  # item -> [count, error]
+        self._heap: List[Tuple[int, int]] = []  # (count, item); entries go stale as counts grow
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    def add(self, item: int, weight: int = 1) -> None:
+        self.total += weight
+        counter = self._counters.get(item)
+        if counter is None:
+            floor = 0
+            if len(self._counters) >= self.capacity:
+                floor = self.min_count()
+                _, evicted = heapq.heappop(self._heap)
+                del self._counters[evicted]
+            counter = self._counters[item] = [floor, floor]
+        counter[0] += weight
+        heapq.heappush(self._heap, (counter[0], item))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, key) for key, (count, _) in self._counters.items()]
+            heapq.heapify(self._heap)
+
+    def min_count(self) -> int:
+        """Upper bound on the count of any item that is not monitored."""
+        if len(self._counters) < self.capacity:
+            return 0
+        while True:
+            count, item = self._heap[0]
+            counter = self._counters.get(item)
+            if counter is not None and counter[0] == count:
+                return count
+            heapq.heappop(self._heap)
+
+    def counters(self) -> Dict[int, Tuple[int, int]]:
+        return {item: (count, error) for item, (count, error) in self._counters.items()}
+
+    def to_payload(self) -> bytes:
+        return json.dumps({
+            "capacity": self.capacity,
+            "total": self.total,
+            "counters": [[item, count, error] for item, (count, error) in self._counters.items()]
+        }).encode()
+
+    @classmethod
+    def from_payload(cls, payload: bytes) -> "SpaceSaving":
+        data = json.loads(payload)
+        summary = cls(data["capacity"])
+        summary.total = data["total"]
+        summary._counters = {item: [count, error] for item, count, error in data["counters"]}
+        summary._heap = [(count, item) for item, (count, _) in summary._counters.items()]
+        heapq.heapify(summary._heap)
+        return summary
+
+
+def top_k(summaries: List[SpaceSaving], k: int) -> List[dict]:
+    """Top ``k`` items over the union of ``summaries`` with their error bounds.
+
+    An item missing from a full summary may still have occurred up to that
+    summary's ``min_count()`` times, so that is added to its upper bound. An
+    item is ``guaranteed`` to be in the true top ``k`` when its lower bound is
+    at least the upper bound of every item ranked below it.
+    """
+    bounds: Dict[int, List[int]] = {}  # item -> [upper, lower]
+    floors = [summary.min_count() for summary in summaries]
+    unmonitored = sum(floors)
+    for summary, floor in zip(summaries, floors):
+        for item, (count, error) in summary.counters().items():
+            bound = bounds.setdefault(item, [unmonitored, 0])
+            bound[0] += count - floor
+            bound[1] += count - error
+
+    ranked = sorted(bounds.items(), key=lambda entry: (-entry[1][0], entry[0]))
+    below = ranked[k][1][0] if len(ranked) > k else 0
+    result = []
+    for item, (upper, lower) in ranked[:k]:
+        result.append({
+            "menu_item_id": item,
+            "count": upper,
+            "error": upper - lower,
+            "guaranteed": lower >= max(below, unmonitored)
+        })
+    return result
+
+
+class PopularItems:
+    """Per-restaurant Space-Saving summaries of ordered quantities.
+
+    One all-time summary and one per UTC day for the last ``WINDOW_DAYS`` days
+    (the sliding window is the union of the day summaries). Fed by
+    ``create_order``; changed summaries are written to ``sketches`` every
+    ``persist_interval`` seconds together with the last order id folded in per
+    shard, and on startup orders after that checkpoint are replayed.
+    """
+
+    def __init__(self, capacity: int = SKETCH_CAPACITY, persist_interval: float = PERSIST_INTERVAL):
+        self.capacity = capacity
+        self.persist_interval = persist_interval
+        self._summaries: Dict[Tuple[int, str], SpaceSaving] = {}
+        self._dirty: Set[Tuple[int, str]] = set()
+        self._checkpoints: Dict[int, int] = {}  # shard index -> last order id recorded
+        self._session_factory = None
+        self._persister: Optional[asyncio.Task] = None
+
+    def _window_days(self) -> List[str]:
+        today = datetime.utcnow().date()
+        return [(today - timedelta(days=offset)).isoformat() for offset in range(WINDOW_DAYS)]
+
+    def _summary(self, restaurant_id: int, period: str) -> SpaceSaving:
+        key = (restaurant_id, period)
+        summary = self._summaries.get(key)
+        if summary is None:
+            summary = self._summaries[key] = SpaceSaving(self.capacity)
+        self._dirty.add(key)
+        return summary
+
+    def record(self, order_id: int, restaurant_id: int, items: Iterable[Tuple[int, int]], placed_at: Optional[datetime] = None) -> None:
+        day = (placed_at or datetime.utcnow()).date().isoformat()
+        periods = [ALL_TIME]
+        if day in self._window_days():
+            periods.append(day)
+        for period in periods:
+            summary = self._summary(restaurant_id, period)
+            for menu_item_id, quantity in items:
+                summary.add(menu_item_id, quantity)
+
+        shard_index = sharding.shard_for_id(order_id).index
+        self._checkpoints[shard_index] = max(self._checkpoints.get(shard_index, 0), order_id)
+
+    def top(self, restaurant_id: int, window: str = ALL_TIME, k: int = 10) -> List[dict]:
+        periods = [ALL_TIME] if window == ALL_TIME else self._window_days()
+        summaries = [self._summaries[(restaurant_id, period)] for period in periods if (restaurant_id, period) in self._summaries]
+        return top_k(summaries, k)
+
+    def forget(self, restaurant_id: int) -> None:
+        for key in [key for key in self._summaries if key[0] == restaurant_id]:
+            del self._summaries[key]
+            self._dirty.discard(key)
+
+    async def load(self, db) -> None:
+        """Restore persisted summaries from the catalog and replay newer orders."""
+        self._summaries, self._dirty, self._checkpoints = {}, set(), {}
+        window = set(self._window_days()) | {ALL_TIME}
+        result = await db.execute(select(models.Sketch).where(models.Sketch.kind == SKETCH_KIND))
+        for sketch in result.scalars().all():
+            if sketch.period in window:
+                self._summaries[(sketch.restaurant_id, sketch.period)] = SpaceSaving.from_payload(sketch.payload)
+        result = await db.execute(select(models.SketchCheckpoint).where(models.SketchCheckpoint.kind == SKETCH_KIND))
+        checkpoints = {checkpoint.shard_index: checkpoint.last_order_id for checkpoint in result.scalars().all()}
+
+        for shard in sharding.shards:
+            start = checkpoints.get(shard.index)
+            # Without a checkpoint nothing was persisted yet: start from all history.
+            tables = [(models.Order, models.Order.order_items)]
+            if start is None:
+                tables.append((models.ArchivedOrder, models.ArchivedOrder.order_items))
+            for model, items in tables:
+                await self._replay(shard, model, items, start or 0)
+            if start is not None:
+                self._checkpoints[shard.index] = max(self._checkpoints.get(shard.index, 0), start)
+
+    async def _replay(self, shard, model, items, after_id: int) -> None:
+        while True:
+            async with shard.read_session() as session:
+                result = await session.execute(
+                    select(model).options(selectinload(items))
+                    .where(model.id > after_id).order_by(model.id).limit(REPLAY_CHUNK_SIZE)
+                )
+                orders = result.scalars().all()
+            if not orders:
+                return
+            for order in orders:
+                self.record(order.id, order.restaurant_id,
+                            [(item.menu_item_id, item.quantity) for item in order.order_items], order.order_date)
+            after_id = orders[-1].id
+
+    async def persist(self, db) -> None:
+        # Serialize before the first await so concurrent records land in the next round.
+        changed = [(key, self._summaries[key].to_payload()) for key in self._dirty if key in self._summaries]
+        checkpoints = dict(self._checkpoints)
+        self._dirty = set()
+
+        for (restaurant_id, period), payload in changed:
+            statement = insert(models.Sketch).values(
+                kind=SKETCH_KIND, restaurant_id=restaurant_id, period=period, payload=payload, updated_at=datetime.utcnow()
+            )
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=["kind", "restaurant_id", "period"],
+                set_={"payload": statement.excluded.payload, "updated_at": statement.excluded.updated_at}
+            ))
+        for shard_index, last_order_id in checkpoints.items():
+            statement = insert(models.SketchCheckpoint).values(
+                kind=SKETCH_KIND, shard_index=shard_index, last_order_id=last_order_id
+            )
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=["kind", "shard_index"], set_={"last_order_id": last_order_id}
+            ))
+        oldest = (datetime.utcnow().date() - timedelta(days=WINDOW_DAYS - 1)).isoformat()
+        await db.execute(delete(models.Sketch).where(and_(
+            models.Sketch.kind == SKETCH_KIND, models.Sketch.period != ALL_TIME, models.Sketch.period < oldest
+        )))
+        await db.commit()
+
+        for key in [key for key in self._summaries if key[1] != ALL_TIME and key[1] < oldest]:
+            del self._summaries[key]
+
+    async def _persist_periodically(self, session_factory) -> None:
+        while True:
+            await asyncio.sleep(self.persist_interval)
+            try:
+                async with session_factory() as db:
+                    await self.persist(db)
+            except Exception:
+                logger.exception("Persisting popular item sketches failed")
+
+    async def start(self, session_factory) -> None:
+        self._session_factory = session_factory
+        self._persister = asyncio.create_task(self._persist_periodically(session_factory))
+
+    async def stop(self) -> None:
+        if self._persister is None:
+            return
+        self._persister.cancel()
+        await asyncio.gather(self._persister, return_exceptions=True)
+        self._persister = None
+        async with self._session_factory() as db:
+            await self.persist(db)
+
+
+popular_items = PopularItems()
@@ -0,0 +1,63 @@
+"""HyperLogLog distinct counting (Flajolet et al., with the small-range correction).
+
+Sketches are ``REGISTERS`` one-byte registers. An estimate has a relative
+standard error of about ``1.04 / sqrt(REGISTERS)`` (1.6%); small counts are
+estimated by linear counting, which is nearly exact. The union of any set of
+sketches is their register-wise maximum, so per-day sketches merge into any
+date range.
+
+Stored sketches are zlib-compressed: a day with a handful of customers takes
+a few dozen bytes instead of 4 KiB.
+"""
+import hashlib
+import zlib
+from typing import Iterable, Optional
+
+import numpy as np
+
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+_RANK_BITS = 64 - PRECISION
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+
+
+def empty() -> bytearray:
+    return bytearray(REGISTERS)
+
+
+def add(registers: bytearray, value: int) -> None:
+    # blake2b rather than hash(): registers are persisted, so the hash must not
+    # change between processes.
+    hashed = int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+    index = hashed >> _RANK_BITS
+    rest = hashed & ((1 << _RANK_BITS) - 1)
+    rank = _RANK_BITS - rest.bit_length() + 1
+    if rank > registers[index]:
+        registers[index] = rank
+
+
+def dumps(registers: bytearray) -> bytes:
+    return zlib.compress(bytes(registers))
+
+
+def loads(blob: bytes) -> bytearray:
+    return bytearray(zlib.decompress(blob))
+
+
+def merge(blobs: Iterable[bytes]) -> Optional[np.ndarray]:
+    """Register-wise maximum of the stored sketches, or None if there are none."""
+    sketches = [np.frombuffer(zlib.decompress(blob), dtype=np.uint8) for blob in blobs]
+    if not sketches:
+        return None
+    return np.maximum.reduce(sketches)
+
+
+def estimate(registers) -> int:
+    if registers is None:
+        return 0
+    registers = np.asarray(registers, dtype=np.uint8)
+    raw = _ALPHA * REGISTERS * REGISTERS / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if raw <= 2.5 * REGISTERS and zeros:
+        return int(round(REGISTERS * np.log(REGISTERS / zeros)))
+    return int(round(raw))
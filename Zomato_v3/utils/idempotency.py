@@ -0,0 +1,218 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, func, update, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.future import select
+
+import models
+import sharding
+from utils.jobs import job_runner
+
+IDEMPOTENCY_TTL = timedelta(hours=24)
+# A claimed key whose request has not finished within this long is taken to be
+# abandoned (the process died mid-request) and the next retry takes it over.
+# Taking over is safe because the operation itself is fenced (see ``Fence``):
+# a retry that runs it again gets the row the original created.
+CLAIM_LEASE = timedelta(seconds=60)
+
+
+def request_fingerprint(*parts: Any) -> str:
+    canonical = json.dumps(jsonable_encoder(parts), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _key_filter(scope: str, key: str):
+    return and_(models.IdempotencyRecord.scope == scope, models.IdempotencyRecord.key == key)
+
+
+def _reused_key():
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail="Idempotency-Key was already used with a different request"
+    )
+
+
+def _in_flight():
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="A request with this Idempotency-Key is still being processed"
+    )
+
+
+async def _take_over(db, scope: str, key: str) -> datetime:
+    # Only one retry may take over: once it has renewed the lease the update
+    # no longer matches for the others.
+    claimed_at = datetime.utcnow()
+    result = await db.execute(
+        update(models.IdempotencyRecord)
+        .where(
+            _key_filter(scope, key),
+            models.IdempotencyRecord.status_code.is_(None),
+            func.coalesce(models.IdempotencyRecord.claimed_at, models.IdempotencyRecord.created_at)
+            <= claimed_at - CLAIM_LEASE
+        )
+        .values(claimed_at=claimed_at)
+    )
+    await db.commit()
+    if result.rowcount != 1:
+        raise _in_flight()
+    return claimed_at
+
+
+async def _claim(db, scope: str, key: str, request_hash: str) -> Tuple[Optional[JSONResponse], Optional[datetime]]:
+    """Claim ``key`` for this request: returns ``(replay, None)`` or ``(None, claimed_at)``."""
+    result = await db.execute(select(models.IdempotencyRecord).where(_key_filter(scope, key)))
+    record = result.scalar_one_or_none()
+
+    if record is not None and record.expires_at <= datetime.utcnow():
+        await db.delete(record)
+        await db.flush()
+        record = None
+
+    if record is not None:
+        if record.request_hash != request_hash:
+            raise _reused_key()
+        if record.status_code is None:
+            if (record.claimed_at or record.created_at) + CLAIM_LEASE > datetime.utcnow():
+                raise _in_flight()
+            return None, await _take_over(db, scope, key)
+        return JSONResponse(
+            status_code=record.status_code,
+            content=json.loads(record.response_body),
+            headers={"Idempotent-Replayed": "true"}
+        ), None
+
+    claimed_at = datetime.utcnow()
+    db.add(models.IdempotencyRecord(
+        scope=scope,
+        key=key,
+        request_hash=request_hash,
+        claimed_at=claimed_at,
+        expires_at=claimed_at + IDEMPOTENCY_TTL
+    ))
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise _in_flight()
+    return None, claimed_at
+
+
+class Fence:
+    """The key, checked and recorded inside the operation's own shard transaction.
+
+    The response record above lives in the catalog and is finished after the
+    shard has committed, so on its own it cannot tell whether a claimed but
+    unfinished request created its row. The operation calls ``find`` in its
+    shard transaction and, when the key was already used, returns the row it
+    names instead of creating another; otherwise it creates the row and calls
+    ``record``, which commits with it. The unique index on ``(scope, key)``
+    keeps two runs from both recording.
+    """
+
+    def __init__(self, scope: str, key: str, request_hash: str):
+        self.scope = scope
+        self.key = key
+        self.request_hash = request_hash
+        self.shard: Optional[sharding.Shard] = None  # set by the operation before it writes
+
+    def _query(self):
+        return select(models.IdempotencyFence).where(
+            models.IdempotencyFence.scope == self.scope, models.IdempotencyFence.key == self.key
+        )
+
+    async def find(self, session) -> Optional[int]:
+        """Id of the row a previous run with this key created, if any."""
+        fence = (await session.execute(self._query())).scalar_one_or_none()
+        if fence is None:
+            return None
+        if fence.request_hash != self.request_hash:
+            raise _reused_key()
+        return fence.resource_id
+
+    def record(self, session, resource_id: int) -> None:
+        session.add(models.IdempotencyFence(
+            scope=self.scope,
+            key=self.key,
+            request_hash=self.request_hash,
+            resource_id=resource_id,
+            expires_at=datetime.utcnow() + IDEMPOTENCY_TTL
+        ))
+
+    async def committed(self) -> bool:
+        """Whether a row for this key and request has been committed."""
+        if self.shard is None:
+            return False
+        async with self.shard.read_session() as session:
+            fence = (await session.execute(self._query())).scalar_one_or_none()
+        return fence is not None and fence.request_hash == self.request_hash
+
+
+async def run_idempotent(
+    db,
+    scope: str,
+    key: Optional[str],
+    request_hash: str,
+    status_code: int,
+    operation: Callable[[Optional[Fence]], Awaitable[Any]]
+):
+    """Run ``operation`` once per ``(scope, key)`` and replay its response afterwards.
+
+    ``operation(fence)`` must return the response model instance, and must
+    honour ``fence`` (``None`` without a key) in the shard transaction that
+    creates its row. If it fails before that transaction commits the key is
+    released so the client can retry. If it fails after (a post-commit hook,
+    a cancelled request), the key stays claimed with its lease ended, so the
+    next retry takes it over at once and the fence hands it the committed
+    row. ``scope`` should name the caller as well as the operation, so
+    clients picking the same key do not collide.
+    """
+    if key is None:
+        return await operation(None)
+
+    replay, claimed_at = await _claim(db, scope, key, request_hash)
+    if replay is not None:
+        return replay
+
+    fence = Fence(scope, key, request_hash)
+    ours = and_(_key_filter(scope, key), models.IdempotencyRecord.claimed_at == claimed_at)
+    try:
+        response = await operation(fence)
+    except BaseException:
+        await db.rollback()
+        if await fence.committed():
+            await db.execute(update(models.IdempotencyRecord).where(ours).values(claimed_at=claimed_at - CLAIM_LEASE))
+        else:
+            # Still safe if the shard commits later after all (a cancelled
+            # request whose write was queued): the next run finds the fence.
+            await db.execute(delete(models.IdempotencyRecord).where(ours, models.IdempotencyRecord.status_code.is_(None)))
+        await db.commit()
+        raise
+
+    await db.execute(
+        update(models.IdempotencyRecord)
+        .where(ours)
+        .values(status_code=status_code, response_body=json.dumps(jsonable_encoder(response)))
+    )
+    await db.commit()
+    return response
+
+
+@job_runner.task("purge_idempotency_keys")
+async def purge_expired_keys(db):
+    now = datetime.utcnow()
+    await db.execute(delete(models.IdempotencyRecord).where(models.IdempotencyRecord.expires_at <= now))
+    await db.commit()
+    for shard in sharding.shards:
+        await shard.writer.submit(lambda session: session.execute(
+            delete(models.IdempotencyFence).where(models.IdempotencyFence.expires_at <= now)
+        ))
+
+
+job_runner.schedule("purge_idempotency_keys", every_seconds=3600)
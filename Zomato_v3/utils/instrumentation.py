@@ -0,0 +1,78 @@
+from collections import Counter
+from typing import Dict, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+
+
+class QueryCacheStats:
+    """Hit counters for each engine's compiled statement cache.
+
+    SQLAlchemy compiles a statement once per distinct shape and keeps the
+    result in an LRU cache of ``query_cache_size`` entries per engine. Every
+    execution reports whether its compiled form came from that cache; a steady
+    rate of misses means the cache is too small or statements are being built
+    with inlined values instead of bound parameters. Driver-level SQL
+    (``exec_driver_sql``, pragmas) is counted as ``uncached``.
+    """
+
+    def __init__(self):
+        self._engines: Dict[str, Tuple[Engine, Counter]] = {}
+
+    def watch(self, label: str, async_engine) -> None:
+        engine = async_engine.sync_engine
+        counts = Counter()
+        self._engines[label] = (engine, counts)
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _count(conn, cursor, statement, parameters, context, executemany):
+            cache_hit = getattr(context, "cache_hit", None)
+            if cache_hit is CACHE_HIT:
+                counts["hits"] += 1
+            elif cache_hit is CACHE_MISS:
+                counts["misses"] += 1
+            else:
+                counts["uncached"] += 1
+
+    def snapshot(self) -> Dict[str, dict]:
+        stats = {}
+        for label, (engine, counts) in self._engines.items():
+            cache = engine._compiled_cache
+            lookups = counts["hits"] + counts["misses"]
+            stats[label] = {
+                "hits": counts["hits"],
+                "misses": counts["misses"],
+                "uncached": counts["uncached"],
+                "hit_rate": round(counts["hits"] / lookups, 4) if lookups else None,
+                "entries": len(cache) if cache is not None else 0,
+                "capacity": cache.capacity if cache is not None else 0,
+            }
+        return stats
+
+
+query_cache_stats = QueryCacheStats()
+
+
+class QueryDeadlineStats:
+    """How often request deadlines (utils/deadlines.py) stopped a read.
+
+    ``interrupted`` counts statements aborted mid-query by SQLite's progress
+    handler, ``expired_before_start`` statements refused because the deadline
+    had already passed, and ``client_disconnects`` read requests cancelled
+    because the client went away before the response was sent.
+    """
+
+    OUTCOMES = ("interrupted", "expired_before_start", "client_disconnects")
+
+    def __init__(self):
+        self._counts = Counter()
+
+    def record(self, outcome: str) -> None:
+        self._counts[outcome] += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        return {outcome: self._counts[outcome] for outcome in self.OUTCOMES}
+
+
+query_deadline_stats = QueryDeadlineStats()
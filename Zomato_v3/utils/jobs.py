@@ -0,0 +1,232 @@
+import asyncio
+import json
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from sqlalchemy import update, delete
+from sqlalchemy.future import select
+
+import models
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[..., Awaitable[None]]
+
+
+class JobRunner:
+    """In-process runner for derived-data work enqueued alongside a write.
+
+    Jobs are rows in ``background_jobs`` added to the caller's session, so they
+    commit (or roll back) with the data that produced them. After the commit the
+    caller hands them to ``dispatch`` which offers them to a bounded queue served
+    by ``concurrency`` workers. Anything that does not fit in the queue, is waiting
+    for a retry, or was interrupted by a restart is picked up by the poller, which
+    also enqueues jobs registered with ``schedule`` when they fall due.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        queue_size: int = 1000,
+        concurrency: int = 2,
+        max_attempts: int = 5,
+        base_backoff: float = 1.0,
+        max_backoff: float = 300.0,
+        poll_interval: float = 5.0,
+        drain_timeout: float = 10.0,
+    ):
+        self._session_factory = session_factory
+        self._queue_size = queue_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.drain_timeout = drain_timeout
+        self._handlers: Dict[str, JobHandler] = {}
+        self._schedules: Dict[str, float] = {}
+        self._next_due: Dict[str, float] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued: Set[int] = set()
+        self._workers = []
+        self._poller: Optional[asyncio.Task] = None
+        self._accepting = False
+
+    def task(self, name: str):
+        def decorator(func: JobHandler) -> JobHandler:
+            self._handlers[name] = func
+            return func
+        return decorator
+
+    def schedule(self, name: str, every_seconds: float) -> None:
+        """Run the handler registered as ``name`` periodically, without payload."""
+        self._schedules[name] = every_seconds
+
+    def enqueue(self, db, name: str, **payload) -> models.BackgroundJob:
+        if name not in self._handlers:
+            raise ValueError(f"No handler registered for job {name!r}")
+        job = models.BackgroundJob(
+            name=name,
+            payload=json.dumps(payload),
+            run_after=datetime.utcnow()
+        )
+        db.add(job)
+        return job
+
+    def dispatch(self, *jobs: models.BackgroundJob) -> None:
+        for job in jobs:
+            self._offer(job.id)
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        async with self._session_factory() as db:
+            # Jobs left RUNNING were interrupted by the previous shutdown.
+            await db.execute(
+                update(models.BackgroundJob)
+                .where(models.BackgroundJob.status == models.JobStatus.RUNNING)
+                .values(status=models.JobStatus.PENDING)
+            )
+            await db.commit()
+        self._accepting = True
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._poller = asyncio.create_task(self._poll())
+
+    async def stop(self) -> None:
+        self._accepting = False
+        if self._poller:
+            self._poller.cancel()
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=self.drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Job queue not drained after %ss; %d jobs left for next start",
+                               self.drain_timeout, self._queue.qsize())
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, *filter(None, [self._poller]), return_exceptions=True)
+        self._workers = []
+        self._poller = None
+        self._queued.clear()
+
+    def _offer(self, job_id: int) -> None:
+        if not self._accepting or job_id in self._queued:
+            return
+        try:
+            self._queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            return  # still PENDING in the table, the poller will pick it up
+        self._queued.add(job_id)
+
+    async def _enqueue_scheduled(self) -> None:
+        now = asyncio.get_running_loop().time()
+        due = [name for name, every in self._schedules.items() if self._next_due.get(name, 0) <= now]
+        if not due:
+            return
+        async with self._session_factory() as db:
+            result = await db.execute(
+                select(models.BackgroundJob.name).where(
+                    models.BackgroundJob.name.in_(due),
+                    models.BackgroundJob.status != models.JobStatus.FAILED
+                )
+            )
+            outstanding = set(result.scalars().all())
+            for name in due:
+                self._next_due[name] = now + self._schedules[name]
+                if name not in outstanding:
+                    self.enqueue(db, name)
+            await db.commit()
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self._enqueue_scheduled()
+            except Exception:
+                logger.exception("Enqueueing scheduled jobs failed")
+            free = self._queue.maxsize - self._queue.qsize()
+            if free <= 0:
+                continue
+            try:
+                async with self._session_factory() as db:
+                    result = await db.execute(
+                        select(models.BackgroundJob.id)
+                        .where(
+                            models.BackgroundJob.status == models.JobStatus.PENDING,
+                            models.BackgroundJob.run_after <= datetime.utcnow()
+                        )
+                        .order_by(models.BackgroundJob.run_after)
+                        .limit(free)
+                    )
+                    job_ids = result.scalars().all()
+            except Exception:
+                logger.exception("Polling background jobs failed")
+                continue
+            for job_id in job_ids:
+                self._offer(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                logger.exception("Background job %s crashed the runner", job_id)
+            finally:
+                self._queued.discard(job_id)
+                self._queue.task_done()
+
+    async def _run(self, job_id: int) -> None:
+        async with self._session_factory() as db:
+            claimed = await db.execute(
+                update(models.BackgroundJob)
+                .where(
+                    models.BackgroundJob.id == job_id,
+                    models.BackgroundJob.status == models.JobStatus.PENDING
+                )
+                .values(status=models.JobStatus.RUNNING, attempts=models.BackgroundJob.attempts + 1)
+            )
+            await db.commit()
+            if claimed.rowcount == 0:
+                return
+            job = await db.get(models.BackgroundJob, job_id)
+
+        handler = self._handlers.get(job.name)
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job {job.name!r}")
+            async with self._session_factory() as db:
+                await handler(db, **json.loads(job.payload))
+        except Exception as e:
+            await self._record_failure(job, e)
+            return
+
+        async with self._session_factory() as db:
+            await db.execute(delete(models.BackgroundJob).where(models.BackgroundJob.id == job_id))
+            await db.commit()
+
+    async def _record_failure(self, job: models.BackgroundJob, error: Exception) -> None:
+        values = {"last_error": f"{type(error).__name__}: {error}"}
+        if job.attempts >= self.max_attempts:
+            logger.error("Background job %s (%s) failed permanently: %s", job.id, job.name, error)
+            values["status"] = models.JobStatus.FAILED
+            delay = None
+        else:
+            delay = min(self.max_backoff, self.base_backoff * 2 ** (job.attempts - 1))
+            delay *= random.uniform(0.5, 1.0)
+            values["status"] = models.JobStatus.PENDING
+            values["run_after"] = datetime.utcnow() + timedelta(seconds=delay)
+
+        async with self._session_factory() as db:
+            await db.execute(
+                update(models.BackgroundJob).where(models.BackgroundJob.id == job.id).values(**values)
+            )
+            await db.commit()
+
+        if delay is not None:
+            asyncio.get_running_loop().call_later(delay, self._offer, job.id)
+
+
+job_runner = JobRunner(SessionLocal)
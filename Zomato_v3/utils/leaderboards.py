@@ -0,0 +1,237 @@
+import math
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+import models
+import sharding
+from utils.events import OrderStatusChanged, order_events
+
+METRICS = ("rating", "orders", "trending")
+# A trending point halves every TRENDING_HALF_LIFE; orders older than
+# TRENDING_WINDOW are not loaded on rebuild (their weight is below 2**-28).
+TRENDING_HALF_LIFE = 6 * 3600
+TRENDING_WINDOW = timedelta(days=7)
+_DECAY = math.log(2) / TRENDING_HALF_LIFE
+_MAX_EXPONENT = 50.0
+
+
+class Leaderboard:
+    """Restaurant ids ordered by score, highest first (ties by lower id).
+
+    Kept as a sorted list, so ``top(k)`` is a slice and an update is two
+    binary searches plus a list shift.
+    """
+
+    def __init__(self):
+        self._entries: List[Tuple[float, int]] = []  # (-score, restaurant_id)
+        self._keys: Dict[int, Tuple[float, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def set(self, restaurant_id: int, score: float) -> None:
+        self.discard(restaurant_id)
+        key = (-score, restaurant_id)
+        insort(self._entries, key)
+        self._keys[restaurant_id] = key
+
+    def discard(self, restaurant_id: int) -> None:
+        key = self._keys.pop(restaurant_id, None)
+        if key is not None:
+            del self._entries[bisect_left(self._entries, key)]
+
+    def top(self, k: int) -> List[Tuple[int, float]]:
+        return [(restaurant_id, -score) for score, restaurant_id in self._entries[:k]]
+
+    def rescale(self, factor: float) -> None:
+        # Multiplying every score by the same positive factor keeps the order.
+        self._entries = [(score * factor, restaurant_id) for score, restaurant_id in self._entries]
+        self._keys = {restaurant_id: (score, restaurant_id) for score, restaurant_id in self._entries}
+
+
+class RestaurantInfo(NamedTuple):
+    name: str
+    cuisine_type: str
+    location: str
+    is_active: bool
+
+
+def _scope_key(value: str) -> str:
+    return value.strip().lower()
+
+
+def _timestamp(at: Optional[datetime]) -> float:
+    # Timestamps are stored as naive UTC.
+    return at.replace(tzinfo=timezone.utc).timestamp() if at else time.time()
+
+
+class Leaderboards:
+    """Top restaurants by rating, order count and trending score.
+
+    Every active restaurant is on the platform-wide board and on the boards
+    for its cuisine and its location. Writes update them in place (see crud);
+    ``rebuild`` reloads everything from the databases at startup. Trending is a
+    forward-decayed order count: each order adds ``exp(decay * (t - landmark))``,
+    so older orders never need updating and the ranking is the same as for
+    the exponentially decayed count at any later time.
+    """
+
+    def __init__(self):
+        self._boards: Dict[Tuple[str, str], Leaderboard] = {}
+        self._restaurants: Dict[int, RestaurantInfo] = {}
+        self._scores: Dict[str, Dict[int, float]] = {metric: {} for metric in METRICS}
+        self._landmark = time.time()
+
+    def _scopes(self, info: RestaurantInfo) -> Tuple[str, ...]:
+        return ("all", f"cuisine:{_scope_key(info.cuisine_type)}", f"location:{_scope_key(info.location)}")
+
+    def _publish(self, restaurant_id: int, *metrics: str) -> None:
+        info = self._restaurants.get(restaurant_id)
+        if info is None or not info.is_active:
+            return
+        for metric in metrics:
+            score = self._scores[metric].get(restaurant_id, 0.0)
+            for scope in self._scopes(info):
+                self._boards.setdefault((metric, scope), Leaderboard()).set(restaurant_id, score)
+
+    def _withdraw(self, restaurant_id: int) -> None:
+        info = self._restaurants.get(restaurant_id)
+        if info is None:
+            return
+        for metric in METRICS:
+            for scope in self._scopes(info):
+                board = self._boards.get((metric, scope))
+                if board is not None:
+                    board.discard(restaurant_id)
+
+    def _trending_weight(self, at: Optional[datetime]) -> float:
+        exponent = _DECAY * (_timestamp(at) - self._landmark)
+        if exponent > _MAX_EXPONENT:
+            self._move_landmark(time.time())
+            exponent = _DECAY * (_timestamp(at) - self._landmark)
+        return math.exp(exponent)
+
+    def _move_landmark(self, landmark: float) -> None:
+        factor = math.exp(-_DECAY * (landmark - self._landmark))
+        self._landmark = landmark
+        trending = self._scores["trending"]
+        for restaurant_id in trending:
+            trending[restaurant_id] *= factor
+        for (metric, _), board in self._boards.items():
+            if metric == "trending":
+                board.rescale(factor)
+
+    def upsert_restaurant(self, restaurant: models.Restaurant) -> None:
+        self._withdraw(restaurant.id)
+        self._restaurants[restaurant.id] = RestaurantInfo(
+            restaurant.name, restaurant.cuisine_type, restaurant.location, bool(restaurant.is_active)
+        )
+        self._scores["rating"][restaurant.id] = restaurant.rating or 0.0
+        self._publish(restaurant.id, *METRICS)
+
+    def remove_restaurant(self, restaurant_id: int) -> None:
+        self._withdraw(restaurant_id)
+        self._restaurants.pop(restaurant_id, None)
+        for scores in self._scores.values():
+            scores.pop(restaurant_id, None)
+
+    def set_rating(self, restaurant_id: int, rating: float) -> None:
+        self._scores["rating"][restaurant_id] = rating
+        self._publish(restaurant_id, "rating")
+
+    def record_order(self, restaurant_id: int, placed_at: Optional[datetime] = None) -> None:
+        self._add_order(restaurant_id, 1, self._trending_weight(placed_at))
+
+    def record_status_changes(self, events: List[OrderStatusChanged]) -> None:
+        # Cancelled orders stop counting; each restaurant's boards are updated
+        # once per batch however many of its orders changed.
+        orders, trending = self._scores["orders"], self._scores["trending"]
+        touched = set()
+        for event in events:
+            if event.order_status != models.OrderStatus.CANCELLED:
+                continue
+            restaurant_id = event.restaurant_id
+            orders[restaurant_id] = max(0.0, orders.get(restaurant_id, 0.0) - 1)
+            trending[restaurant_id] = max(0.0, trending.get(restaurant_id, 0.0) - self._trending_weight(event.order_date))
+            touched.add(restaurant_id)
+        for restaurant_id in touched:
+            self._publish(restaurant_id, "orders", "trending")
+
+    def _add_order(self, restaurant_id: int, count: int, weight: float) -> None:
+        orders, trending = self._scores["orders"], self._scores["trending"]
+        orders[restaurant_id] = max(0.0, orders.get(restaurant_id, 0.0) + count)
+        trending[restaurant_id] = max(0.0, trending.get(restaurant_id, 0.0) + weight)
+        self._publish(restaurant_id, "orders", "trending")
+
+    def top(self, metric: str, cuisine: Optional[str] = None, location: Optional[str] = None, limit: int = 10) -> List[dict]:
+        if cuisine:
+            scope = f"cuisine:{_scope_key(cuisine)}"
+        elif location:
+            scope = f"location:{_scope_key(location)}"
+        else:
+            scope = "all"
+        board = self._boards.get((metric, scope))
+        if board is None:
+            return []
+
+        # Report trending as the decayed count as of now, in "recent orders".
+        scale = math.exp(-_DECAY * (time.time() - self._landmark)) if metric == "trending" else 1.0
+        entries = []
+        for restaurant_id, score in board.top(limit):
+            info = self._restaurants[restaurant_id]
+            entries.append({
+                "restaurant_id": restaurant_id,
+                "name": info.name,
+                "cuisine_type": info.cuisine_type,
+                "location": info.location,
+                "score": score * scale
+            })
+        return entries
+
+    async def rebuild(self, db) -> None:
+        """Reload every board from the catalog (``db``) and the order shards."""
+        now = time.time()
+        cutoff = datetime.utcfromtimestamp(now) - TRENDING_WINDOW
+        cancelled = models.OrderStatus.CANCELLED
+
+        async def load(shard):
+            async with shard.read_session() as session:
+                counts = []
+                for model in (models.Order, models.ArchivedOrder):
+                    result = await session.execute(
+                        select(model.restaurant_id, func.count(model.id))
+                        .where(model.order_status != cancelled)
+                        .group_by(model.restaurant_id)
+                    )
+                    counts.extend(result.all())
+                recent = await session.execute(
+                    select(models.Order.restaurant_id, models.Order.order_date)
+                    .where(models.Order.order_status != cancelled, models.Order.order_date >= cutoff)
+                )
+                return counts, recent.all()
+
+        per_shard = await sharding.fan_out(load)
+        result = await db.execute(select(models.Restaurant))
+        restaurants = result.scalars().all()
+
+        self._boards = {}
+        self._restaurants = {}
+        self._scores = {metric: {} for metric in METRICS}
+        self._landmark = now
+        orders, trending = self._scores["orders"], self._scores["trending"]
+        for counts, recent in per_shard:
+            for restaurant_id, count in counts:
+                orders[restaurant_id] = orders.get(restaurant_id, 0.0) + count
+            for restaurant_id, placed_at in recent:
+                trending[restaurant_id] = trending.get(restaurant_id, 0.0) + self._trending_weight(placed_at)
+        for restaurant in restaurants:
+            self.upsert_restaurant(restaurant)
+
+
+leaderboards = Leaderboards()
+order_events.subscribe(leaderboards.record_status_changes)
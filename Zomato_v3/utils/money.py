@@ -0,0 +1,50 @@
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Optional, Union
+
+from sqlalchemy import Integer, type_coerce
+from sqlalchemy.types import TypeDecorator
+
+# Amounts are stored as integer paise (1 rupee = 100 paise): sums and totals
+# are exact in SQL and in Python, on SQLite (where DECIMAL is a REAL) as well
+# as on other databases. The API keeps showing rupees as Decimal.
+PAISE_PER_RUPEE = 100
+_CENT = Decimal("0.01")
+
+
+def to_paise(amount: Union[Decimal, float, int, str]) -> int:
+    return int(Decimal(str(amount)).quantize(_CENT, rounding=ROUND_HALF_UP) * PAISE_PER_RUPEE)
+
+
+def to_rupees(paise: int) -> Decimal:
+    return Decimal(paise).scaleb(-2)
+
+
+def rupees(paise_attribute: str) -> property:
+    """Decimal rupee view of an integer paise column, settable from any amount."""
+
+    def get(obj) -> Optional[Decimal]:
+        paise = getattr(obj, paise_attribute)
+        return None if paise is None else to_rupees(paise)
+
+    def set(obj, amount) -> None:
+        setattr(obj, paise_attribute, to_paise(amount))
+
+    return property(get, set)
+
+
+class RupeeAmount(TypeDecorator):
+    """Integer paise in the database, Decimal rupees in Python."""
+
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_paise(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else to_rupees(value)
+
+
+def as_rupees(paise_column, name: str):
+    """Select a paise column as a rupee ``Decimal`` labelled ``name``, for column-only queries."""
+    return type_coerce(paise_column, RupeeAmount()).label(name)
@@ -0,0 +1,129 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import numpy as np
+from sqlalchemy import Integer, String, cast, func, type_coerce
+from sqlalchemy.future import select
+
+import database
+import models
+import sharding
+from utils.deadlines import current_deadline
+from utils.platform_stats import STATUSES, compute_platform_stats
+
+REFRESH_INTERVAL = 300
+_STATUS_CODES = {order_status.name: STATUSES.index(order_status.value) for order_status in models.OrderStatus}
+
+
+async def _order_columns(shard):
+    async with shard.read_session() as session:
+        rows = []
+        for model in (models.Order, models.ArchivedOrder):
+            result = await session.execute(select(
+                model.restaurant_id,
+                type_coerce(model.order_status, String),
+                model.total_amount_paise,
+                cast(func.strftime('%H', model.order_date), Integer)
+            ))
+            rows.extend(result.all())
+        return rows
+
+
+async def load_snapshot() -> Dict[str, Any]:
+    """Column arrays of every order (live and archived) for ``compute_platform_stats``."""
+    async with database.ReadSessionLocal() as db:
+        result = await db.execute(
+            select(models.Restaurant.id, models.Restaurant.location, models.Restaurant.cuisine_type)
+            .order_by(models.Restaurant.id)
+        )
+        restaurants = result.all()
+    rows = [row for shard_rows in await sharding.fan_out(_order_columns) for row in shard_rows]
+
+    restaurant_ids = np.array([restaurant.id for restaurant in restaurants], dtype=np.int64)
+    cities, city_of = np.unique([restaurant.location for restaurant in restaurants], return_inverse=True)
+    cuisines, cuisine_of = np.unique([restaurant.cuisine_type for restaurant in restaurants], return_inverse=True)
+
+    order_restaurants = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    position = np.searchsorted(restaurant_ids, order_restaurants)
+    known = position < len(restaurant_ids)
+    known[known] = restaurant_ids[position[known]] == order_restaurants[known]
+    position = position[known]
+
+    return {
+        "cities": cities.tolist(),
+        "cuisines": cuisines.tolist(),
+        "city": city_of[position],
+        "cuisine": cuisine_of[position],
+        "status": np.fromiter((_STATUS_CODES[row[1]] for row in rows), dtype=np.int8, count=len(rows))[known],
+        "amount": np.fromiter((row[2] for row in rows), dtype=np.int64, count=len(rows))[known],
+        "hour": np.fromiter((row[3] or 0 for row in rows), dtype=np.int64, count=len(rows))[known],
+    }
+
+
+class PlatformAnalytics:
+    """Platform-wide statistics, recomputed at most every ``refresh_interval`` seconds.
+
+    Loading the snapshot is I/O and stays on the event loop; the NumPy group-bys
+    run in a worker process so large snapshots do not stall request handling.
+    Concurrent requests for stale stats wait for a single refresh, which runs
+    as its own task: it is not bound by the query deadline of the request that
+    started it, and a waiting request that is cancelled leaves it running for
+    the others.
+    """
+
+    def __init__(self, refresh_interval: float = REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._running = False
+        self._refresh: Optional[asyncio.Task] = None
+        self._stats: Optional[Dict[str, Any]] = None
+        self._refreshed_at = 0.0
+        self.computed_at: Optional[datetime] = None
+
+    def _is_fresh(self) -> bool:
+        return self._stats is not None and time.monotonic() - self._refreshed_at < self.refresh_interval
+
+    async def stats(self) -> Dict[str, Any]:
+        if not self._running:
+            raise RuntimeError("Platform analytics is not running")
+        if self._is_fresh():
+            return self._stats
+        if self._refresh is None:
+            self._refresh = asyncio.ensure_future(self._recompute())
+        await asyncio.shield(self._refresh)
+        return self._stats
+
+    async def _recompute(self) -> None:
+        # The task copied the requesting context; the refresh serves every
+        # waiter, so it must not inherit that request's deadline.
+        current_deadline.set(None)
+        try:
+            snapshot = await load_snapshot()
+            loop = asyncio.get_running_loop()
+            self._stats = await loop.run_in_executor(self._executor, compute_platform_stats, snapshot)
+            self._refreshed_at = time.monotonic()
+            self.computed_at = datetime.utcnow()
+        finally:
+            self._refresh = None
+
+    async def start(self) -> None:
+        self._running = True
+        # spawn rather than fork: the server process has driver threads running.
+        self._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+
+    async def stop(self) -> None:
+        self._running = False
+        if self._refresh is not None:
+            self._refresh.cancel()
+            await asyncio.gather(self._refresh, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+        self._executor = None
+        self._stats = None
+
+
+platform_analytics = PlatformAnalytics()
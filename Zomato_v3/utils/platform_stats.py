@@ -0,0 +1,77 @@
+"""Vectorized platform-wide order statistics.
+
+Runs in a worker process (see utils/platform_analytics.py), so this module only
+depends on NumPy. A snapshot holds one entry per order in parallel arrays:
+``city`` and ``cuisine`` (codes into the ``cities``/``cuisines`` labels),
+``status`` (position in ``models.OrderStatus``), ``amount`` (paise) and
+``hour`` (UTC hour of ``order_date``).
+"""
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Positions in models.OrderStatus; the first five are the delivery funnel.
+STATUSES = ["placed", "confirmed", "preparing", "out_for_delivery", "delivered", "cancelled"]
+FUNNEL_STAGES = 5
+CANCELLED = 5
+
+
+def _revenue_by(codes, labels, amount, billed) -> List[Dict[str, Any]]:
+    totals = np.bincount(codes[billed], weights=amount[billed], minlength=len(labels))
+    counts = np.bincount(codes[billed], minlength=len(labels))
+    return [
+        {"key": labels[i], "orders": int(counts[i]), "revenue_paise": int(round(totals[i]))}
+        for i in np.argsort(-totals, kind="stable")
+        if counts[i]
+    ]
+
+
+def _cancellations_by(codes, labels, cancelled) -> List[Dict[str, Any]]:
+    totals = np.bincount(codes, minlength=len(labels))
+    cancelled_counts = np.bincount(codes[cancelled], minlength=len(labels))
+    rates = np.divide(cancelled_counts, totals, out=np.zeros(len(labels)), where=totals > 0)
+    return [
+        {"key": labels[i], "orders": int(totals[i]), "cancelled": int(cancelled_counts[i]), "rate": float(rates[i])}
+        for i in np.argsort(-rates, kind="stable")
+        if totals[i]
+    ]
+
+
+def compute_platform_stats(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    status = snapshot["status"]
+    amount = snapshot["amount"]
+    cancelled = status == CANCELLED
+    billed = ~cancelled
+    total_orders = len(status)
+
+    by_hour = np.bincount(snapshot["hour"][billed], weights=amount[billed], minlength=24)
+
+    # Status only records how far an order got: a delivered order passed every
+    # stage, a cancelled one is only known to have been placed.
+    reached = [int(np.count_nonzero(billed & (status >= stage))) for stage in range(FUNNEL_STAGES)]
+    reached[0] = total_orders
+    funnel = []
+    for stage in range(FUNNEL_STAGES):
+        previous = reached[stage - 1] if stage else reached[0]
+        funnel.append({
+            "status": STATUSES[stage],
+            "orders": reached[stage],
+            "conversion": reached[stage] / previous if previous else 0.0
+        })
+
+    cancelled_count = int(np.count_nonzero(cancelled))
+    return {
+        "total_orders": total_orders,
+        "revenue_paise": int(round(amount[billed].sum())),
+        "revenue_by_city": _revenue_by(snapshot["city"], snapshot["cities"], amount, billed),
+        "revenue_by_cuisine": _revenue_by(snapshot["cuisine"], snapshot["cuisines"], amount, billed),
+        "revenue_by_hour": [int(round(total)) for total in by_hour],
+        "funnel": funnel,
+        "cancellations": {
+            "orders": total_orders,
+            "cancelled": cancelled_count,
+            "rate": cancelled_count / total_orders if total_orders else 0.0
+        },
+        "cancellations_by_city": _cancellations_by(snapshot["city"], snapshot["cities"], cancelled),
+        "cancellations_by_cuisine": _cancellations_by(snapshot["cuisine"], snapshot["cuisines"], cancelled),
+    }
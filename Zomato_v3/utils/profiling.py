@@ -0,0 +1,244 @@
+import hmac
+import itertools
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+from fastapi import Header, HTTPException, status
+
+# Profiling and memory snapshots are only available when DEBUG_TOKEN is set,
+# and then only to callers sending it in ``X-Debug-Token``. Without it the
+# profiling middleware is not installed at all.
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")
+SAMPLE_INTERVAL = 0.001
+PROFILE_HISTORY = 50
+
+
+def debug_token_matches(token: Optional[str]) -> bool:
+    return bool(DEBUG_TOKEN) and token is not None and hmac.compare_digest(token, DEBUG_TOKEN)
+
+
+async def require_debug_token(x_debug_token: Optional[str] = Header(None)):
+    # Unknown rather than forbidden, so the endpoints do not advertise themselves.
+    if not debug_token_matches(x_debug_token):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+
+class StackSampler:
+    """Wall-clock sampling profiler for one thread.
+
+    A background thread reads the target thread's current frame every
+    ``interval`` seconds and counts the whole stack, root first, in the
+    folded format flame graph tools read (``a;b;c 12``). Time the event loop
+    spends waiting on the database shows up under the selector's frames.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._labels: Dict[object, str] = {}
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+
+class RequestProfile:
+    __slots__ = ("id", "method", "path", "status_code", "started_at", "duration_ms", "stacks")
+
+    def __init__(self, profile_id: int, method: str, path: str, started_at: datetime):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.status_code: Optional[int] = None
+        self.started_at = started_at
+        self.duration_ms = 0.0
+        self.stacks: Counter = Counter()
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status_code": self.status_code,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "samples": self.samples,
+        }
+
+
+class Profiler:
+    """Profiles selected requests and keeps the last ``history`` results.
+
+    A request is profiled when it sends ``X-Profile: 1`` with the debug token,
+    or when it matches a path prefix armed through ``POST /debug/profiles/arm``.
+    One request is sampled at a time; the sampler sees the whole event loop,
+    so concurrent requests would blur into each other's profiles.
+    """
+
+    def __init__(self, history: int = PROFILE_HISTORY):
+        self._profiles: Deque[RequestProfile] = deque(maxlen=history)
+        self._ids = itertools.count(1)
+        self._armed_prefix: Optional[str] = None
+        self._armed_count = 0
+        self._busy = False
+
+    def arm(self, path_prefix: str, count: int) -> None:
+        self._armed_prefix = path_prefix
+        self._armed_count = count
+
+    def armed(self) -> dict:
+        return {"path_prefix": self._armed_prefix, "remaining": self._armed_count}
+
+    def wants(self, path: str, headers: Dict[bytes, bytes]) -> bool:
+        if self._busy:
+            return False
+        if headers.get(b"x-profile") == b"1" and debug_token_matches(
+            headers.get(b"x-debug-token", b"").decode("latin-1")
+        ):
+            return True
+        if self._armed_count and path.startswith(self._armed_prefix):
+            self._armed_count -= 1
+            return True
+        return False
+
+    def begin(self, method: str, path: str) -> RequestProfile:
+        self._busy = True
+        return RequestProfile(next(self._ids), method, path, datetime.utcnow())
+
+    def finish(self, profile: RequestProfile) -> None:
+        self._busy = False
+        self._profiles.append(profile)
+
+    def list(self) -> List[dict]:
+        return [profile.summary() for profile in reversed(self._profiles)]
+
+    def get(self, profile_id: int) -> Optional[RequestProfile]:
+        return next((profile for profile in self._profiles if profile.id == profile_id), None)
+
+
+profiler = Profiler()
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, profiler: Profiler = profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.wants(scope["path"], dict(scope["headers"])):
+            await self.app(scope, receive, send)
+            return
+
+        profile = self.profiler.begin(scope["method"], scope["path"])
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", str(profile.id).encode())
+                ]
+            await send(message)
+
+        sampler = StackSampler()
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile.stacks = sampler.stop()
+            profile.duration_ms = (time.perf_counter() - start) * 1000
+            self.profiler.finish(profile)
+
+
+class MemorySnapshots:
+    """tracemalloc snapshots compared with the previous one.
+
+    Tracing slows every allocation down, so it only runs between
+    ``start`` and ``stop``.
+    """
+
+    def __init__(self):
+        self._previous: Optional[tracemalloc.Snapshot] = None
+
+    def start(self, frames: int) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self._previous = None
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self._previous = None
+
+    def snapshot(self, limit: int, group_by: str) -> dict:
+        if not tracemalloc.is_tracing():
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Memory tracing is not running; POST /debug/memory/start first"
+            )
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+        if self._previous is None:
+            stats = [(stat, stat.size, stat.count) for stat in snapshot.statistics(group_by)]
+            compared = False
+        else:
+            stats = [(stat, stat.size_diff, stat.count_diff) for stat in snapshot.compare_to(self._previous, group_by)]
+            compared = True
+        self._previous = snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "compared_to_previous": compared,
+            "traced_kib": round(current / 1024, 1),
+            "peak_kib": round(peak / 1024, 1),
+            "top": [
+                {
+                    "location": str(stat.traceback[0]) if group_by != "traceback" else "\n".join(stat.traceback.format()),
+                    "size_kib": round(stat.size / 1024, 1),
+                    "size_diff_kib": round(size_diff / 1024, 1),
+                    "count": stat.count,
+                    "count_diff": count_diff,
+                }
+                for stat, size_diff, count_diff in stats[:limit]
+            ],
+        }
+
+
+memory_snapshots = MemorySnapshots()
@@ -0,0 +1,141 @@
+import math
+import re
+import time
+from collections import OrderedDict
+from typing import FrozenSet, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+WRITE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+READ_METHODS = frozenset({"GET", "HEAD"})
+_API_PATHS = r"^/(restaurants|menu-items|customers|orders|reviews|analytics)(/|$)"
+# Writes a customer or restaurant makes to its own account, menu or orders.
+_ACCOUNT_PATHS = r"^/(restaurants/(?P<restaurant_id>\d+)|customers/(?P<customer_id>\d+))(/|$)"
+
+
+class RateLimitRule:
+    def __init__(self, name: str, methods: FrozenSet[str], path: str, capacity: int, per_seconds: float):
+        self.name = name
+        self.methods = methods
+        self.path = re.compile(path)
+        self.capacity = capacity
+        self.refill_rate = capacity / per_seconds
+        # A bucket idle this long has refilled completely and can be forgotten.
+        self.idle_ttl = per_seconds
+        self.per_account = bool({"customer_id", "restaurant_id"} & set(self.path.groupindex))
+
+
+# Rules whose path names a ``customer_id`` or ``restaurant_id`` are the ones
+# where that id is the one acting, and key their buckets by it; the others key
+# by client IP. A request is charged to the first matching per-account rule and
+# to the first matching per-IP rule, so a client cannot escape the per-IP
+# budget by acting for many accounts, ids in the path being unauthenticated.
+# Nothing is keyed by the query string, which the client picks freely.
+DEFAULT_RULES = [
+    RateLimitRule("place-order", frozenset({"POST"}), r"^/customers/(?P<customer_id>\d+)/orders/?$", 10, 60),
+    RateLimitRule("order-status", frozenset({"PUT"}), r"^/orders/\d+/status/?$", 60, 60),
+    RateLimitRule("list-orders", READ_METHODS, r"^/orders/?$", 60, 60),
+    RateLimitRule("autocomplete", READ_METHODS, r"^/autocomplete/?$", 600, 60),
+    RateLimitRule("account-writes", WRITE_METHODS, _ACCOUNT_PATHS, 30, 60),
+    RateLimitRule("writes", WRITE_METHODS, _API_PATHS, 30, 60),
+    RateLimitRule("reads", READ_METHODS, _API_PATHS, 300, 60),
+]
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated_at")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated_at = now
+
+
+class BucketStore:
+    """Token buckets in least-recently-used order, bounded by ``max_buckets``.
+
+    Every access moves the bucket to the end, so idle buckets collect at the
+    front and are evicted there in O(1) per bucket.
+    """
+
+    def __init__(self, max_buckets: int = 100_000, idle_ttl: float = 600.0):
+        self.max_buckets = max_buckets
+        self.idle_ttl = idle_ttl
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def take(self, key: str, rule: RateLimitRule, now: float) -> Tuple[bool, float]:
+        """Take one token; returns ``(allowed, seconds until a token is available)``."""
+        self._evict(now)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rule.capacity, now)
+            self._buckets[key] = bucket
+        else:
+            self._buckets.move_to_end(key)
+            elapsed = now - bucket.updated_at
+            bucket.tokens = min(rule.capacity, bucket.tokens + elapsed * rule.refill_rate)
+            bucket.updated_at = now
+
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return True, 0.0
+        return False, (1 - bucket.tokens) / rule.refill_rate
+
+    def _evict(self, now: float) -> None:
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if len(self._buckets) < self.max_buckets and now - bucket.updated_at < self.idle_ttl:
+                break
+            self._buckets.popitem(last=False)
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, rules: Optional[List[RateLimitRule]] = None, store: Optional[BucketStore] = None):
+        self.app = app
+        self.rules = rules if rules is not None else DEFAULT_RULES
+        self.store = store or BucketStore(idle_ttl=max(rule.idle_ttl for rule in self.rules))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        now = time.monotonic()
+        # Per-IP first: a client already over its own budget does not also
+        # use up the account's tokens.
+        for rule, key in sorted(self._match(scope), key=lambda matched: matched[0].per_account):
+            allowed, retry_after = self.store.take(key, rule, now)
+            if not allowed:
+                break
+        else:
+            return await self.app(scope, receive, send)
+
+        response = JSONResponse(
+            status_code=429,
+            content={"detail": "Rate limit exceeded, retry later"},
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+        await response(scope, receive, send)
+
+    def _match(self, scope) -> List[Tuple[RateLimitRule, str]]:
+        method, path = scope["method"], scope["path"]
+        matched = {}
+        for rule in self.rules:
+            if method not in rule.methods or rule.per_account in matched:
+                continue
+            match = rule.path.match(path)
+            if match is None:
+                continue
+            matched[rule.per_account] = (rule, f"{rule.name}:{self._client_key(scope, match)}")
+        return list(matched.values())
+
+    @staticmethod
+    def _client_key(scope, match) -> str:
+        params = match.groupdict()
+        for name, prefix in (("customer_id", "customer"), ("restaurant_id", "restaurant")):
+            value = params.get(name)
+            if value:
+                return f"{prefix}:{value}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
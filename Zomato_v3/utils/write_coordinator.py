@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import CoordinatorSessionLocal
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+WriteOperation = Callable[[AsyncSession], Awaitable[T]]
+
+
+class WriteCoordinator:
+    """Funnels mutations through one writer task with group commit.
+
+    Each submitted operation receives the writer's session and runs inside its
+    own SAVEPOINT, so a failing operation is rolled back on its own and its
+    caller gets the exception. Everything queued while the previous batch was
+    committing is applied in the next transaction, which pays for one commit
+    (and one fsync) instead of one per operation. Operations should ``flush``
+    and ``refresh`` what they return; the batch commits after they finish.
+    """
+
+    def __init__(self, session_factory, max_batch: int = 64, queue_size: int = 1000):
+        self._session_factory = session_factory
+        self.max_batch = max_batch
+        self._queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+
+    async def submit(self, operation: WriteOperation) -> T:
+        if self._writer is None:
+            raise RuntimeError("Write coordinator is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((operation, future))
+        return await future
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._writer = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._writer is None:
+            return
+        await self._queue.join()
+        self._writer.cancel()
+        await asyncio.gather(self._writer, return_exceptions=True)
+        self._writer = None
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                await self._commit_batch(batch)
+            except Exception:
+                logger.exception("Write batch of %d operations failed", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _commit_batch(self, batch: List[Tuple[WriteOperation, asyncio.Future]]) -> None:
+        outcomes = []
+        try:
+            async with self._session_factory() as session:
+                async with session.begin():
+                    for operation, future in batch:
+                        if future.done():  # caller gave up, e.g. client disconnected
+                            continue
+                        try:
+                            async with session.begin_nested():
+                                outcomes.append((future, await operation(session), None))
+                        except Exception as e:
+                            outcomes.append((future, None, e))
+        except Exception as e:
+            # The commit itself failed, so none of the batch was applied.
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            raise
+
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+write_coordinator = WriteCoordinator(CoordinatorSessionLocal)